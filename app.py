@@ -1,448 +1,885 @@
-from nicegui import ui
+import bisect
+import dataclasses
+import html
+import json
+import logging
+import os
+from typing import Any
+
+from fastapi.responses import PlainTextResponse
+from nicegui import app, background_tasks, ui
 from datetime import datetime
-from sqlalchemy import nulls_last
-
-from src.model import Task, session_scope
-from src.actions import (
-    add_task,
-    delete_task,
-    edit_task,
-    mark_task_complete,
-    mark_task_incomplete,
-    get_unique_categories,
-)
-
-ui.add_body_html('<style>.ag-row-hover .ag-cell  { background-color: inherit}</style>')
-
-# Title
-ui.label("📝 Todooey").classes("text-2xl font-bold")
-selected_row = {"id": None}
-details_column_visible = {"state": True}
-all_active_categories = {}
-all_categories = get_unique_categories(active_only=False)
-
-with ui.row().classes("items-center gap-4 q-mt-md q-mb-sm"):
-    def colored_box(label, color):
-        with ui.row().classes("items-center gap-2"):
-            ui.element("div").style(f"width: 16px; height: 16px; background-color: {color}; border-radius: 3px;")
-            ui.label(label).classes("text-sm")
-
-    colored_box("Overdue", "#d96550")
-    colored_box("Today", "#f2aa4b")
-    colored_box("This week", "#f7ecb5")
-    colored_box("The rest", "#eae9e9")  # grey or white for everything else
-
-
-def update_task_list() -> None:
-    new_data = []
-    with session_scope() as session:
-        for _i, task in enumerate(session.query(Task).filter_by(archived=False).order_by(Task.is_complete, nulls_last(Task.complete_by), Task.priority, Task.effort).all()):
-            new_data.append(
-                {
-                    "id": task.id,
-                    "name": task.name,
-                    "details": task.details,
-                    "category": task.category,
-                    "priority": task.priority,
-                    "effort": task.effort,
-                    "complete_by": task.complete_by.strftime('%d-%m-%Y') if task.complete_by else None,
-                    "is_complete": "✅" if task.is_complete else "⬜",
-                },
-            )
-        task_table.options["rowData"] = new_data
-        task_table.update()
-    update_all_categories()
-
-
-def refresh_task_list() -> None:
-    """Refresh the task table with current tasks from the database."""
-    new_data = []
-    with session_scope() as session:
-        for i, task in enumerate(session.query(Task).filter_by(archived=False).order_by(Task.is_complete, nulls_last(Task.complete_by), Task.priority, Task.effort).all()):
-            if all_active_categories.get(task.category, True):
-                new_data.append(
-                    {
-                        "id": task.id,
-                        "name": task.name,
-                        "details": task.details,
-                        "category": task.category,
-                        "priority": task.priority,
-                        "effort": task.effort,
-                        "complete_by": task.complete_by.strftime('%d-%m-%Y') if task.complete_by else None,
-                        "is_complete": "✅" if task.is_complete else "⬜",
-                    },
-                )
-        task_table.run_grid_method("setGridOption", "rowData", new_data)
 
-    # task_table.run_grid_method("setColumnsVisible", ["details"], details_column_visible["state"])
+from src.actions import DependencyCycleError, cache_stats, changes, preview_row, row_sort_key
+from src.api import router as api_router
+from src.backup import backups
+from src.bus import TaskChange
+from src.maintenance import maintenance
+from src.metrics import render, timed
+from src.model import init_db
+from src.settings import DEFAULT_WORKSPACE, check_workspace_key
+from src.write_behind import WriteBehindQueue, flush_task_updates, task_updates
+from src.async_actions import WorkspaceActions
 
-    # 🧠 Re-select row if still present
-    if selected_row["id"] is not None:
-        # Find the row index with matching ID
-        for i, row in enumerate(new_data):
-            if row["id"] == selected_row["id"]:
-                task_table.run_row_method(i, "setSelected", True)
+# "infinite" makes the grid fetch tasks block by block instead of receiving every row at once
+INFINITE_ROW_MODEL = os.environ.get("TODOOEY_ROW_MODEL", "clientSide") == "infinite"
+TASK_BLOCK_SIZE = 100
 
-                break
-    update_all_categories()
+init_db()
+logger = logging.getLogger("todooey")
 
 
-def update_all_categories():
-    latest = get_unique_categories(active_only=True)
-    for key in all_active_categories.copy():
-        if key not in latest:
-            del all_active_categories[key]
+app.include_router(api_router)
+
 
-    for cat in latest:
-        if cat not in all_active_categories:
-            all_active_categories[cat] = True
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> str:
+    """Expose query, session and handler latencies in the Prometheus text format."""
+    stats = cache_stats()
+    return render(
+        {
+            "todooey_read_cache_hits": stats["hits"],
+            "todooey_read_cache_misses": stats["misses"],
+            "todooey_data_version": stats["version"],
+        },
+    )
+
+
+# Every browser tab gets its own page, and with it its own selection, filters and grid. Each
+# page shows one workspace, picked with ?workspace=<key>
+@ui.page("/")
+async def index(workspace: str = DEFAULT_WORKSPACE) -> None:
+    # Handlers run outside this function's context, so the page's actions are bound to its
+    # workspace rather than relying on the context variable
+    db = WorkspaceActions(check_workspace_key(workspace))
+    ui.add_body_html('<style>.ag-row-hover .ag-cell  { background-color: inherit}</style>')
+    ui.add_body_html(
+        """<style>
+        .ag-row.due-overdue { background-color: #d96550; }
+        .ag-row.due-today { background-color: #f2aa4b; }
+        .ag-row.due-this_week { background-color: #f7ecb5; }
+        .ag-row.archived { color: #9e9e9e; font-style: italic; }
+        .ag-row.blocked { color: #757575; }
+        </style>""",
+    )
+
+    client = ui.context.client
+
+    # Title
+    ui.label("📝 Todooey").classes("text-2xl font-bold")
+    if workspace != DEFAULT_WORKSPACE:
+        ui.label(f"🗂️ {workspace}").classes("text-gray-600")
+    # "ids" holds every selected task in selection order, "id" the first of them
+    selected_row: dict[str, Any] = {"id": None, "ids": []}
+    details_column_visible = {"state": True}
+    archive_visible = {"state": False}
+    blocked_hidden = {"state": False}
+    all_active_categories: dict[str, bool] = {}
+    # The button of every category in the category bar, by name
+    category_buttons: dict[str, ui.button] = {}
+    category_ids: dict[str, int] = {}
+    block_cursors: dict[int, list | None] = {0: None}
+    # List order key of each active task in the grid, and those keys in order, to place the
+    # rows added by a change without reloading the others
+    row_keys: dict[int, tuple] = {}
+    row_order: list[tuple] = []
+    all_categories: list[str] = []
+    # Data version the grid is up to date with, and how to stop receiving changes
+    data_version: dict[str, int | None] = {"value": None}
+    unsubscribe = {"func": lambda: None}
+
+    with ui.row().classes("items-center gap-4 q-mt-md q-mb-sm"):
+        def colored_box(label, color):
+            with ui.row().classes("items-center gap-2"):
+                ui.element("div").style(f"width: 16px; height: 16px; background-color: {color}; border-radius: 3px;")
+                ui.label(label).classes("text-sm")
+
+        colored_box("Overdue", "#d96550")
+        colored_box("Today", "#f2aa4b")
+        colored_box("This week", "#f7ecb5")
+        colored_box("The rest", "#eae9e9")  # grey or white for everything else
+
+
+    def hidden_categories() -> list[int]:
+        return [
+            category_ids[category]
+            for category, visible in all_active_categories.items()
+            if not visible
+        ]
+
+
+    async def update_task_list() -> None:
+        data_version["value"] = cache_stats()["version"]
+        if INFINITE_ROW_MODEL:
+            reset_task_blocks()
+        else:
+            task_table.options["rowData"] = await db.get_task_rows()
+            task_table.update()
+            remember_row_order(task_table.options["rowData"])
+        await update_all_categories()
+        await refresh_workload()
+        await refresh_plan()
+
+
+    @timed("refresh_task_list")
+    async def refresh_task_list() -> None:
+        """Refresh the task table with current tasks from the database."""
+        if INFINITE_ROW_MODEL:
+            # The grid drops its cached blocks and asks for them again via `serve_task_block`
+            reset_task_blocks()
+            task_table.run_grid_method("purgeInfiniteCache")
+            await update_all_categories()
+            return
+
+        # Rows are keyed by id (see `getRowId`), so the grid keeps the selection and scroll position
+        rows = await db.get_task_rows(
+            hidden_categories(),
+            include_archive=archive_visible["state"],
+            hide_blocked=blocked_hidden["state"],
+        )
+        task_table.run_grid_method("setGridOption", "rowData", rows)
+        remember_row_order(rows)
+        # Tasks that left the grid (e.g. into a hidden category) are no longer selected
+        shown = {row["id"] for row in rows}
+        keep_selected_rows(lambda task_id: task_id in shown)
+        await update_all_categories()
+
+
+    def handle_change(change: TaskChange) -> None:
+        """Apply a change published by a write action (from any client) to this client's grid."""
+        if change.workspace != workspace:
+            return
+        background_tasks.create(apply_change(change), name="apply task change")
+
+
+    async def apply_change(change: TaskChange) -> None:
+        data_version["value"] = change.version
+        if task_updates is not None and task_updates.pending():
+            # Keep showing the previews of updates still waiting to be written
+            updated = tuple(
+                row for row in change.updated if not task_updates.is_pending(row["id"], workspace)
+            )
+            change = dataclasses.replace(change, updated=updated)
+        # Deleted tasks move to the archive rather than leaving the list when it is shown, and
+        # updated tasks may have been unblocked into the list when blocked ones are hidden
+        if (
+            change.reload
+            or (change.removed and archive_visible["state"])
+            or (change.updated and blocked_hidden["state"])
+        ):
+            await refresh_task_list()
+        else:
+            await apply_task_changes(change.added, change.updated, change.removed)
+        await refresh_workload()
+        await refresh_plan()
 
-    refresh_category_buttons()
-    all_categories[:] = get_unique_categories(active_only=False)
-    add_category.set_autocomplete(all_categories)
-    edit_category.set_autocomplete(all_categories)
 
+    def subscribe_to_changes() -> None:
+        unsubscribe["func"] = changes.subscribe(handle_change)
+        # Changes published while this client was not subscribed (before it first connected,
+        # or while it was reconnecting) are caught up with a full refresh
+        if cache_stats()["version"] != data_version["value"]:
+            background_tasks.create(refresh_task_list(), name="catch up on task changes")
+            background_tasks.create(refresh_workload(), name="catch up on the workload")
+            background_tasks.create(refresh_plan(), name="catch up on the plan")
 
-def handle_row_select(e) -> None:
-    selected_row["id"] = e.args["data"]["id"]
 
+    def unsubscribe_from_changes() -> None:
+        unsubscribe["func"]()
 
-def double_click_toggle_completed(e) -> None:
-    selected_row["id"] = e.args["data"]["id"]
-    if e.args["colId"] != "is_complete":
-        return
-    if e.args["data"]["is_complete"] == "⬜":
-        do_mark_complete()
-    else:
-        do_mark_not_complete()
 
+    async def apply_task_changes(added=(), updated=(), removed=()) -> None:
+        """Apply changed rows returned by the actions to the grid, instead of reloading every
+        row."""
+        if INFINITE_ROW_MODEL:
+            # The infinite row model has no transactions: re-fetch the loaded blocks only
+            reset_task_blocks()
+            task_table.run_grid_method("refreshInfiniteCache")
+            await update_all_categories()
+            return
 
-class ToggleDetailsButton(ui.button):
-    def __init__(self, *args, **kwargs) -> None:
-        self.label_show = "🙉 Show details"
-        self.label_hide = "🙈 Hide details"
-        self.details_visible = True  # assume visible initially
-        self.current_label = self.label_hide
-        super().__init__(*args, **kwargs)
-        self.on("click", self.toggle)
+        hidden = hidden_categories()
+        # Rows edited into a hidden category leave the grid
+        removed = [*removed, *(row for row in updated if row["category_id"] in hidden)]
+        updated = [row for row in updated if row["category_id"] not in hidden]
+        # An update that moves a task in list order (or into the grid, out of a hidden category)
+        # would leave it where it was: reload the rows in order instead
+        if any(row_keys.get(row["id"]) != row_sort_key(row) for row in updated):
+            await refresh_task_list()
+            return
 
-    def toggle(self) -> None:
-        self.details_visible = not self.details_visible
-        self.current_label = self.label_hide if self.details_visible else self.label_show
-        details_column_visible["state"] = self.details_visible
+        for row in removed:
+            if row["id"] in row_keys:
+                row_order.remove(row_keys.pop(row["id"]))
         task_table.run_grid_method(
-            "setColumnsVisible",
-            ["details"],
-            self.details_visible,
+            "applyTransaction",
+            {"update": updated, "remove": [{"id": row["id"]} for row in removed]},
+        )
+        # Added rows go where they belong in list order; archived rows follow the active ones
+        for row in added:
+            if row["category_id"] in hidden:
+                continue
+            key = row_keys[row["id"]] = row_sort_key(row)
+            index = bisect.bisect(row_order, key)
+            row_order.insert(index, key)
+            task_table.run_grid_method("applyTransaction", {"add": [row], "addIndex": index})
+        gone = {row["id"] for row in removed}
+        keep_selected_rows(lambda task_id: task_id not in gone)
+        await update_all_categories()
+
+
+    def remember_row_order(rows: list[dict]) -> None:
+        """Note the list order of the rows the grid was loaded with."""
+        row_keys.clear()
+        row_keys.update((row["id"], row_sort_key(row)) for row in rows if not row.get("archived"))
+        row_order[:] = sorted(row_keys.values())
+
+
+    def reset_task_blocks() -> None:
+        """Forget the keyset cursors of the blocks served so far."""
+        block_cursors.clear()
+        block_cursors[0] = None
+
+
+    @timed("serve_task_block")
+    async def serve_task_block(e) -> None:
+        """Answer a block request from the grid's infinite row model."""
+        start_row = e.args["startRow"]
+        limit = e.args["endRow"] - start_row
+        if start_row in block_cursors:
+            rows, cursor = await db.get_task_page(
+                limit,
+                after=block_cursors[start_row],
+                hidden_categories=hidden_categories(),
+                hide_blocked=blocked_hidden["state"],
+            )
+        else:
+            rows, cursor = await db.get_task_page(
+                limit,
+                offset=start_row,
+                hidden_categories=hidden_categories(),
+                hide_blocked=blocked_hidden["state"],
+            )
+        if cursor is not None:
+            block_cursors[start_row + len(rows)] = cursor
+        # Fewer rows than asked for means this is the last block
+        last_row = start_row + len(rows) if len(rows) < limit else -1
+        ui.run_javascript(
+            f"""
+            const params = window.todooeyBlocks[{json.dumps(e.args["key"])}];
+            delete window.todooeyBlocks[{json.dumps(e.args["key"])}];
+            params.successCallback({json.dumps(rows)}, {last_row});
+            for (const id of {json.dumps([str(task_id) for task_id in selected_row["ids"]])}) {{
+                const selected = params.api.getRowNode(id);
+                if (selected) selected.setSelected(true);
+            }}
+            """,
         )
-        self.update()
 
-    def update(self) -> None:
-        self.set_text(self.current_label)
 
-        super().update()
+    async def update_all_categories():
+        categories = await db.get_categories()
+        category_ids.update((name, id_) for name, id_, _ in categories)
+        latest = [name for name, _, active in categories if active]
 
+        # Only touch the buttons of categories that came or went, keeping the bar in name order
+        for key in all_active_categories.keys() - set(latest):
+            del all_active_categories[key]
+            category_buttons.pop(key).delete()
+        for index, cat in enumerate(latest):
+            if cat not in all_active_categories:
+                all_active_categories[cat] = True
+                with category_row:
+                    category_buttons[cat] = HideCategoryButton(cat)
+                category_buttons[cat].move(category_row, target_index=index)
+
+        names = [name for name, _, _ in categories]
+        if names != all_categories:
+            all_categories[:] = names
+            add_category.set_autocomplete(all_categories)
+            edit_category.set_autocomplete(all_categories)
+            bulk_edit_category.set_autocomplete(all_categories)
+
+
+    def handle_row_selected(e) -> None:
+        data = e.args["data"]
+        # Archived tasks are read-only
+        if not data or data.get("archived"):
+            return
+        ids = selected_row["ids"]
+        if e.args["selected"] and data["id"] not in ids:
+            ids.append(data["id"])
+        elif not e.args["selected"] and data["id"] in ids:
+            ids.remove(data["id"])
+        selected_row["id"] = ids[0] if ids else None
 
-class HideCategoryButton(ui.button):
-    def __init__(self, *args, **kwargs) -> None:
-        super().__init__(*args, **kwargs)
-        self.label = args[0]
-        self.data_visible = all_active_categories[self.label]
-        self.on("click", self.toggle)
 
-    def toggle(self) -> None:
-        self.data_visible = not self.data_visible
-        all_active_categories[self.label] = self.data_visible
-        self.update()
-        refresh_task_list()
+    def clear_selected_rows() -> None:
+        keep_selected_rows(lambda _: False)
 
-    def update(self) -> None:
-        self.props(f'color={"green" if self.data_visible else "grey"}')
-        super().update()
 
+    def keep_selected_rows(keep) -> None:
+        """Drop the selected tasks for which ``keep(task_id)`` is false."""
+        selected_row["ids"][:] = [task_id for task_id in selected_row["ids"] if keep(task_id)]
+        selected_row["id"] = selected_row["ids"][0] if selected_row["ids"] else None
 
-# Task Table
 
-task_table = (
-    ui.aggrid(
-        {
-            "defaultColDef": {"flex": 1},
-            "enableCellTextSelection": True,
-            "columnDefs": [
-                {"headerName": "ID", "field": "id", "width": 50, "hide": True},
-                {
-                    "headerName": "Name",
-                    "field": "name",
-                    "width": 200,
-                },
-                {
-                    "headerName": "Details",
-                    "field": "details",
-                    "width": 300,
-                    "wrapText": True,
-                    "autoHeight": True,
-                },
-                {
-                    "headerName": "Category",
-                    "field": "category",
-                    "width": 150,
-                },
-                {
-                    "headerName": "Priority",
-                    "field": "priority",
-                    "width": 50,
-                    "sortable": True,
-                },
-                {
-                    "headerName": "Effort",
-                    "field": "effort",
-                    "width": 50,
-                },
-                {
-                    "headerName": "Complete by",
-                    "field": "complete_by",
-                    "width": 100
-                    
-                },
+    @timed("double_click_toggle_completed")
+    async def double_click_toggle_completed(e) -> None:
+        data = e.args["data"]
+        if e.args["colId"] != "is_complete" or data.get("archived"):
+            return
+        if task_updates is not None:
+            queue_task_update(task_updates, data, is_complete=data["is_complete"] == "⬜")
+        elif data["is_complete"] == "⬜":
+            await db.mark_task_complete(data["id"])
+        else:
+            await db.mark_task_incomplete(data["id"])
+
+    def queue_task_update(queue: WriteBehindQueue, row: dict, **fields) -> None:
+        """Show an update at once and leave writing it to the write-behind ``queue``."""
+        preview = preview_row(row, fields)
+        task_table.run_grid_method("applyTransaction", {"update": [preview]})
+        written = queue.enqueue(row["id"], workspace=workspace, **fields)
+        background_tasks.create(
+            confirm_task_update(written, row["name"]),
+            name="confirm task update",
+        )
+
+    async def confirm_task_update(written, name: str) -> None:
+        try:
+            await written
+        except Exception:
+            # The queue has logged the error; put the grid back to what is in the database
+            with client:
+                ui.notify(f"Failed to save changes to {name} ❌", type="negative")
+            await refresh_task_list()
+
+
+    class ToggleDetailsButton(ui.button):
+        def __init__(self, *args, **kwargs) -> None:
+            self.label_show = "🙉 Show details"
+            self.label_hide = "🙈 Hide details"
+            self.details_visible = True  # assume visible initially
+            self.current_label = self.label_hide
+            super().__init__(*args, **kwargs)
+            self.on("click", self.toggle)
+
+        def toggle(self) -> None:
+            self.details_visible = not self.details_visible
+            self.current_label = self.label_hide if self.details_visible else self.label_show
+            details_column_visible["state"] = self.details_visible
+            task_table.run_grid_method(
+                "setColumnsVisible",
+                ["details"],
+                self.details_visible,
+            )
+            self.update()
+
+        def update(self) -> None:
+            self.set_text(self.current_label)
+
+            super().update()
+
+
+    class HideCategoryButton(ui.button):
+        def __init__(self, *args, **kwargs) -> None:
+            super().__init__(*args, **kwargs)
+            self.label = args[0]
+            self.data_visible = all_active_categories[self.label]
+            self.on("click", self.toggle)
+
+        async def toggle(self) -> None:
+            self.data_visible = not self.data_visible
+            all_active_categories[self.label] = self.data_visible
+            self.update()
+            await refresh_task_list()
+            await refresh_plan()
+
+        def update(self) -> None:
+            self.props(f'color={"green" if self.data_visible else "grey"}')
+            super().update()
+
+
+    # Search
+    @timed("run_search")
+    async def run_search(e) -> None:
+        results = await db.search_tasks(e.value or "")
+        search_results.clear()
+        with search_results:
+            for result in results:
+                category = html.escape(result["category"] or "")
+                ui.html(
+                    f"<b>{result['name']}</b> <span class='text-grey-7'>[{category}]</span>"
+                    f" {result['details']}",
+                ).classes("cursor-pointer text-sm").on(
+                    "click", lambda _, task_id=result["id"]: select_task(task_id)
+                )
+
+
+    def select_task(task_id) -> None:
+        """Select a task in the grid and scroll it into view."""
+        # Replaces the selection; the grid reports the change back through `handle_row_selected`
+        task_table.run_row_method(str(task_id), "setSelected", True, True)
+        ui.run_javascript(
+            f"const api = getElement({task_table.id}).api;"
+            f" api.ensureNodeVisible(api.getRowNode('{task_id}'), 'middle');",
+        )
+
+
+    ui.input("🔍 Search tasks", on_change=run_search).props("outlined dense clearable debounce=300").classes("w-96")
+    search_results = ui.column().classes("gap-0")
+
+    # Task Table
+
+    with ui.row().classes("w-full no-wrap items-start"):
+        task_table = (
+            ui.aggrid(
                 {
-                    "headerName": "Completed",
-                    "field": "is_complete",
-                    "width": 50,
-                    "cellStyle": {"fontSize": "20px", "textAlign": "center"},
-                },
-            ],
-            "rowData": [],
-            "rowSelection": "single",
-            ":getRowStyle": """
-                    function(params) {
-                        const completeBy = params.data.complete_by;
-                        const isComplete = params.data.is_complete === "✅";
-                        if (!completeBy || isComplete) return null;
-                        
-                        const today = new Date();
-                        const [day, month, year] = completeBy.split("-").map(Number);
-                        const dueDate = new Date(year, month - 1, day);
-
-                        // Remove time from today
-                        today.setHours(0, 0, 0, 0);
-                        dueDate.setHours(0, 0, 0, 0);
-
-                        // Start of the week (Monday)
-                        const startOfWeek = new Date(today);
-                        startOfWeek.setDate(today.getDate() - today.getDay() + 1);
-
-                        // End of the week (Sunday)
-                        const endOfWeek = new Date(startOfWeek);
-                        endOfWeek.setDate(startOfWeek.getDate() + 6);
-
-                        if (dueDate < today) {
-                            return { backgroundColor: '#d96550' }; //
-                        } else if (dueDate.getTime() === today.getTime()) {
-                            return { backgroundColor: '#f2aa4b' }; //
-                        } else if (dueDate > today && dueDate <= endOfWeek) {
-                            return { backgroundColor: '#f7ecb5' }; //
+                    "defaultColDef": {"flex": 1},
+                    "enableCellTextSelection": True,
+                    "columnDefs": [
+                        {"headerName": "ID", "field": "id", "width": 50, "hide": True},
+                        {
+                            "headerName": "Name",
+                            "field": "name",
+                            "width": 200,
+                        },
+                        {
+                            "headerName": "Details",
+                            "field": "details",
+                            "width": 300,
+                            "wrapText": True,
+                            "autoHeight": True,
+                        },
+                        {
+                            "headerName": "Category",
+                            "field": "category",
+                            "width": 150,
+                        },
+                        {
+                            "headerName": "Priority",
+                            "field": "priority",
+                            "width": 50,
+                            "sortable": True,
+                        },
+                        {
+                            "headerName": "Effort",
+                            "field": "effort",
+                            "width": 50,
+                        },
+                        {
+                            "headerName": "Complete by",
+                            "field": "complete_by",
+                            "width": 100,
+                            # Rows carry sortable ISO dates, shown day first
+                            ":valueFormatter": "(params) => params.value ? params.value.split('-').reverse().join('-') : ''",
+
+                        },
+                        {
+                            "headerName": "Completed",
+                            "field": "is_complete",
+                            "width": 50,
+                            "cellStyle": {"fontSize": "20px", "textAlign": "center"},
+                        },
+                        {
+                            "headerName": "Blocked by",
+                            "field": "blocked_by",
+                            "width": 50,
+                            ":valueFormatter": "(params) => params.value ? '⛔ ' + params.value : ''",
+                        },
+                    ],
+                    **(
+                        {
+                            "rowModelType": "infinite",
+                            "cacheBlockSize": TASK_BLOCK_SIZE,
+                            ":datasource": """{
+                                getRows: (params) => {
+                                    window.todooeyBlocks = window.todooeyBlocks || {};
+                                    const key = `${params.startRow}-${Date.now()}-${Math.random()}`;
+                                    window.todooeyBlocks[key] = params;
+                                    emitEvent("task_block_requested", {key: key, startRow: params.startRow, endRow: params.endRow});
+                                }
+                            }""",
                         }
-                        return null;
-                    }
-                """
-            
-            
-        },
-    )
-    .style("height: 450px")
-    .on("cellDoubleClicked", double_click_toggle_completed)
-    .on("cellClicked", handle_row_select)
-)
-
-
-# task_table.add_slot('header', r'''
-#     <q-tr :props="props">
-#         <q-th auto-width />
-#         <q-th v-for="col in props.cols" :key="col.name" :props="props">
-#             {{ col.label }}
-#         </q-th>
-#     </q-tr>
-# ''')
-# task_table.add_slot('body', r'''
-#     <q-tr :props="props">
-#         <q-td auto-width>
-#             <q-btn size="sm" color="accent" round dense
-#                 @click="props.expand = !props.expand"
-#                 :icon="props.expand ? 'remove' : 'add'" />
-#         </q-td>
-#         <q-td v-for="col in props.cols" :key="col.name" :props="props">
-#             {{ col.value }}
-#         </q-td>
-#     </q-tr>
-#     <q-tr v-show="props.expand" :props="props">
-#         <q-td colspan="100%">
-#             <div class="text-left">{{ props.row.details }}</div>
-#         </q-td>
-#     </q-tr>
-# ''')
-
-# Action buttons
-with ui.row().classes("gap-2"):
-
-    def do_add_task() -> None:
-        add_dialog.open()
-
-    def do_mark_complete() -> None:
-        if selected_row["id"]:
-            mark_task_complete(selected_row["id"])
-            refresh_task_list()
-            ui.notify("Task marked complete")
-
-    def do_mark_not_complete() -> None:
-        if selected_row["id"]:
-            mark_task_incomplete(selected_row["id"])
-            refresh_task_list()
-            ui.notify("Task marked incomplete")
-
-    def do_delete() -> None:
-        if selected_row["id"]:
-            delete_task(selected_row["id"])
-            selected_row["id"] = None
-            refresh_task_list()
-            ui.notify("Task deleted")
-
-    def open_edit_dialog() -> None:
-        if not selected_row["id"]:
-            return
-        with session_scope() as session:
-            task = session.query(Task).get(selected_row["id"])
+                        if INFINITE_ROW_MODEL
+                        else {"rowData": []}
+                    ),
+                    # Ctrl/Shift-click selects several tasks for the bulk actions
+                    "rowSelection": "multiple",
+                    ":getRowId": "(params) => String(params.data.id)",
+                    # Due buckets are worked out on the server, so styling a row is a class lookup
+                    ":getRowClass": """(params) => {
+                        if (!params.data) return null;
+                        if (params.data.archived) return 'archived';
+                        const classes = params.data.blocked_by ? ['blocked'] : [];
+                        if (params.data.due_bucket) classes.push('due-' + params.data.due_bucket);
+                        return classes;
+                    }""",
+                },
+            )
+            .style("height: 450px")
+            .classes("grow")
+            .on("cellDoubleClicked", double_click_toggle_completed)
+            .on("rowSelected", handle_row_selected)
+        )
+        with ui.card().classes("w-80 shrink-0"):
+            ui.label("🗓️ Plan my day").classes("text-h6")
+            plan_budget = ui.number("Effort budget", value=8, min=1, precision=0).props("outlined dense").classes("w-full")
+            plan_summary = ui.label().classes("text-sm text-grey-7")
+            plan_list = ui.column().classes("gap-1 w-full")
+
+    # The open tasks worth most within the effort budget, of the categories shown
+    async def refresh_plan() -> None:
+        plan = await db.plan_day(int(plan_budget.value or 0), hidden_categories())
+        plan_summary.set_text(f"{len(plan.rows)} tasks, {plan.effort} of {plan.budget} effort")
+        plan_list.clear()
+        with plan_list:
+            for row in plan.rows:
+                due = f", due {row['complete_by']}" if row["complete_by"] else ""
+                ui.label(f"{row['name']} ({row['category']}, effort {row['effort']}{due})").classes(
+                    "cursor-pointer text-sm",
+                ).on("click", lambda _, task_id=row["id"]: select_task(task_id))
+
+    plan_budget.on_value_change(refresh_plan)
+
+
+    # task_table.add_slot('header', r'''
+    #     <q-tr :props="props">
+    #         <q-th auto-width />
+    #         <q-th v-for="col in props.cols" :key="col.name" :props="props">
+    #             {{ col.label }}
+    #         </q-th>
+    #     </q-tr>
+    # ''')
+    # task_table.add_slot('body', r'''
+    #     <q-tr :props="props">
+    #         <q-td auto-width>
+    #             <q-btn size="sm" color="accent" round dense
+    #                 @click="props.expand = !props.expand"
+    #                 :icon="props.expand ? 'remove' : 'add'" />
+    #         </q-td>
+    #         <q-td v-for="col in props.cols" :key="col.name" :props="props">
+    #             {{ col.value }}
+    #         </q-td>
+    #     </q-tr>
+    #     <q-tr v-show="props.expand" :props="props">
+    #         <q-td colspan="100%">
+    #             <div class="text-left">{{ props.row.details }}</div>
+    #         </q-td>
+    #     </q-tr>
+    # ''')
+
+    # Action buttons
+    with ui.row().classes("gap-2"):
+
+        def do_add_task() -> None:
+            add_dialog.open()
+
+        def task_count(count: int) -> str:
+            return "Task" if count == 1 else f"{count} tasks"
+
+        @timed("do_mark_complete")
+        async def do_mark_complete() -> None:
+            if selected_row["ids"]:
+                await flush_task_updates()
+                rows = await db.mark_tasks_complete(selected_row["ids"])
+                ui.notify(f"{task_count(len(rows))} marked complete")
+
+        @timed("do_mark_not_complete")
+        async def do_mark_not_complete() -> None:
+            if selected_row["ids"]:
+                await flush_task_updates()
+                rows = await db.mark_tasks_incomplete(selected_row["ids"])
+                ui.notify(f"{task_count(len(rows))} marked incomplete")
+
+        @timed("do_delete")
+        async def do_delete() -> None:
+            if selected_row["ids"]:
+                # Archive the tasks as they are after any queued update
+                await flush_task_updates()
+                rows = await db.delete_tasks(selected_row["ids"])
+                clear_selected_rows()
+                ui.notify(f"{task_count(len(rows))} deleted")
+
+        @timed("open_edit_dialog")
+        async def open_edit_dialog() -> None:
+            if not selected_row["id"]:
+                return
+            if len(selected_row["ids"]) > 1:
+                bulk_edit_label.set_text(f"Edit {len(selected_row['ids'])} tasks")
+                bulk_edit_category.value = None
+                bulk_edit_priority.value = None
+                bulk_edit_dialog.open()
+                return
+            task = await db.get_task(selected_row["id"])
             if not task:
                 return
 
-            edit_name.value = task.name
-            edit_details.value = task.details
-            edit_category.value = task.category
-            edit_priority.value = int(task.priority)
-            edit_effort.value = int(task.effort)
-            edit_complete_by.value = task.complete_by.strftime('%Y-%m-%d') if task.complete_by else None
+            edit_name.value = task["name"]
+            edit_details.value = task["details"]
+            edit_category.value = task["category"]
+            # Tasks created through the API or imported may have neither
+            edit_priority.value = task["priority"]
+            edit_effort.value = task["effort"]
+            edit_complete_by.value = task["complete_by"]
             edit_dialog.open()
 
-    def do_clear() -> None:
-        if selected_row["id"] is not None:
-            task_table.run_grid_method("deselectAll")
-
-            selected_row["id"] = None
-
-    ui.button("✏️ Add task", on_click=do_add_task).props("color=orange")
-    ui.button("✅ Mark Complete", on_click=do_mark_complete).props(
-        "color=green",
-    ).bind_enabled_from(selected_row, "id")
-    ui.button("📝 Edit", on_click=open_edit_dialog).props(
-        "color=blue",
-    ).bind_enabled_from(selected_row, "id")
-    ui.button("🗑️ Delete", on_click=do_delete).props("color=red").bind_enabled_from(
-        selected_row,
-        "id",
-    )
-    ui.button("💥 Clear selection", on_click=do_clear).props(
-        "color=grey",
-    ).bind_enabled_from(selected_row, "id")
-    ToggleDetailsButton().props("color=brown")
-
-
-def validate_int(value):
-    try:
-        int(value)
-        return True
-    except: 
-        return False
-    
-
-# Add dialog
-with ui.dialog() as add_dialog, ui.card().style("width: 700px"):
-    ui.label("Add Task")
-    
-        
-    add_name = ui.input("Name").props("outlined").classes("w-full")
-    add_details = ui.textarea("Details").props("outlined").classes("w-full")
-    add_category = ui.input("Category", autocomplete=all_categories).props("outlined").classes("w-full")
-    add_priority = ui.input("Priority", validation={'Must be an int': validate_int}).props("outlined type=number").classes("w-full")
-    add_effort = ui.input("Effort", validation={'Must be an int': validate_int}).props("outlined type=number").classes("w-full")
-    add_complete_by = ui.date("Complete by").props("outlined").classes("w-40 text-sm p-1")
-
-    def handle_add() -> None:
+        async def do_block() -> None:
+            """Make the first selected task block the others."""
+            blocker, *blocked = selected_row["ids"]
+            if not blocked:
+                ui.notify("Select the blocking task first, then the tasks it blocks")
+                return
+            # Whether a blocker is open decides whether it blocks, so write queued updates first
+            await flush_task_updates()
+            try:
+                for task_id in blocked:
+                    await db.add_dependency(blocker, task_id)
+            except DependencyCycleError as e:
+                ui.notify(f"Can't block that task: {e} ❌")
+            else:
+                ui.notify(f"{task_count(len(blocked))} now blocked")
+
+        async def do_unblock() -> None:
+            """Stop the first selected task blocking the others."""
+            blocker, *blocked = selected_row["ids"]
+            if not blocked:
+                ui.notify("Select the blocking task first, then the tasks it blocks")
+                return
+            await flush_task_updates()
+            rows = [
+                row for task_id in blocked if (row := await db.remove_dependency(blocker, task_id))
+            ]
+            ui.notify(f"{task_count(len(rows))} no longer blocked by it")
+
+        def do_clear() -> None:
+            if selected_row["id"] is not None:
+                task_table.run_grid_method("deselectAll")
+
+                clear_selected_rows()
+
+        ui.button("✏️ Add task", on_click=do_add_task).props("color=orange")
+        ui.button("✅ Mark Complete", on_click=do_mark_complete).props(
+            "color=green",
+        ).bind_enabled_from(selected_row, "id")
+        ui.button("⬜ Mark Incomplete", on_click=do_mark_not_complete).props(
+            "color=teal",
+        ).bind_enabled_from(selected_row, "id")
+        ui.button("📝 Edit", on_click=open_edit_dialog).props(
+            "color=blue",
+        ).bind_enabled_from(selected_row, "id")
+        ui.button("🗑️ Delete", on_click=do_delete).props("color=red").bind_enabled_from(
+            selected_row,
+            "id",
+        )
+        ui.button("💥 Clear selection", on_click=do_clear).props(
+            "color=grey",
+        ).bind_enabled_from(selected_row, "id")
+        ui.button("⛓️ Block", on_click=do_block).props("color=purple").bind_enabled_from(
+            selected_row,
+            "id",
+        ).tooltip("The first selected task blocks the others")
+        ui.button("✂️ Unblock", on_click=do_unblock).props("color=purple outline").bind_enabled_from(
+            selected_row,
+            "id",
+        ).tooltip("The first selected task stops blocking the others")
+        ToggleDetailsButton().props("color=brown")
+
+        async def toggle_archive(e) -> None:
+            archive_visible["state"] = e.value
+            await refresh_task_list()
+
+        if not INFINITE_ROW_MODEL:
+            ui.switch("🗄️ Include archive", on_change=toggle_archive)
+
+        async def toggle_blocked(e) -> None:
+            blocked_hidden["state"] = e.value
+            await refresh_task_list()
+
+        ui.switch("⛔ Hide blocked", on_change=toggle_blocked)
+
+
+    def validate_int(value):
         try:
-            add_task(
-            add_name.value,
-            add_details.value,
-            add_category.value,
-            int(add_priority.value),
-            int(add_effort.value),
-            datetime.strptime(add_complete_by.value, '%Y-%m-%d')
-            )
-            refresh_task_list()
-            ui.notify("Task added ✅")
-        except Exception as e:
-            print(e)
-            ui.notify("Failed to add task ❌")
-        else:
-            add_dialog.close()
-            add_name.set_value(None)
-            add_details.set_value(None)
-            add_category.set_value(None)
-            add_priority.set_value(None)
-            add_effort.set_value(None)
-            add_complete_by.set_value(None)
-
-            
-
-    ui.button("Add Task", on_click=handle_add).bind_enabled_from(add_priority, "value").classes("bg-primary text-white")
-
-# Edit Dialog
-with ui.dialog() as edit_dialog, ui.card().style("width: 700px"):
-    ui.label("Edit Task")
-
-    edit_name = ui.input("Name").props("outlined").classes("w-full")
-    edit_details = ui.textarea("Details").props("outlined").classes("w-full")
-    edit_category = ui.input("Category", autocomplete=all_categories).props("outlined").classes("w-full")
-    edit_priority = ui.input("Priority", validation={'Must be an int': validate_int}).props("outlined type=number").classes("w-full")
-    edit_effort = ui.input("Effort", validation={'Must be an int': validate_int}).props("outlined type=number").classes("w-full")
-    edit_complete_by = ui.date("Complete by").props("outlined").classes("w-50")
-
-    def submit_edit() -> None:
-        if selected_row["id"]:
+            int(value)
+            return True
+        except: 
+            return False
+
+    def optional_int(value) -> int | None:
+        """Return the int in an input that may be left empty, or None if it is."""
+        return int(value) if value not in (None, "") else None
+
+
+    # Add dialog
+    with ui.dialog() as add_dialog, ui.card().style("width: 700px"):
+        ui.label("Add Task")
+
+
+        add_name = ui.input("Name").props("outlined").classes("w-full")
+        add_details = ui.textarea("Details").props("outlined").classes("w-full")
+        add_category = ui.input("Category", autocomplete=all_categories).props("outlined").classes("w-full")
+        add_priority = ui.input("Priority", validation={'Must be an int': validate_int}).props("outlined type=number").classes("w-full")
+        add_effort = ui.input("Effort", validation={'Must be an int': validate_int}).props("outlined type=number").classes("w-full")
+        add_complete_by = ui.date("Complete by").props("outlined").classes("w-40 text-sm p-1")
+
+        @timed("handle_add")
+        async def handle_add() -> None:
             try:
-                edit_task(
-                    selected_row["id"],
-                    edit_name.value,
-                    edit_details.value,
-                    edit_category.value,
-                    int(edit_priority.value),
-                    int(edit_effort.value),
-                    datetime.strptime(edit_complete_by.value, '%Y-%m-%d') if edit_complete_by.value else None
+                await db.add_task(
+                add_name.value,
+                add_details.value,
+                add_category.value,
+                int(add_priority.value),
+                int(add_effort.value),
+                datetime.strptime(add_complete_by.value, '%Y-%m-%d').date()
                 )
-                refresh_task_list()
-                ui.notify("Task updated ✅")
-            except Exception as e:
-                print(e)
-                ui.notify("Failed to edit task ❌")
-                
+                ui.notify("Task added ✅")
+            except Exception:
+                logger.exception("Failed to add task")
+                ui.notify("Failed to add task ❌")
             else:
+                add_dialog.close()
+                add_name.set_value(None)
+                add_details.set_value(None)
+                add_category.set_value(None)
+                add_priority.set_value(None)
+                add_effort.set_value(None)
+                add_complete_by.set_value(None)
+
+
+
+        ui.button("Add Task", on_click=handle_add).bind_enabled_from(add_priority, "value").classes("bg-primary text-white")
+
+    # Edit Dialog
+    with ui.dialog() as edit_dialog, ui.card().style("width: 700px"):
+        ui.label("Edit Task")
+
+        edit_name = ui.input("Name").props("outlined").classes("w-full")
+        edit_details = ui.textarea("Details").props("outlined").classes("w-full")
+        edit_category = ui.input("Category", autocomplete=all_categories).props("outlined").classes("w-full")
+        edit_priority = ui.input("Priority", validation={'Must be an int': lambda value: value in (None, "") or validate_int(value)}).props("outlined type=number").classes("w-full")
+        edit_effort = ui.input("Effort", validation={'Must be an int': lambda value: value in (None, "") or validate_int(value)}).props("outlined type=number").classes("w-full")
+        edit_complete_by = ui.date("Complete by").props("outlined").classes("w-50")
+
+        @timed("submit_edit")
+        async def submit_edit() -> None:
+            complete_by = (
+                datetime.strptime(edit_complete_by.value, '%Y-%m-%d').date()
+                if edit_complete_by.value
+                else None
+            )
+            if selected_row["id"] and task_updates is not None:
+                row = await db.get_task(selected_row["id"])
+                if row:
+                    queue_task_update(
+                        task_updates,
+                        row,
+                        name=edit_name.value,
+                        details=edit_details.value,
+                        category=edit_category.value,
+                        priority=optional_int(edit_priority.value),
+                        effort=optional_int(edit_effort.value),
+                        complete_by=complete_by,
+                    )
                 edit_dialog.close()
+            elif selected_row["id"]:
+                try:
+                    await db.edit_task(
+                        selected_row["id"],
+                        edit_name.value,
+                        edit_details.value,
+                        edit_category.value,
+                        optional_int(edit_priority.value),
+                        optional_int(edit_effort.value),
+                        complete_by,
+                    )
+                    ui.notify("Task updated ✅")
+                except Exception:
+                    logger.exception("Failed to edit task")
+                    ui.notify("Failed to edit task ❌")
+
+                else:
+                    edit_dialog.close()
+
+        ui.button("Save Changes", on_click=submit_edit).classes(
+            "mt-2 bg-primary text-white",
+        )
 
-    ui.button("Save Changes", on_click=submit_edit).classes(
-        "mt-2 bg-primary text-white",
-    )
+    # Bulk edit dialog, for when several tasks are selected
+    with ui.dialog() as bulk_edit_dialog, ui.card().style("width: 700px"):
+        bulk_edit_label = ui.label("Edit tasks")
+
+        bulk_edit_category = ui.input("Category (leave empty to keep)", autocomplete=all_categories).props("outlined").classes("w-full")
+        bulk_edit_priority = ui.input("Priority (leave empty to keep)", validation={'Must be an int': lambda value: not value or validate_int(value)}).props("outlined type=number").classes("w-full")
+
+        @timed("submit_bulk_edit")
+        async def submit_bulk_edit() -> None:
+            if selected_row["ids"]:
+                try:
+                    await flush_task_updates()
+                    rows = await db.edit_tasks(
+                        selected_row["ids"],
+                        category=bulk_edit_category.value or None,
+                        priority=(
+                            int(bulk_edit_priority.value) if bulk_edit_priority.value else None
+                        ),
+                    )
+                    ui.notify(f"{len(rows)} tasks updated ✅")
+                except Exception:
+                    logger.exception("Failed to edit tasks")
+                    ui.notify("Failed to edit tasks ❌")
+                else:
+                    bulk_edit_dialog.close()
+
+        ui.button("Save Changes", on_click=submit_bulk_edit).classes(
+            "mt-2 bg-primary text-white",
+        )
+
+
+    ui.separator()
+    category_row = ui.row().classes("gap-2")
 
+    # Workload dashboard, read from the summary table kept up to date by triggers
+    async def refresh_workload() -> None:
+        workload_table.rows = await db.get_workload()
+        workload_table.update()
+
+    with ui.expansion("📊 Workload", icon="insights").classes("w-full"):
+        workload_table = ui.table(
+            columns=[
+                {"name": "category", "label": "Category", "field": "category", "align": "left", "sortable": True},
+                {"name": "priority", "label": "Priority", "field": "priority", "sortable": True},
+                {"name": "open", "label": "Open tasks", "field": "open", "sortable": True},
+                {"name": "effort", "label": "Total effort", "field": "effort", "sortable": True},
+                {"name": "overdue", "label": "Overdue", "field": "overdue", "sortable": True},
+            ],
+            rows=[],
+            pagination=20,
+        ).props("dense flat").classes("w-full")
 
-def refresh_category_buttons():
-    category_row.clear()
-    with category_row:
-        for category in all_active_categories:
-            HideCategoryButton(category)
+    if INFINITE_ROW_MODEL:
+        ui.on("task_block_requested", serve_task_block)
 
+    # Initial load of tasks, then follow the changes made from any client
+    await update_task_list()
+    client.on_connect(subscribe_to_changes)
+    client.on_disconnect(unsubscribe_from_changes)
 
-ui.separator()
-category_row = ui.row().classes("gap-2")
 
-# Initial load of tasks
-update_task_list()
+if task_updates is not None:
+    # Write whatever is still queued before the process exits
+    app.on_shutdown(task_updates.flush)
 
+if maintenance is not None:
+    # Purge old archived tasks, refresh statistics and free space in the background
+    run_maintenance = maintenance.run_forever
+    app.on_startup(lambda: background_tasks.create(run_maintenance(), name="database maintenance"))
 
+if backups is not None:
+    # Back up every workspace's database every backup_interval_minutes
+    run_backups = backups.run_forever
+    app.on_startup(lambda: background_tasks.create(run_backups(), name="database backups"))
 
 ui.run()
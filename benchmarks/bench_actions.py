@@ -0,0 +1,223 @@
+"""Benchmarks of the actions in ``src.actions`` against synthetic task datasets.
+
+Every dataset size gets its own temporary database, seeded with tasks spread over categories,
+priorities, efforts and due dates. Besides durations, the peak memory allocated while reading
+the full task list is measured, for the column read of ``get_task_rows`` and for the baseline
+of building the rows from ``Task`` objects. Results are written as JSON so they can be
+compared between releases:
+    python -m benchmarks.bench_actions --sizes 1000 100000 --output bench.json
+"""
+import argparse
+import json
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+import sqlalchemy
+from sqlalchemy import insert, select
+
+from src import actions
+from src.model import ArchivedTask, Category, Task, configure_engine, init_db, session_scope
+from src.settings import DatabaseSettings
+
+DEFAULT_SIZES = (1_000, 100_000, 1_000_000)
+SEED_BATCH_SIZE = 50_000
+CATEGORY_COUNT = 60
+
+
+def seed_tasks(engine, size: int, rng: random.Random) -> None:
+    """Insert ``size`` tasks with a realistic spread of values.
+
+    A few categories hold most tasks (Zipf-like), priorities and efforts favour the middle,
+    due dates lie between a month ago and three months ahead (a fifth have none), and older
+    tasks are more likely to be complete or archived.
+    """
+    categories = [f"category-{i:02d}" for i in range(CATEGORY_COUNT)]
+    category_weights = [1 / (rank + 1) for rank in range(CATEGORY_COUNT)]
+    today = date.today()
+    archived_at = datetime.now()
+    with engine.begin() as connection:
+        connection.execute(insert(Category), [{"name": name} for name in categories])
+        for start in range(0, size, SEED_BATCH_SIZE):
+            rows = []
+            archived_rows = []
+            for i in range(start, min(start + SEED_BATCH_SIZE, size)):
+                age = i / size
+                row = {
+                    "name": f"Task {i}",
+                    "details": f"Details of task {i}, " * rng.randint(0, 4),
+                    "category_id": rng.choices(range(1, CATEGORY_COUNT + 1), category_weights)[0],
+                    "priority": rng.choices((1, 2, 3, 4, 5), (1, 3, 4, 3, 1))[0],
+                    "effort": rng.choices((1, 2, 3, 5, 8), (3, 4, 3, 2, 1))[0],
+                    "complete_by": (
+                        None if rng.random() < 0.2 else today + timedelta(days=rng.randint(-30, 90))
+                    ),
+                    "is_complete": rng.random() < 0.6 * (1 - age),
+                }
+                if rng.random() < 0.4 * (1 - age):
+                    archived_rows.append({**row, "task_id": i + 1, "archived_at": archived_at})
+                else:
+                    rows.append(row)
+            connection.execute(insert(Task), rows)
+            if archived_rows:
+                connection.execute(insert(ArchivedTask), archived_rows)
+
+
+def measure(
+    func: Callable[[], object], runs: int, setup: Callable[[], object] | None = None
+) -> list[float]:
+    """Call ``func`` ``runs`` times and return the durations in milliseconds."""
+    durations = []
+    for _ in range(runs):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+
+def measure_memory(
+    func: Callable[[], object], runs: int, setup: Callable[[], object] | None = None
+) -> list[float]:
+    """Call ``func`` ``runs`` times and return the peak memory each call allocated, in KiB."""
+    peaks = []
+    for _ in range(runs):
+        if setup is not None:
+            setup()
+        tracemalloc.start()
+        try:
+            func()
+            peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+        finally:
+            tracemalloc.stop()
+    return peaks
+
+
+def orm_task_rows() -> list[dict]:
+    """Build the full task list from ``Task`` objects loaded into the session, as
+    ``get_task_rows`` did before it read plain columns; the baseline of the column read."""
+    bounds = actions.due_bucket_bounds()
+    with session_scope() as session:
+        tasks = session.scalars(select(Task).order_by(*actions.TASK_LIST_ORDER)).all()
+        return [actions.task_to_row(task, bounds) for task in tasks]
+
+
+def summarise(size: int, name: str, durations: list[float], unit: str = "ms") -> dict:
+    ordered = sorted(durations)
+    return {
+        "size": size,
+        "benchmark": name,
+        "unit": unit,
+        "runs": len(ordered),
+        "min": round(ordered[0], 3),
+        "median": round(statistics.median(ordered), 3),
+        "mean": round(statistics.fmean(ordered), 3),
+        "p95": round(ordered[max(0, round(0.95 * len(ordered)) - 1)], 3),
+        "max": round(ordered[-1], 3),
+    }
+
+
+def run_size(
+    size: int, directory: Path, read_runs: int, write_runs: int, rng: random.Random
+) -> list[dict]:
+    """Seed a database of ``size`` tasks and benchmark the actions against it."""
+    engine = configure_engine(DatabaseSettings(path=str(directory / f"bench_{size}.db")))
+    init_db()
+    start = time.perf_counter()
+    seed_tasks(engine, size, rng)
+    results = [summarise(size, "seed", [(time.perf_counter() - start) * 1000])]
+
+    with engine.connect() as connection:
+        task_ids = list(connection.execute(select(Task.id)).scalars())
+
+    def random_id() -> int:
+        return rng.choice(task_ids)
+
+    # Reads are measured cold: bumping the data version empties the read cache
+    cold = actions.cache.bump
+    full_list_runs = max(1, read_runs // 5) if size >= 1_000_000 else read_runs
+    page_cursor = actions.get_task_page(100, offset=size // 4)[1]
+    # Name: (action, runs, setup before each run)
+    benchmarks: dict[str, tuple[Callable[[], object], int, Callable[[], object] | None]] = {
+        "get_categories": (actions.get_categories, read_runs, cold),
+        "get_task_rows": (actions.get_task_rows, full_list_runs, cold),
+        "task rows from ORM objects": (orm_task_rows, full_list_runs, None),
+        "get_task_rows (cached)": (actions.get_task_rows, read_runs, None),
+        "get_task_page first block": (lambda: actions.get_task_page(100), read_runs, cold),
+        "get_task_page deep block (keyset)": (
+            lambda: actions.get_task_page(100, after=page_cursor), read_runs, cold),
+        "get_task_page deep block (offset)": (
+            lambda: actions.get_task_page(100, offset=size // 4), read_runs, cold),
+        "get_workload": (actions.get_workload, read_runs, cold),
+        "add_task": (
+            lambda: actions.add_task("New task", "", "category-00", 3, 2, date.today()),
+            write_runs, None),
+        "edit_task": (
+            lambda: actions.edit_task(random_id(), "Edited", "", "category-01", 2, 3, None),
+            write_runs, None),
+        "mark_task_complete": (lambda: actions.mark_task_complete(random_id()), write_runs, None),
+        "delete_task": (lambda: actions.delete_task(task_ids.pop()), write_runs, None),
+    }
+    for name, (func, runs, setup) in benchmarks.items():
+        results.append(summarise(size, name, measure(func, runs, setup)))
+    # Tracing allocations is slow, so memory is measured over a few runs only
+    memory_runs = min(3, full_list_runs)
+    for name, func, setup in (
+        ("get_task_rows peak memory", actions.get_task_rows, cold),
+        ("task rows from ORM objects peak memory", orm_task_rows, None),
+    ):
+        results.append(summarise(size, name, measure_memory(func, memory_runs, setup), unit="KiB"))
+    engine.dispose()
+    return results
+
+
+def environment() -> dict:
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "sqlalchemy": sqlalchemy.__version__,
+        "sqlite": sqlite3.sqlite_version,
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="numbers of tasks to seed"
+    )
+    parser.add_argument("--read-runs", type=int, default=20, help="runs of each read benchmark")
+    parser.add_argument("--write-runs", type=int, default=50, help="runs of each write benchmark")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic data")
+    parser.add_argument(
+        "--output", type=Path, help="file to write the JSON results to (default: stdout)"
+    )
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            print(f"Benchmarking {size} tasks...", file=sys.stderr)
+            results.extend(run_size(size, Path(directory), args.read_runs, args.write_runs, rng))
+
+    report = json.dumps({"environment": environment(), "results": results}, indent=2)
+    if args.output:
+        args.output.write_text(report)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,56 +1,1082 @@
-from .model import Task, session_scope
+import dataclasses
+import functools
+import html
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
 
+from sqlalchemy import (
+    Result,
+    Row,
+    Select,
+    bindparam,
+    case,
+    delete,
+    exists,
+    false,
+    func,
+    insert,
+    literal,
+    or_,
+    select,
+    text,
+    tuple_,
+    update,
+)
 
-def add_task(name, details, category, priority, effort,complete_by) -> None:
+from .bus import ADDED, RELOAD, REMOVED, UPDATED, ChangeBus, TaskChange
+from .cache import VersionedCache
+from .model import (
+    SORT_LAST,
+    ArchivedTask,
+    Category,
+    Task,
+    TaskDependency,
+    TaskSummary,
+    current_workspace,
+    data_version,
+    session_scope,
+)
+from .settings import DatabaseSettings
+
+# Read-through cache of the task list, categories and single tasks. Every write action bumps
+# its data version, so reads are served from memory until something changes; so does a change
+# made by another process, see ``check_external_writes``.
+cache = VersionedCache(DatabaseSettings.from_env().cache_max_entries)
+# SQLite data version of each workspace's database as of the last write made (or change seen)
+# here, and the write actions running on each workspace
+_data_versions: dict[str, int] = {}
+_running_writes: Counter[str] = Counter()
+_data_versions_lock = threading.Lock()
+# Rows changed by write actions, applied by every connected client
+changes = ChangeBus()
+# Ids of tasks a running write action changed besides those it returns (the tasks blocked by
+# an archived task), published by ``writes`` along with them. Per thread, like the actions.
+_also_changed = threading.local()
+
+# Rows fetched from SQLite at a time when reading the whole task list
+ROW_CHUNK_SIZE = 1_000
+
+# Ordering of the task list, matching ``ix_task_list_order``. ``id`` is the tie-breaker that
+# makes the key unique, which keyset pagination relies on.
+TASK_LIST_ORDER = (
+    Task.complete_sort,
+    Task.due_sort,
+    Task.priority_sort,
+    Task.effort_sort,
+    Task.category_sort,
+    Task.id,
+)
+
+
+class DependencyCycleError(ValueError):
+    """Raised when a dependency would make a task block itself, directly or not."""
+
+
+def writes(kind: str = RELOAD):
+    """Decorate a write action so that it bumps the cache's data version once it has run,
+    and publishes what it changed on ``changes``.
+
+    Args:
+        kind: How the action's result is published: ``ADDED``, ``UPDATED`` or ``REMOVED``
+            for actions returning the grid rows they changed, ``RELOAD`` for the others.
+
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            _also_changed.task_ids = set()
+            try:
+                with own_writes():
+                    result = func(*args, **kwargs)
+            finally:
+                version = cache.bump()
+            change = TaskChange.from_result(kind, result, version, current_workspace.get())
+            if change is not None:
+                if kind in (UPDATED, REMOVED):
+                    change = _with_blocked_tasks(change, _also_changed.task_ids)
+                changes.publish(change)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def own_writes():
+    """Mark what is written to the current workspace's database within the block as written
+    by this process, so that ``check_external_writes`` doesn't take it for another's."""
+    workspace = current_workspace.get()
+    with _data_versions_lock:
+        _running_writes[workspace] += 1
+    try:
+        yield
+    finally:
+        with _data_versions_lock:
+            _running_writes[workspace] -= 1
+            _data_versions[workspace] = data_version()
+
+
+def check_external_writes() -> None:
+    """Reload everything if another process (an import, maintenance, a migration) changed the
+    current workspace's database since this process last looked.
+
+    The cache's data version is bumped and a reload published, so that clients and the
+    planner read the database afresh. Best effort: a change committed just as a write action
+    of this process ends is taken for that action's own.
+    """
+    workspace = current_workspace.get()
+    with _data_versions_lock:
+        if _running_writes[workspace]:
+            return
+        seen = _data_versions.get(workspace)
+        _data_versions[workspace] = current = data_version()
+    if seen is not None and seen != current:
+        changes.publish(TaskChange(cache.bump(), reload=True, workspace=workspace))
+
+
+def _with_blocked_tasks(change: TaskChange, task_ids) -> TaskChange:
+    """Add the rows of the tasks blocked by the changed tasks (and of ``task_ids``) to the
+    updated rows of ``change``, as completing, reopening or archiving a task changes how many
+    open blockers they have."""
+    changed = {row["id"] for row in (*change.updated, *change.removed)}
+    with session_scope() as session:
+        connection = session.connection()
+        query = select(TaskDependency.blocked_id).where(TaskDependency.blocker_id.in_(changed))
+        blocked = (set(connection.execute(query).scalars()) | task_ids) - changed
+        if not blocked:
+            return change
+        bounds = due_bucket_bounds()
+        records = connection.execute(active_tasks_query().where(Task.id.in_(blocked)))
+        rows = tuple(record_to_row(record, bounds) for record in records)
+    return dataclasses.replace(change, updated=change.updated + rows)
+
+
+def _note_blocked_tasks(session, task_ids) -> None:
+    """Remember the tasks blocked by ``task_ids`` for ``writes`` to publish, before archiving
+    the tasks removes the dependencies."""
+    query = select(TaskDependency.blocked_id).where(TaskDependency.blocker_id.in_(task_ids))
+    _also_changed.task_ids.update(session.scalars(query))
+
+
+def _cached(key: tuple, load):
+    """Read ``key`` of the current workspace through the read cache.
+
+    The data version is shared by every workspace, so a write to one of them also reloads
+    what is cached for the others; the keys keep their values apart.
+    """
+    check_external_writes()
+    return cache.get((current_workspace.get(), *key), load)
+
+
+def cache_stats() -> dict[str, int]:
+    """Return the data version and the hit/miss counters of the read cache."""
+    check_external_writes()
+    return cache.stats()
+
+
+@writes(ADDED)
+def add_task(name, details, category, priority, effort,complete_by) -> dict:
+    """Add a task and return its grid row."""
     with session_scope() as session:
         task = Task(
             name=name,
             details=details,
-            category=category.lower(),
+            category_id=category_id(session, category) if category else None,
             priority=priority,
             is_complete=False,
-            archived=False,
             effort=effort,
-            complete_by=complete_by
+            complete_by=as_date(complete_by)
         )
         session.add(task)
+        session.flush()
+        return task_to_row(task)
+
+
+@writes(RELOAD)
+def add_tasks(tasks: list[dict]) -> int:
+    """Add many tasks in one transaction and return how many were added.
+
+    The tasks are inserted with a single Core executemany rather than one ORM object each
+    (the ORM's bulk insert would split the batch wherever a column switches to ``None``).
+
+    Args:
+        tasks: Dicts with the ``name``, ``details``, ``category`` (name, or ``None``),
+            ``priority``, ``effort``, ``complete_by`` and ``is_complete`` of each task.
+
+    """
+    if not tasks:
+        return 0
+    with session_scope() as session:
+        _insert_tasks(session, tasks)
+    return len(tasks)
+
+
+@writes(ADDED)
+def create_tasks(tasks: list[dict]) -> list[dict]:
+    """Add a batch of tasks (as for ``add_tasks``) in one transaction and return their grid rows.
 
+    Unlike ``add_tasks``, meant for large imports, the new rows are read back and published.
+    """
+    if not tasks:
+        return []
+    with session_scope() as session:
+        task_ids = _insert_tasks(session, tasks, returning=True)
+        rows = {row["id"]: row for row in _task_rows(session, task_ids)}
+        return [rows[task_id] for task_id in task_ids]
+
+
+def _insert_tasks(session, tasks: list[dict], returning: bool = False) -> list[int]:
+    """Insert tasks with one statement, returning their new ids (in order) if asked to."""
+    category_ids = category_ids_by_name(
+        session, {task["category"] for task in tasks if task["category"]}
+    )
+    statement = insert(Task.__table__)
+    if returning:
+        statement = statement.returning(Task.__table__.c.id, sort_by_parameter_order=True)
+    result = session.connection().execute(
+        statement,
+        [
+            {
+                "name": task["name"],
+                "details": task["details"],
+                "category_id": category_ids[task["category"].lower()] if task["category"] else None,
+                "priority": task["priority"],
+                "is_complete": task["is_complete"],
+                "effort": task["effort"],
+                "complete_by": task["complete_by"],
+            }
+            for task in tasks
+        ],
+    )
+    return list(result.scalars()) if returning else []
 
-def delete_task(task_id) -> None:
+
+@writes(REMOVED)
+def delete_task(task_id) -> dict | None:
+    """Move a task to the archive and return its (now removed) grid row, if it exists."""
     with session_scope() as session:
         task = session.get(Task, task_id)
         if task:
-            task.archived = True
+            row = task_to_row(task)
+            _note_blocked_tasks(session, [task.id])
+            session.add(
+                ArchivedTask(
+                    task_id=task.id,
+                    name=task.name,
+                    details=task.details,
+                    category_id=task.category_id,
+                    priority=task.priority,
+                    is_complete=task.is_complete,
+                    complete_by=task.complete_by,
+                    effort=task.effort,
+                    archived_at=datetime.now(),
+                ),
+            )
+            session.delete(task)
+            return row
+        return None
 
 
-def mark_task_complete(task_id) -> None:
+@writes(UPDATED)
+def mark_task_complete(task_id) -> dict | None:
+    """Mark a task complete and return its updated grid row, if it exists."""
     with session_scope() as session:
         task = session.get(Task, task_id)
         if task:
             task.is_complete = True
+            return task_to_row(task)
+        return None
 
 
-def mark_task_incomplete(task_id) -> None:
+@writes(UPDATED)
+def mark_task_incomplete(task_id) -> dict | None:
+    """Mark a task incomplete and return its updated grid row, if it exists."""
     with session_scope() as session:
         task = session.get(Task, task_id)
         if task:
             task.is_complete = False
+            return task_to_row(task)
+        return None
 
 
-def edit_task(task_id, name, details, category, priority, effort, complete_by) -> None:
+@writes(UPDATED)
+def edit_task(task_id, name, details, category, priority, effort, complete_by) -> dict | None:
+    """Update a task and return its updated grid row, if it exists."""
     with session_scope() as session:
         task = session.get(Task, task_id)
         if task:
             task.name = name
             task.details = details
-            task.category = category
+            task.category_id = category_id(session, category) if category else None
             task.priority = priority
             task.effort = effort
-            task.complete_by = complete_by
+            task.complete_by = as_date(complete_by)
+            return task_to_row(task)
+        return None
 
-def get_unique_categories(active_only: bool) -> list[str]:
+
+@writes(UPDATED)
+def mark_tasks_complete(task_ids) -> list[dict]:
+    """Mark many tasks complete with one UPDATE and return their updated grid rows."""
+    return _update_tasks(task_ids, is_complete=True)
+
+
+@writes(UPDATED)
+def mark_tasks_incomplete(task_ids) -> list[dict]:
+    """Mark many tasks incomplete with one UPDATE and return their updated grid rows."""
+    return _update_tasks(task_ids, is_complete=False)
+
+
+@writes(UPDATED)
+def edit_tasks(task_ids, category: str | None = None, priority: int | None = None) -> list[dict]:
+    """Set the category and/or priority of many tasks and return their updated grid rows.
+
+    Fields passed as ``None`` are left as they are.
+    """
+    values = {}
+    if priority is not None:
+        values["priority"] = priority
+    with session_scope() as session:
+        if category:
+            values["category_id"] = category_id(session, category)
+        return _update_tasks(task_ids, session=session, **values)
+
+
+@writes(UPDATED)
+def update_tasks(updates: dict[int, dict]) -> list[dict]:
+    """Apply different updates to many tasks in one transaction and return their grid rows.
+
+    Tasks updating the same fields share one executemany UPDATE.
+
+    Args:
+        updates: The fields to set by task id. Fields are those of ``edit_task`` plus
+            ``is_complete``; ``category`` is a category name.
+
+    """
+    if not updates:
+        return []
     with session_scope() as session:
-        result = session.query(Task.category)
-        if active_only:
-            return [row[0] for row in result.filter_by(archived=False).distinct().all()]
-        return [row[0] for row in result.distinct().all()]
\ No newline at end of file
+        names = {fields["category"] for fields in updates.values() if fields.get("category")}
+        category_ids = category_ids_by_name(session, names) if names else {}
+        by_columns: dict[tuple[str, ...], list[dict]] = {}
+        for task_id, fields in updates.items():
+            values = dict(fields)
+            if "category" in values:
+                category = values.pop("category")
+                values["category_id"] = category_ids[category.lower()] if category else None
+            if values:
+                by_columns.setdefault(tuple(sorted(values)), []).append(
+                    {"task_id": task_id, **values}
+                )
+        statement = update(Task.__table__).where(Task.__table__.c.id == bindparam("task_id"))
+        for parameters in by_columns.values():
+            session.connection().execute(statement, parameters)
+        return _task_rows(session, list(updates))
+
+
+@writes(REMOVED)
+def delete_tasks(task_ids) -> list[dict]:
+    """Move many tasks to the archive and return their (now removed) grid rows.
+
+    The tasks are copied to ``archived_task`` with one INSERT ... SELECT and removed with
+    one DELETE, in a single transaction.
+    """
+    task_ids = list(task_ids)
+    if not task_ids:
+        return []
+    with session_scope() as session:
+        rows = _task_rows(session, task_ids)
+        _note_blocked_tasks(session, task_ids)
+        columns = (
+            "name", "details", "category_id", "priority", "is_complete", "complete_by", "effort"
+        )
+        session.execute(
+            insert(ArchivedTask).from_select(
+                ["task_id", *columns, "archived_at"],
+                select(
+                    Task.id,
+                    *(getattr(Task, column) for column in columns),
+                    literal(datetime.now()),
+                )
+                .where(Task.id.in_(task_ids)),
+            ),
+        )
+        session.execute(
+            delete(Task).where(Task.id.in_(task_ids)),
+            execution_options={"synchronize_session": False},
+        )
+        return rows
+
+
+@writes(UPDATED)
+def add_dependency(blocker_id, blocked_id) -> dict | None:
+    """Make a task block another and return the blocked task's updated grid row.
+
+    The tasks with dependencies are kept in a topological order (``Task.topo_order``), as
+    in Pearce and Kelly's algorithm: an edge agreeing with the order can't close a cycle and
+    is added without any search. Otherwise only the tasks placed between its two ends are
+    searched for a cycle, and reordered among themselves.
+
+    Returns ``None`` if either task does not exist.
+
+    Raises:
+        DependencyCycleError: If the blocked task already blocks the blocker, directly or
+            not, or they are the same task.
+
+    """
+    if blocker_id == blocked_id:
+        msg = "a task can't block itself"
+        raise DependencyCycleError(msg)
+    with session_scope() as session:
+        blocker, blocked = session.get(Task, blocker_id), session.get(Task, blocked_id)
+        if blocker is None or blocked is None:
+            return None
+        if session.get(TaskDependency, (blocker_id, blocked_id)) is None:
+            _order_dependency(session, blocker, blocked)
+            session.add(TaskDependency(blocker_id=blocker_id, blocked_id=blocked_id))
+            session.flush()
+            # Triggers have counted the new blocker
+            session.refresh(blocked)
+        return task_to_row(blocked)
+
+
+@writes(UPDATED)
+def remove_dependency(blocker_id, blocked_id) -> dict | None:
+    """Stop a task blocking another and return the blocked task's updated grid row, if the
+    dependency existed.
+
+    The topological order stays valid without the edge, so it is left as it is.
+    """
+    with session_scope() as session:
+        result = session.execute(
+            delete(TaskDependency).where(
+                TaskDependency.blocker_id == blocker_id,
+                TaskDependency.blocked_id == blocked_id,
+            ),
+        )
+        if not result.rowcount:
+            return None
+        return _task_rows(session, [blocked_id])[0]
+
+
+def _order_dependency(session, blocker: Task, blocked: Task) -> None:
+    """Place ``blocker`` before ``blocked`` in the topological order.
+
+    Tasks new to the graph go first (a blocker) or last (a blocked task), where they can't
+    be out of order. Otherwise, when the blocker is placed after the blocked task, the tasks
+    the blocked task leads to up to the blocker's place (F) and the tasks leading to the
+    blocker down to the blocked task's place (B) are the only ones that may need to move:
+    they swap around, B before F, within the places they held.
+
+    Raises:
+        DependencyCycleError: If the blocker is among F.
+
+    """
+    if blocker.topo_order is None or blocked.topo_order is None:
+        first, last = session.execute(
+            select(func.min(Task.topo_order), func.max(Task.topo_order))
+        ).one()
+        if blocker.topo_order is None:
+            blocker.topo_order = (first or 0) - 1
+        if blocked.topo_order is None:
+            blocked.topo_order = (last or 0) + 1
+        session.flush()
+    if blocker.topo_order < blocked.topo_order:
+        return
+
+    following = _reachable(session, blocked.id, blocker.topo_order, forward=True)
+    if blocker.id in following:
+        msg = f"task {blocked.id} already blocks task {blocker.id}"
+        raise DependencyCycleError(msg)
+    preceding = _reachable(session, blocker.id, blocked.topo_order, forward=False)
+    places = sorted([*preceding.values(), *following.values()])
+    tasks = sorted(preceding, key=preceding.__getitem__) + sorted(
+        following, key=following.__getitem__
+    )
+    session.connection().execute(
+        update(Task.__table__).where(Task.__table__.c.id == bindparam("task_id")),
+        [
+            {"task_id": task_id, "topo_order": place}
+            for task_id, place in zip(tasks, places, strict=True)
+        ],
+    )
+    session.expire(blocker, ["topo_order"])
+    session.expire(blocked, ["topo_order"])
+
+
+def _reachable(session, task_id: int, bound: int, forward: bool) -> dict[int, int]:
+    """Return the places in the topological order of a task and of the tasks it leads to
+    (``forward``) or that lead to it, going no further than the place ``bound``."""
+    source, target = TaskDependency.blocker_id, TaskDependency.blocked_id
+    if not forward:
+        source, target = target, source
+    within = Task.topo_order <= bound if forward else Task.topo_order >= bound
+    reached = select(literal(task_id).label("id")).cte("reached", recursive=True)
+    reached = reached.union(
+        select(target)
+        .join(reached, source == reached.c.id)
+        .join(Task, Task.id == target)
+        .where(within),
+    )
+    query = select(Task.id, Task.topo_order).join(reached, Task.id == reached.c.id)
+    return dict(session.execute(query).all())
+
+
+def _update_tasks(task_ids, session=None, **values) -> list[dict]:
+    """Apply ``values`` to the tasks with one UPDATE ... WHERE id IN and return their grid rows."""
+    task_ids = list(task_ids)
+    if not task_ids:
+        return []
+    if session is None:
+        with session_scope() as session:
+            return _update_tasks(task_ids, session, **values)
+    if values:
+        session.execute(
+            update(Task).where(Task.id.in_(task_ids)).values(**values),
+            execution_options={"synchronize_session": False},
+        )
+    return _task_rows(session, task_ids)
+
+
+def _task_rows(session, task_ids) -> list[dict]:
+    """Return the grid rows of the existing tasks among ``task_ids``."""
+    bounds = due_bucket_bounds()
+    tasks = session.scalars(select(Task).where(Task.id.in_(task_ids)))
+    return [task_to_row(task, bounds) for task in tasks]
+
+
+def get_dependencies(task_id) -> dict[str, list[int]]:
+    """Return the ids of the tasks blocking a task ("blockers") and of those it blocks
+    ("blocks")."""
+
+    def load() -> dict[str, list[int]]:
+        with session_scope() as session:
+            blockers = select(TaskDependency.blocker_id).where(TaskDependency.blocked_id == task_id)
+            blocks = select(TaskDependency.blocked_id).where(TaskDependency.blocker_id == task_id)
+            return {
+                "blockers": list(session.scalars(blockers)),
+                "blocks": list(session.scalars(blocks)),
+            }
+
+    return _cached(("dependencies", task_id), load)
+
+
+def get_task(task_id) -> dict | None:
+    """Return the grid row of a task, if it exists."""
+
+    def load() -> dict | None:
+        with session_scope() as session:
+            task = session.get(Task, task_id)
+            return task_to_row(task) if task else None
+
+    return _cached(("task", task_id, date.today()), load)
+
+
+def category_id(session, name: str) -> int:
+    """Return the id of a category by name, creating the category if needed.
+
+    Category names are stored lowercase, so "Work" and "work" are the same category.
+    """
+    name = name.lower()
+    found = session.scalar(select(Category.id).where(Category.name == name))
+    if found is not None:
+        return found
+    category = Category(name=name)
+    session.add(category)
+    session.flush()
+    return category.id
+
+
+def category_ids_by_name(session, names) -> dict[str, int]:
+    """Return the ids of categories by (lowercase) name, creating the missing ones in bulk."""
+    names = {name.lower() for name in names}
+    query = select(Category.name, Category.id).where(Category.name.in_(names))
+    found = {name: id_ for name, id_ in session.execute(query)}
+    missing = names - found.keys()
+    if missing:
+        session.execute(insert(Category), [{"name": name} for name in sorted(missing)])
+        query = select(Category.name, Category.id).where(Category.name.in_(missing))
+        found.update({name: id_ for name, id_ in session.execute(query)})
+    return found
+
+
+def get_unique_categories(active_only: bool) -> list[str]:
+    return list(get_category_ids(active_only))
+
+
+def get_category_ids(active_only: bool) -> dict[str, int]:
+    """Return the ids of the categories by name, optionally of active tasks only."""
+    return {name: id_ for name, id_, active in get_categories() if active or not active_only}
+
+
+def get_categories() -> list[tuple[str, int, bool]]:
+    """Return the name and id of every category, and whether it has active tasks, by name."""
+
+    def load() -> list[tuple[str, int, bool]]:
+        with session_scope() as session:
+            return [
+                (name, id_, bool(active))
+                for name, id_, active in session.execute(categories_query())
+            ]
+
+    return _cached(("categories",), load)
+
+
+def categories_query() -> Select:
+    """Select the name and id of every category, and whether it has active tasks."""
+    active = exists().where(Task.category_id == Category.id).label("active")
+    return select(Category.name, Category.id, active).order_by(Category.name)
+
+
+def active_tasks_query(
+    hidden_categories=(), after: list | None = None, hide_blocked: bool = False
+) -> Select:
+    """Select the grid columns of active tasks in list order.
+
+    Args:
+        hidden_categories: Ids of the categories to leave out.
+        after: Keyset cursor (see ``task_sort_cursor``); only tasks after it are selected.
+        hide_blocked: Leave out the tasks with open blockers.
+
+    """
+    query = _task_columns_query().order_by(*TASK_LIST_ORDER)
+    if hidden_categories:
+        # NOT IN is never true for NULL, which would hide the uncategorised tasks as well
+        query = query.where(
+            or_(Task.category_id.is_(None), Task.category_id.not_in(hidden_categories))
+        )
+    if hide_blocked:
+        query = query.where(Task.open_blocker_count == 0)
+    if after is not None:
+        is_complete, due, priority, effort, category, task_id = after
+        query = query.where(
+            tuple_(*TASK_LIST_ORDER)
+            > tuple_(is_complete, date.fromisoformat(due), priority, effort, category, task_id),
+        )
+    return query
+
+
+def ready_tasks_query(hidden_categories=(), after: list | None = None) -> Select:
+    """Select the grid columns of the tasks ready to start (open, with no open blockers) in
+    list order, read in order from ``ix_task_ready``."""
+    query = active_tasks_query(hidden_categories, after, hide_blocked=True)
+    return query.where(Task.complete_sort == false())
+
+
+def archived_tasks_query(hidden_categories=()) -> Select:
+    """Select the grid columns of archived tasks, most recently archived first."""
+    query = (
+        select(
+            *_row_columns(ArchivedTask),
+            literal(0).label("open_blocker_count"),
+            ArchivedTask.task_id,
+        )
+        .outerjoin(Category, Category.id == ArchivedTask.category_id)
+        .order_by(ArchivedTask.archived_at.desc(), ArchivedTask.id.desc())
+    )
+    if hidden_categories:
+        query = query.where(
+            or_(
+                ArchivedTask.category_id.is_(None),
+                ArchivedTask.category_id.not_in(hidden_categories),
+            ),
+        )
+    return query
+
+
+def _row_columns(model) -> tuple:
+    """Return the columns of ``model`` (``Task`` or ``ArchivedTask``) that make up a grid row."""
+    return (
+        model.id,
+        model.name,
+        model.details,
+        Category.name.label("category"),
+        model.category_id,
+        model.priority,
+        model.effort,
+        model.complete_by,
+        model.is_complete,
+    )
+
+
+def _task_columns_query() -> Select:
+    # The sort keys are selected for ``task_sort_cursor``
+    return select(*_row_columns(Task), Task.open_blocker_count, *TASK_LIST_ORDER[:-1]).outerjoin(
+        Category,
+        Category.id == Task.category_id,
+    )
+
+
+def as_date(value: date | datetime | None) -> date | None:
+    """Return a due date as a date, cutting a datetime (as parsed from a form) to its day."""
+    return value.date() if isinstance(value, datetime) else value
+
+
+def due_bucket_bounds(today: date | None = None) -> tuple[date, date]:
+    """Return today and the last day (Sunday) of this week, the bounds of the due buckets."""
+    today = today or date.today()
+    return today, today + timedelta(days=6 - today.weekday())
+
+
+def due_bucket(
+    complete_by: date | None, is_complete: bool | None, bounds: tuple[date, date]
+) -> str | None:
+    """Return how soon an open task is due: "overdue", "today", "this_week" or "later".
+
+    Args:
+        complete_by: The due date of the task.
+        is_complete: Whether the task is complete; complete tasks are not due.
+        bounds: Today and the end of the week, from ``due_bucket_bounds``.
+
+    """
+    if complete_by is None or is_complete:
+        return None
+    today, end_of_week = bounds
+    if complete_by < today:
+        return "overdue"
+    if complete_by == today:
+        return "today"
+    if complete_by <= end_of_week:
+        return "this_week"
+    return "later"
+
+
+def task_to_row(task: Task, bounds: tuple[date, date] | None = None) -> dict:
+    """Build the grid row for a task.
+
+    Args:
+        task: The task.
+        bounds: The due bucket bounds; pass them in when building many rows so that they
+            are only worked out once.
+
+    """
+    category = task.category.name if task.category else None
+    return _grid_row(task, category, bounds or due_bucket_bounds())
+
+
+def record_to_row(record: Row, bounds: tuple[date, date]) -> dict:
+    """Build the grid row for a row of ``active_tasks_query``, as ``task_to_row`` does for a
+    task."""
+    return _grid_row(record, record.category, bounds)
+
+
+def _grid_row(task: Task | Row, category: str | None, bounds: tuple[date, date]) -> dict:
+    return {
+        "id": task.id,
+        "name": task.name,
+        "details": task.details,
+        "category": category,
+        "category_id": task.category_id,
+        "priority": task.priority,
+        "effort": task.effort,
+        "complete_by": task.complete_by.isoformat() if task.complete_by else None,
+        "due_bucket": due_bucket(task.complete_by, task.is_complete, bounds),
+        "is_complete": "✅" if task.is_complete else "⬜",
+        # Open tasks blocking this one
+        "blocked_by": task.open_blocker_count or 0,
+    }
+
+
+def preview_row(row: dict, fields: dict, bounds: tuple[date, date] | None = None) -> dict:
+    """Return a grid row as it will look once ``fields`` (as passed to ``update_tasks``) are
+    written, so the UI can show an update before it is in the database."""
+    bounds = bounds or due_bucket_bounds()
+    row = dict(row)
+    for name in ("name", "details", "category", "priority", "effort"):
+        if name in fields:
+            value = fields[name]
+            row[name] = value.lower() if name == "category" and value else value
+    if "complete_by" in fields:
+        row["complete_by"] = fields["complete_by"].isoformat() if fields["complete_by"] else None
+    if "is_complete" in fields:
+        row["is_complete"] = "✅" if fields["is_complete"] else "⬜"
+    complete_by = date.fromisoformat(row["complete_by"]) if row["complete_by"] else None
+    row["due_bucket"] = due_bucket(complete_by, row["is_complete"] == "✅", bounds)
+    return row
+
+
+def row_sort_key(row: dict) -> tuple:
+    """Return where a grid row of an active task goes in list order (``TASK_LIST_ORDER``), so
+    the UI can place an added row among those it shows without reloading them."""
+    return (
+        row["is_complete"] == "✅",
+        row["complete_by"] or date.max.isoformat(),
+        SORT_LAST if row["priority"] is None else row["priority"],
+        SORT_LAST if row["effort"] is None else row["effort"],
+        row["category_id"] or 0,
+        row["id"],
+    )
+
+
+def archived_task_to_row(record: Row, bounds: tuple[date, date]) -> dict:
+    """Build the grid row for a row of ``archived_tasks_query``.
+
+    Its id is prefixed, as archived tasks have their own ids, which may clash with those of
+    active tasks.
+    """
+    row = record_to_row(record, bounds)
+    row.update(id=f"archived-{record.id}", task_id=record.task_id, due_bucket=None, archived=True)
+    return row
+
+
+def task_sort_cursor(task: Task | Row) -> list:
+    """Return the keyset cursor for a task (or a row of ``active_tasks_query``), matching
+    ``TASK_LIST_ORDER``."""
+    return [
+        bool(task.complete_sort),
+        task.due_sort.isoformat(),
+        task.priority_sort,
+        task.effort_sort,
+        task.category_sort,
+        task.id,
+    ]
+
+
+def _stream(session, query: Select) -> Result:
+    """Execute a column query on the session's connection, fetching ``ROW_CHUNK_SIZE`` rows at
+    a time; plain rows are returned, with no ORM objects or identity map involved."""
+    return session.connection().execute(query.execution_options(yield_per=ROW_CHUNK_SIZE))
+
+
+def get_task_rows(
+    hidden_categories=(), include_archive: bool = False, hide_blocked: bool = False
+) -> list[dict]:
+    """Return the grid rows of every active task, excluding the hidden category ids.
+
+    With ``include_archive``, the rows of archived tasks follow those of the active tasks.
+    With ``hide_blocked``, tasks with open blockers are left out.
+    """
+    bounds = due_bucket_bounds()
+
+    def load() -> list[dict]:
+        with session_scope() as session:
+            query = active_tasks_query(hidden_categories, hide_blocked=hide_blocked)
+            rows = [record_to_row(record, bounds) for record in _stream(session, query)]
+            if include_archive:
+                query = archived_tasks_query(hidden_categories)
+                rows.extend(
+                    archived_task_to_row(record, bounds) for record in _stream(session, query)
+                )
+            return rows
+
+    # Due buckets change at midnight, so cached rows are only valid on the day they were built
+    key = ("rows", frozenset(hidden_categories), include_archive, hide_blocked, bounds[0])
+    return _cached(key, load)
+
+
+def get_task_page(
+    limit: int,
+    after: list | None = None,
+    offset: int = 0,
+    hidden_categories=(),
+    hide_blocked: bool = False,
+) -> tuple[list[dict], list | None]:
+    """Return one block of active tasks in list order.
+
+    Blocks are fetched with keyset pagination: ``after`` is the cursor returned with the
+    previous block, so the query seeks straight to the next row instead of skipping over
+    all earlier ones. ``offset`` is only used when no cursor is known (e.g. the grid jumped
+    straight to a block further down).
+
+    Args:
+        limit: Maximum number of rows to return.
+        after: Cursor of the last row of the previous block.
+        offset: Number of rows to skip when ``after`` is not given.
+        hidden_categories: Ids of the categories to leave out.
+        hide_blocked: Leave out the tasks with open blockers.
+
+    Returns:
+        tuple: The rows of the block, and the cursor of its last row (``None`` when the
+        block is empty).
+
+    """
+    bounds = due_bucket_bounds()
+
+    def load() -> tuple[list[dict], list | None]:
+        with session_scope() as session:
+            query = active_tasks_query(hidden_categories, after, hide_blocked)
+            if after is None and offset:
+                query = query.offset(offset)
+            records = session.connection().execute(query.limit(limit)).all()
+            cursor = task_sort_cursor(records[-1]) if records else None
+            return [record_to_row(record, bounds) for record in records], cursor
+
+    key = (
+        "page",
+        limit,
+        tuple(after) if after else None,
+        offset,
+        frozenset(hidden_categories),
+        hide_blocked,
+        bounds[0],
+    )
+    return _cached(key, load)
+
+
+def list_tasks(
+    limit: int,
+    after: list | None = None,
+    sort: str = "list",
+    category_ids=None,
+    is_complete: bool | None = None,
+    ready: bool = False,
+) -> tuple[list[dict], list | None]:
+    """Return one page of active tasks, for API clients.
+
+    Args:
+        limit: Maximum number of rows to return.
+        after: Cursor returned with the previous page, matching ``sort``.
+        sort: "list" for the order of the task list, "id" for the order tasks were added.
+        category_ids: Only return tasks in these categories.
+        is_complete: Only return complete (``True``) or open (``False``) tasks.
+        ready: Only return the tasks ready to start (open, with no open blockers).
+
+    Returns:
+        tuple: The rows of the page, and the cursor of its last row (``None`` when the
+        page is empty).
+
+    """
+    bounds = due_bucket_bounds()
+
+    def load() -> tuple[list[dict], list | None]:
+        if sort == "id":
+            query = _task_columns_query().order_by(Task.id)
+            if after is not None:
+                query = query.where(Task.id > after[0])
+            if ready:
+                query = query.where(Task.complete_sort == false(), Task.open_blocker_count == 0)
+        elif ready:
+            query = ready_tasks_query(after=after)
+        else:
+            query = active_tasks_query(after=after)
+        if category_ids is not None:
+            query = query.where(Task.category_id.in_(category_ids))
+        if is_complete is not None:
+            query = query.where(Task.complete_sort == is_complete)
+        with session_scope() as session:
+            records = session.connection().execute(query.limit(limit)).all()
+            if not records:
+                return [], None
+            cursor = [records[-1].id] if sort == "id" else task_sort_cursor(records[-1])
+            return [record_to_row(record, bounds) for record in records], cursor
+
+    categories = frozenset(category_ids) if category_ids is not None else None
+    cursor = tuple(after) if after else None
+    key = ("list", limit, cursor, sort, categories, is_complete, ready, bounds[0])
+    return _cached(key, load)
+
+
+def workload_query(today: date) -> Select:
+    """Select the open task count, effort and overdue count per category and priority.
+
+    Reads ``task_summary``, so it scans one row per category, priority and due date rather
+    than every task.
+    """
+    return (
+        select(
+            TaskSummary.category_id,
+            TaskSummary.priority,
+            func.sum(TaskSummary.open_count).label("open"),
+            func.sum(TaskSummary.total_effort).label("effort"),
+            func.sum(
+                case((TaskSummary.due_date < today, TaskSummary.open_count), else_=0)
+            ).label("overdue"),
+        )
+        .group_by(TaskSummary.category_id, TaskSummary.priority)
+    )
+
+
+def get_workload() -> list[dict]:
+    """Return the open tasks, their effort and how many are overdue, per category and priority."""
+    today = date.today()
+
+    def load() -> list[dict]:
+        with session_scope() as session:
+            names = {id_: name for name, id_, _ in session.execute(categories_query())}
+            rows = [
+                {
+                    "category": names.get(row.category_id),
+                    "priority": row.priority,
+                    "open": row.open,
+                    "effort": row.effort,
+                    "overdue": row.overdue,
+                }
+                for row in session.execute(workload_query(today))
+            ]
+        return sorted(
+            rows,
+            key=lambda row: (row["category"] or "", row["priority"] is None, row["priority"] or 0),
+        )
+
+    # Overdue counts change at midnight
+    return _cached(("workload", today), load)
+
+
+# Markers placed around matches by FTS5, swapped for <mark> tags once the text is escaped
+_MATCH_START = "\x02"
+_MATCH_END = "\x03"
+
+SEARCH_QUERY = text(
+    f"""
+    SELECT
+        task.id,
+        highlight(task_fts, 0, '{_MATCH_START}', '{_MATCH_END}') AS name,
+        snippet(task_fts, 1, '{_MATCH_START}', '{_MATCH_END}', '…', 16) AS details,
+        category.name AS category
+    FROM task_fts
+    JOIN task ON task.id = task_fts.rowid
+    LEFT JOIN category ON category.id = task.category_id
+    WHERE task_fts MATCH :match
+    ORDER BY task_fts.rank
+    LIMIT :limit
+    """,
+)
+
+
+def fts_match_expression(query: str) -> str | None:
+    """Turn free text into an FTS5 query matching every word, the last one as a prefix.
+
+    Words are quoted so that FTS5 syntax in the search box can't make the query invalid.
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        return None
+    return " ".join([*(f'"{word}"' for word in words[:-1]), f'"{words[-1]}"*'])
+
+
+def highlighted_html(value: str | None) -> str:
+    """Escape text returned by ``SEARCH_QUERY`` and mark its matches with <mark> tags."""
+    escaped = html.escape(value or "")
+    return escaped.replace(_MATCH_START, "<mark>").replace(_MATCH_END, "</mark>")
+
+
+def search_tasks(query: str, limit: int = 20) -> list[dict]:
+    """Search the name and details of tasks, best matches first.
+
+    Returns:
+        list: A dict per matching task with its ``id``, ``category``, and its ``name`` and a
+        snippet of its ``details`` as HTML with the matches in <mark> tags.
+
+    """
+    match = fts_match_expression(query)
+    if match is None:
+        return []
+
+    def load() -> list[dict]:
+        with session_scope() as session:
+            return [
+                {
+                    "id": row.id,
+                    "name": highlighted_html(row.name),
+                    "details": highlighted_html(row.details),
+                    "category": row.category,
+                }
+                for row in session.execute(SEARCH_QUERY, {"match": match, "limit": limit})
+            ]
+
+    return _cached(("search", match, limit), load)
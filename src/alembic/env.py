@@ -1,3 +1,4 @@
+import logging
 from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
@@ -13,14 +14,26 @@ config = context.config
 # This line sets up loggers basically.
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
+logger = logging.getLogger('alembic.env')
 
 # add your model's MetaData object here
 # for 'autogenerate' support
 # from myapp import mymodel
 # target_metadata = mymodel.Base.metadata
-from src.model import Base, engine
+from src.model import Base
+from src.settings import DatabaseSettings
 target_metadata = Base.metadata
-config.set_main_option('sqlalchemy.url', str(engine.url).replace("%", "%%"))
+config.set_main_option('sqlalchemy.url', DatabaseSettings.from_env().url.replace("%", "%%"))
+
+
+def workspace_urls() -> dict[str, str]:
+    """Return the database URL of every workspace, by key, or only of the workspace given with
+    ``alembic -x workspace=<key> ...``."""
+    settings = DatabaseSettings.from_env()
+    workspace = context.get_x_argument(as_dictionary=True).get('workspace')
+    keys = [workspace] if workspace else settings.workspace_keys()
+    return {key: settings.for_workspace(key).url for key in keys}
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -39,16 +52,16 @@ def run_migrations_offline() -> None:
     script output.
 
     """
-    url = config.get_main_option("sqlalchemy.url")
-    context.configure(
-        url=url,
-        target_metadata=target_metadata,
-        literal_binds=True,
-        dialect_opts={"paramstyle": "named"},
-    )
+    for url in workspace_urls().values():
+        context.configure(
+            url=url,
+            target_metadata=target_metadata,
+            literal_binds=True,
+            dialect_opts={"paramstyle": "named"},
+        )
 
-    with context.begin_transaction():
-        context.run_migrations()
+        with context.begin_transaction():
+            context.run_migrations()
 
 
 def run_migrations_online() -> None:
@@ -58,19 +71,21 @@ def run_migrations_online() -> None:
     and associate a connection with the context.
 
     """
-    connectable = engine_from_config(
-        config.get_section(config.config_ini_section, {}),
-        prefix="sqlalchemy.",
-        poolclass=pool.NullPool,
-    )
-
-    with connectable.connect() as connection:
-        context.configure(
-            connection=connection, target_metadata=target_metadata
+    for workspace, url in workspace_urls().items():
+        logger.info("Migrating workspace %s", workspace)
+        connectable = engine_from_config(
+            {**config.get_section(config.config_ini_section, {}), "sqlalchemy.url": url},
+            prefix="sqlalchemy.",
+            poolclass=pool.NullPool,
         )
 
-        with context.begin_transaction():
-            context.run_migrations()
+        with connectable.connect() as connection:
+            context.configure(
+                connection=connection, target_metadata=target_metadata
+            )
+
+            with context.begin_transaction():
+                context.run_migrations()
 
 
 if context.is_offline_mode():
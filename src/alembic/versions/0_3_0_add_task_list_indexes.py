@@ -0,0 +1,44 @@
+"""add task list indexes
+
+Revision ID: 0_3_0
+Revises: 0_2_0
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '0_3_0'
+down_revision: Union[str, Sequence[str], None] = '0_2_0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'task',
+        sa.Column(
+            'due_sort',
+            sa.Date(),
+            sa.Computed("coalesce(complete_by, '9999-12-31')", persisted=False),
+        ),
+    )
+    op.create_index(
+        'ix_task_list_order',
+        'task',
+        ['archived', 'is_complete', 'due_sort', 'priority', 'effort'],
+    )
+    op.create_index('ix_task_archived_category', 'task', ['archived', 'category'])
+    op.create_index('ix_task_category', 'task', ['category'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_task_category', table_name='task')
+    op.drop_index('ix_task_archived_category', table_name='task')
+    op.drop_index('ix_task_list_order', table_name='task')
+    op.drop_column('task', 'due_sort')
@@ -0,0 +1,72 @@
+"""normalise categories
+
+Revision ID: 0_4_0
+Revises: 0_3_0
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '0_4_0'
+down_revision: Union[str, Sequence[str], None] = '0_3_0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'category',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name'),
+    )
+    # Categories were only lowercased when a task was added, not when it was edited
+    op.execute(
+        "INSERT INTO category (name) "
+        "SELECT DISTINCT lower(category) FROM task WHERE category IS NOT NULL"
+    )
+    # SQLite can add a column with a REFERENCES clause in place, alembic only via batch mode
+    op.execute("ALTER TABLE task ADD COLUMN category_id INTEGER REFERENCES category (id)")
+    op.execute(
+        "UPDATE task SET category_id = "
+        "(SELECT category.id FROM category WHERE category.name = lower(task.category))"
+    )
+
+    op.drop_index('ix_task_category', table_name='task')
+    op.drop_index('ix_task_archived_category', table_name='task')
+    op.drop_index('ix_task_list_order', table_name='task')
+    op.drop_column('task', 'category')
+    op.create_index(
+        'ix_task_list_order',
+        'task',
+        ['archived', 'is_complete', 'due_sort', 'priority', 'effort', 'category_id'],
+    )
+    op.create_index('ix_task_archived_category_id', 'task', ['archived', 'category_id'])
+    op.create_index('ix_task_category_id', 'task', ['category_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_task_category_id', table_name='task')
+    op.drop_index('ix_task_archived_category_id', table_name='task')
+    op.drop_index('ix_task_list_order', table_name='task')
+    op.add_column('task', sa.Column('category', sa.String(), nullable=True))
+    op.execute(
+        "UPDATE task SET category = "
+        "(SELECT category.name FROM category WHERE category.id = task.category_id)"
+    )
+    op.drop_column('task', 'category_id')
+    op.drop_table('category')
+    op.create_index(
+        'ix_task_list_order',
+        'task',
+        ['archived', 'is_complete', 'due_sort', 'priority', 'effort'],
+    )
+    op.create_index('ix_task_archived_category', 'task', ['archived', 'category'])
+    op.create_index('ix_task_category', 'task', ['category'])
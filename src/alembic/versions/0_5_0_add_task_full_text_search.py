@@ -0,0 +1,61 @@
+"""add task full-text search
+
+Revision ID: 0_5_0
+Revises: 0_4_0
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = '0_5_0'
+down_revision: Union[str, Sequence[str], None] = '0_4_0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        """
+        CREATE VIRTUAL TABLE task_fts USING fts5(
+            name, details, content='task', content_rowid='id', prefix='2 3'
+        )
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER task_fts_insert AFTER INSERT ON task BEGIN
+            INSERT INTO task_fts (rowid, name, details) VALUES (new.id, new.name, new.details);
+        END
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER task_fts_delete AFTER DELETE ON task BEGIN
+            INSERT INTO task_fts (task_fts, rowid, name, details)
+            VALUES ('delete', old.id, old.name, old.details);
+        END
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER task_fts_update AFTER UPDATE OF name, details ON task BEGIN
+            INSERT INTO task_fts (task_fts, rowid, name, details)
+            VALUES ('delete', old.id, old.name, old.details);
+            INSERT INTO task_fts (rowid, name, details) VALUES (new.id, new.name, new.details);
+        END
+        """
+    )
+    # Index the existing tasks
+    op.execute("INSERT INTO task_fts (task_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER task_fts_update")
+    op.execute("DROP TRIGGER task_fts_delete")
+    op.execute("DROP TRIGGER task_fts_insert")
+    op.execute("DROP TABLE task_fts")
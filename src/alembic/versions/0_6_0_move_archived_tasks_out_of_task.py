@@ -0,0 +1,79 @@
+"""move archived tasks out of task
+
+Revision ID: 0_6_0
+Revises: 0_5_0
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '0_6_0'
+down_revision: Union[str, Sequence[str], None] = '0_5_0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TASK_COLUMNS = "name, details, category_id, priority, is_complete, complete_by, effort"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'archived_task',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('task_id', sa.Integer(), nullable=True),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('details', sa.String(), nullable=True),
+        sa.Column('category_id', sa.Integer(), nullable=True),
+        sa.Column('priority', sa.Integer(), nullable=True),
+        sa.Column('is_complete', sa.Boolean(), nullable=True),
+        sa.Column('complete_by', sa.Date(), nullable=True),
+        sa.Column('effort', sa.Integer(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['category_id'], ['category.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_archived_task_task_id', 'archived_task', ['task_id'])
+    op.create_index('ix_archived_task_archived_at', 'archived_task', ['archived_at'])
+
+    # When tasks were archived was never recorded, so they count as archived now
+    op.execute(
+        f"INSERT INTO archived_task (task_id, {TASK_COLUMNS}, archived_at) "
+        f"SELECT id, {TASK_COLUMNS}, datetime('now', 'localtime') FROM task WHERE archived"
+    )
+    op.execute("DELETE FROM task WHERE archived")
+
+    op.drop_index('ix_task_archived_category_id', table_name='task')
+    op.drop_index('ix_task_list_order', table_name='task')
+    op.drop_column('task', 'archived')
+    op.create_index(
+        'ix_task_list_order',
+        'task',
+        ['is_complete', 'due_sort', 'priority', 'effort', 'category_id'],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_task_list_order', table_name='task')
+    op.add_column('task', sa.Column('archived', sa.Boolean(), nullable=True))
+    op.execute("UPDATE task SET archived = 0")
+    # Archived tasks get their old id back unless a new task has taken it since
+    op.execute(
+        f"INSERT INTO task (id, {TASK_COLUMNS}, archived) "
+        "SELECT CASE WHEN task_id IN (SELECT id FROM task) THEN NULL ELSE task_id END, "
+        f"{TASK_COLUMNS}, 1 "
+        "FROM archived_task ORDER BY id"
+    )
+    op.create_index(
+        'ix_task_list_order',
+        'task',
+        ['archived', 'is_complete', 'due_sort', 'priority', 'effort', 'category_id'],
+    )
+    op.create_index('ix_task_archived_category_id', 'task', ['archived', 'category_id'])
+    op.drop_index('ix_archived_task_archived_at', table_name='archived_task')
+    op.drop_index('ix_archived_task_task_id', table_name='archived_task')
+    op.drop_table('archived_task')
@@ -0,0 +1,97 @@
+"""add task summary
+
+Revision ID: 0_7_0
+Revises: 0_6_0
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '0_7_0'
+down_revision: Union[str, Sequence[str], None] = '0_6_0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SUMMARY_KEY = (
+    "category_id IS {row}.category_id AND priority IS {row}.priority"
+    " AND due_date IS {row}.complete_by"
+)
+SUMMARY_ADD = f"""
+        INSERT INTO task_summary (category_id, priority, due_date, open_count, total_effort)
+        SELECT new.category_id, new.priority, new.complete_by, 0, 0
+        WHERE NOT EXISTS (SELECT 1 FROM task_summary WHERE {SUMMARY_KEY.format(row="new")});
+        UPDATE task_summary
+        SET open_count = open_count + 1, total_effort = total_effort + coalesce(new.effort, 0)
+        WHERE {SUMMARY_KEY.format(row="new")};
+"""
+SUMMARY_REMOVE = f"""
+        UPDATE task_summary
+        SET open_count = open_count - 1, total_effort = total_effort - coalesce(old.effort, 0)
+        WHERE {SUMMARY_KEY.format(row="old")};
+        DELETE FROM task_summary WHERE {SUMMARY_KEY.format(row="old")} AND open_count <= 0;
+"""
+SUMMARY_COLUMNS = "is_complete, category_id, priority, complete_by, effort"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'task_summary',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('category_id', sa.Integer(), nullable=True),
+        sa.Column('priority', sa.Integer(), nullable=True),
+        sa.Column('due_date', sa.Date(), nullable=True),
+        sa.Column('open_count', sa.Integer(), nullable=False),
+        sa.Column('total_effort', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['category_id'], ['category.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_task_summary_key', 'task_summary', ['category_id', 'priority', 'due_date'])
+    # Backfill from the open tasks, then keep it up to date with triggers
+    op.execute(
+        """
+        INSERT INTO task_summary (category_id, priority, due_date, open_count, total_effort)
+        SELECT category_id, priority, complete_by, count(*), sum(coalesce(effort, 0))
+        FROM task
+        WHERE NOT coalesce(is_complete, 0)
+        GROUP BY category_id, priority, complete_by
+        """
+    )
+    op.execute(
+        f"""
+        CREATE TRIGGER task_summary_insert AFTER INSERT ON task
+        WHEN NOT coalesce(new.is_complete, 0) BEGIN{SUMMARY_ADD}    END
+        """
+    )
+    op.execute(
+        f"""
+        CREATE TRIGGER task_summary_delete AFTER DELETE ON task
+        WHEN NOT coalesce(old.is_complete, 0) BEGIN{SUMMARY_REMOVE}    END
+        """
+    )
+    op.execute(
+        f"""
+        CREATE TRIGGER task_summary_update_old AFTER UPDATE OF {SUMMARY_COLUMNS} ON task
+        WHEN NOT coalesce(old.is_complete, 0) BEGIN{SUMMARY_REMOVE}    END
+        """
+    )
+    op.execute(
+        f"""
+        CREATE TRIGGER task_summary_update_new AFTER UPDATE OF {SUMMARY_COLUMNS} ON task
+        WHEN NOT coalesce(new.is_complete, 0) BEGIN{SUMMARY_ADD}    END
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER task_summary_update_new")
+    op.execute("DROP TRIGGER task_summary_update_old")
+    op.execute("DROP TRIGGER task_summary_delete")
+    op.execute("DROP TRIGGER task_summary_insert")
+    op.drop_index('ix_task_summary_key', table_name='task_summary')
+    op.drop_table('task_summary')
@@ -0,0 +1,95 @@
+"""add task dependencies
+
+Revision ID: 0_8_0
+Revises: 0_7_0
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '0_8_0'
+down_revision: Union[str, Sequence[str], None] = '0_7_0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TRIGGERS = {
+    'task_dependency_insert': """
+        CREATE TRIGGER task_dependency_insert AFTER INSERT ON task_dependency BEGIN
+            UPDATE task SET open_blocker_count = open_blocker_count + 1
+            WHERE id = new.blocked_id
+            AND EXISTS (
+                SELECT 1 FROM task WHERE id = new.blocker_id AND NOT coalesce(is_complete, 0)
+            );
+        END
+    """,
+    'task_dependency_delete': """
+        CREATE TRIGGER task_dependency_delete AFTER DELETE ON task_dependency BEGIN
+            UPDATE task SET open_blocker_count = open_blocker_count - 1
+            WHERE id = old.blocked_id
+            AND EXISTS (
+                SELECT 1 FROM task WHERE id = old.blocker_id AND NOT coalesce(is_complete, 0)
+            );
+        END
+    """,
+    'task_blockers_update': """
+        CREATE TRIGGER task_blockers_update AFTER UPDATE OF is_complete ON task
+        WHEN coalesce(old.is_complete, 0) != coalesce(new.is_complete, 0) BEGIN
+            UPDATE task
+            SET open_blocker_count = open_blocker_count
+                + CASE WHEN new.is_complete THEN -1 ELSE 1 END
+            WHERE id IN (SELECT blocked_id FROM task_dependency WHERE blocker_id = new.id);
+        END
+    """,
+    'task_blockers_delete': """
+        CREATE TRIGGER task_blockers_delete AFTER DELETE ON task BEGIN
+            UPDATE task SET open_blocker_count = open_blocker_count - 1
+            WHERE NOT coalesce(old.is_complete, 0)
+            AND id IN (SELECT blocked_id FROM task_dependency WHERE blocker_id = old.id);
+            DELETE FROM task_dependency WHERE blocker_id = old.id;
+            DELETE FROM task_dependency WHERE blocked_id = old.id;
+        END
+    """,
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # No task has dependencies yet, so every count starts at 0
+    op.add_column(
+        'task',
+        sa.Column('open_blocker_count', sa.Integer(), nullable=False, server_default='0'),
+    )
+    op.add_column('task', sa.Column('topo_order', sa.Integer(), nullable=True))
+    op.create_table(
+        'task_dependency',
+        sa.Column('blocker_id', sa.Integer(), nullable=False),
+        sa.Column('blocked_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['blocker_id'], ['task.id']),
+        sa.ForeignKeyConstraint(['blocked_id'], ['task.id']),
+        sa.PrimaryKeyConstraint('blocker_id', 'blocked_id'),
+    )
+    op.create_index('ix_task_dependency_blocked', 'task_dependency', ['blocked_id', 'blocker_id'])
+    op.create_index(
+        'ix_task_ready',
+        'task',
+        ['is_complete', 'open_blocker_count', 'due_sort', 'priority', 'effort', 'category_id'],
+    )
+    op.create_index('ix_task_topo_order', 'task', ['topo_order'])
+    for statement in TRIGGERS.values():
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in reversed(TRIGGERS):
+        op.execute(f"DROP TRIGGER {name}")
+    op.drop_index('ix_task_topo_order', table_name='task')
+    op.drop_index('ix_task_ready', table_name='task')
+    op.drop_index('ix_task_dependency_blocked', table_name='task_dependency')
+    op.drop_table('task_dependency')
+    op.drop_column('task', 'topo_order')
+    op.drop_column('task', 'open_blocker_count')
@@ -0,0 +1,70 @@
+"""add list sort keys
+
+Revision ID: 0_9_0
+Revises: 0_8_0
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '0_9_0'
+down_revision: Union[str, Sequence[str], None] = '0_8_0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Sort key of a missing priority or effort, after every real one
+SORT_LAST = 2**63 - 1
+SORT_KEYS: dict[str, tuple[sa.types.TypeEngine, str]] = {
+    'complete_sort': (sa.Boolean(), "coalesce(is_complete, 0)"),
+    'priority_sort': (sa.Integer(), f"coalesce(priority, {SORT_LAST:d})"),
+    'effort_sort': (sa.Integer(), f"coalesce(effort, {SORT_LAST:d})"),
+    'category_sort': (sa.Integer(), "coalesce(category_id, 0)"),
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Virtual columns: computed on read, so adding them doesn't rewrite the table
+    for name, (type_, expression) in SORT_KEYS.items():
+        op.add_column('task', sa.Column(name, type_, sa.Computed(expression, persisted=False)))
+    op.drop_index('ix_task_ready', table_name='task')
+    op.drop_index('ix_task_list_order', table_name='task')
+    op.create_index(
+        'ix_task_list_order',
+        'task',
+        ['complete_sort', 'due_sort', 'priority_sort', 'effort_sort', 'category_sort'],
+    )
+    op.create_index(
+        'ix_task_ready',
+        'task',
+        [
+            'complete_sort',
+            'open_blocker_count',
+            'due_sort',
+            'priority_sort',
+            'effort_sort',
+            'category_sort',
+        ],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_task_ready', table_name='task')
+    op.drop_index('ix_task_list_order', table_name='task')
+    op.create_index(
+        'ix_task_list_order',
+        'task',
+        ['is_complete', 'due_sort', 'priority', 'effort', 'category_id'],
+    )
+    op.create_index(
+        'ix_task_ready',
+        'task',
+        ['is_complete', 'open_blocker_count', 'due_sort', 'priority', 'effort', 'category_id'],
+    )
+    for name in reversed(SORT_KEYS):
+        op.drop_column('task', name)
@@ -0,0 +1,288 @@
+"""JSON API over the actions in ``src.actions``, mounted on the app under ``/api``.
+
+Reads of tasks carry an ETag made of the read cache's data version, which changes with every
+write, so clients polling with ``If-None-Match`` get a cheap ``304 Not Modified`` until
+something changes.
+
+Requests work on the workspace named by the ``X-Todooey-Workspace`` header, or the default
+workspace without one.
+"""
+import base64
+import binascii
+import json
+import secrets
+from datetime import date
+from typing import Annotated
+
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field, field_validator
+
+from . import async_actions
+from .actions import DependencyCycleError, cache_stats
+from .model import current_workspace
+from .settings import DEFAULT_WORKSPACE, check_workspace_key
+from .write_behind import flush_task_updates
+
+
+async def request_workspace(x_todooey_workspace: str = Header(DEFAULT_WORKSPACE)) -> str:
+    """Work on the workspace named by the request's ``X-Todooey-Workspace`` header.
+
+    Set in the request's own context, so it lasts until the response and no longer.
+    """
+    try:
+        current_workspace.set(check_workspace_key(x_todooey_workspace))
+    except ValueError as e:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, str(e)) from None
+    return x_todooey_workspace
+
+
+router = APIRouter(prefix="/api", tags=["tasks"], dependencies=[Depends(request_workspace)])
+
+# Tells apart the data versions of different runs of the app, which all start counting at 0
+_RUN_ID = secrets.token_hex(4)
+
+MAX_PAGE_SIZE = 1_000
+MAX_BATCH_SIZE = 1_000
+# Writes to existing tasks first write the updates queued by the UI, which would otherwise
+# be written after them and undo them
+WRITES_EXISTING = [Depends(flush_task_updates)]
+
+
+class TaskCreate(BaseModel):
+    name: str = Field(min_length=1)
+    details: str = ""
+    category: str | None = None
+    priority: int | None = None
+    effort: int | None = None
+    complete_by: date | None = None
+    is_complete: bool = False
+
+
+class TaskUpdate(BaseModel):
+    """Fields to change; those left out are kept."""
+
+    name: str | None = Field(default=None, min_length=1)
+    details: str | None = None
+    category: str | None = None
+    priority: int | None = None
+    effort: int | None = None
+    complete_by: date | None = None
+    is_complete: bool | None = None
+
+    @field_validator("name", "is_complete")
+    @classmethod
+    def not_null(cls, value: str | bool | None) -> str | bool:
+        """Refuse null for the fields the task can't be without: they may only be left out."""
+        if value is None:
+            msg = "may be left out, but not null"
+            raise ValueError(msg)
+        return value
+
+
+class TaskBatchUpdate(TaskUpdate):
+    id: int
+
+
+def api_task(row: dict) -> dict:
+    """Turn a grid row into the API's representation of a task."""
+    return {**row, "is_complete": row["is_complete"] == "✅"}
+
+
+def etag() -> str:
+    """Return the ETag of whatever is read now: the workspace, the data version (and the
+    day, as due buckets change at midnight)."""
+    version = cache_stats()["version"]
+    return f'"{_RUN_ID}-{current_workspace.get()}-{version}-{date.today().isoformat()}"'
+
+
+def not_modified(request: Request, tag: str) -> bool:
+    """Return whether the client already has the representation tagged ``tag``."""
+    header = request.headers.get("if-none-match", "")
+    if header.strip() == "*":
+        return True
+    return tag in (value.strip().removeprefix("W/") for value in header.split(","))
+
+
+def task_not_found() -> JSONResponse:
+    # Returned rather than raised: NiceGUI renders raised 404s as its HTML error page
+    return JSONResponse({"detail": "Task not found"}, status_code=status.HTTP_404_NOT_FOUND)
+
+
+def encode_cursor(cursor: list | None) -> str | None:
+    if cursor is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+
+def decode_cursor(cursor: str | None) -> list | None:
+    if cursor is None:
+        return None
+    try:
+        decoded = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        decoded = None
+    if not isinstance(decoded, list):
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid cursor")
+    return decoded
+
+
+@router.get("/tasks", response_model=None)
+async def list_tasks(
+    request: Request,
+    response: Response,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = Query(None, description="next_cursor of the previous page"),
+    sort: str = Query(
+        "list", pattern="^(list|id)$", description="list order, or the order tasks were added"
+    ),
+    category: list[str] | None = Query(None, description="only tasks in these categories"),
+    is_complete: bool | None = None,
+    ready: bool = Query(
+        False, description="only tasks ready to start: open, with no open blockers"
+    ),
+) -> dict | Response:
+    """List active tasks a page at a time, with a cursor to the next page."""
+    # Taken before reading, so the tag never claims newer data than the response holds
+    tag = etag()
+    if not_modified(request, tag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": tag})
+    after = decode_cursor(cursor)
+    category_ids = None
+    if category is not None:
+        known = await async_actions.get_category_ids(active_only=False)
+        category_ids = [known[name.lower()] for name in category if name.lower() in known]
+    try:
+        rows, last = await async_actions.list_tasks(
+            limit, after, sort, category_ids, is_complete, ready
+        )
+    except (TypeError, ValueError):
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid cursor") from None
+    response.headers["ETag"] = tag
+    return {
+        "tasks": [api_task(row) for row in rows],
+        "next_cursor": encode_cursor(last) if len(rows) == limit else None,
+    }
+
+
+@router.get("/tasks/{task_id}", response_model=None)
+async def get_task(task_id: int, request: Request, response: Response) -> dict | Response:
+    tag = etag()
+    if not_modified(request, tag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": tag})
+    row = await async_actions.get_task(task_id)
+    if row is None:
+        return task_not_found()
+    response.headers["ETag"] = tag
+    return api_task(row)
+
+
+@router.post("/tasks", status_code=status.HTTP_201_CREATED)
+async def create_task(task: TaskCreate) -> dict:
+    rows = await async_actions.create_tasks([task.model_dump()])
+    return api_task(rows[0])
+
+
+@router.post("/tasks/batch", status_code=status.HTTP_201_CREATED)
+async def create_tasks(
+    tasks: Annotated[list[TaskCreate], Body(max_length=MAX_BATCH_SIZE)],
+) -> list[dict]:
+    """Create many tasks in one transaction."""
+    rows = await async_actions.create_tasks([task.model_dump() for task in tasks])
+    return [api_task(row) for row in rows]
+
+
+@router.patch("/tasks/batch", dependencies=WRITES_EXISTING)
+async def update_tasks(
+    updates: Annotated[list[TaskBatchUpdate], Body(max_length=MAX_BATCH_SIZE)],
+) -> list[dict]:
+    """Update many tasks in one transaction; tasks that don't exist are left out of the reply."""
+    by_id = {update.id: update.model_dump(exclude_unset=True, exclude={"id"}) for update in updates}
+    rows = await async_actions.update_tasks(by_id)
+    return [api_task(row) for row in rows]
+
+
+@router.patch("/tasks/{task_id}", response_model=None, dependencies=WRITES_EXISTING)
+async def update_task(task_id: int, update: TaskUpdate) -> dict | Response:
+    rows = await async_actions.update_tasks({task_id: update.model_dump(exclude_unset=True)})
+    if not rows:
+        return task_not_found()
+    return api_task(rows[0])
+
+
+@router.post("/tasks/{task_id}/complete", response_model=None, dependencies=WRITES_EXISTING)
+async def complete_task(task_id: int) -> dict | Response:
+    row = await async_actions.mark_task_complete(task_id)
+    if row is None:
+        return task_not_found()
+    return api_task(row)
+
+
+@router.post("/tasks/{task_id}/incomplete", response_model=None, dependencies=WRITES_EXISTING)
+async def reopen_task(task_id: int) -> dict | Response:
+    row = await async_actions.mark_task_incomplete(task_id)
+    if row is None:
+        return task_not_found()
+    return api_task(row)
+
+
+@router.post("/tasks/{task_id}/archive", response_model=None, dependencies=WRITES_EXISTING)
+async def archive_task(task_id: int) -> dict | Response:
+    """Move a task to the archive, as deleting it from the UI does."""
+    row = await async_actions.delete_task(task_id)
+    if row is None:
+        return task_not_found()
+    return api_task(row)
+
+
+@router.get("/tasks/{task_id}/dependencies", response_model=None)
+async def get_dependencies(task_id: int, request: Request, response: Response) -> dict | Response:
+    """Return the ids of the tasks blocking a task and of those it blocks."""
+    tag = etag()
+    if not_modified(request, tag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": tag})
+    if await async_actions.get_task(task_id) is None:
+        return task_not_found()
+    response.headers["ETag"] = tag
+    return await async_actions.get_dependencies(task_id)
+
+
+@router.put(
+    "/tasks/{task_id}/blockers/{blocker_id}",
+    response_model=None,
+    dependencies=WRITES_EXISTING,
+)
+async def add_blocker(task_id: int, blocker_id: int) -> dict | Response:
+    """Make the task ``blocker_id`` block the task; returns the blocked task."""
+    try:
+        row = await async_actions.add_dependency(blocker_id, task_id)
+    except DependencyCycleError as e:
+        raise HTTPException(status.HTTP_409_CONFLICT, str(e)) from None
+    if row is None:
+        return task_not_found()
+    return api_task(row)
+
+
+@router.delete(
+    "/tasks/{task_id}/blockers/{blocker_id}",
+    response_model=None,
+    dependencies=WRITES_EXISTING,
+)
+async def remove_blocker(task_id: int, blocker_id: int) -> dict | Response:
+    """Stop the task ``blocker_id`` blocking the task; returns the task."""
+    row = await async_actions.remove_dependency(blocker_id, task_id)
+    if row is None:
+        return JSONResponse(
+            {"detail": "Dependency not found"}, status_code=status.HTTP_404_NOT_FOUND
+        )
+    return api_task(row)
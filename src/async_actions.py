@@ -0,0 +1,95 @@
+"""Awaitable versions of the actions in ``src.actions``.
+
+Each action runs on a bounded pool of database threads, so a slow query does not block the
+event loop (and with it the UI of every connected client). The pool is as large as the
+engine's connection pool, so queued work waits for a thread rather than for a connection.
+The caller's context goes along, so the action works on the caller's workspace.
+"""
+import asyncio
+import contextvars
+import functools
+import inspect
+from collections.abc import Awaitable, Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import ParamSpec, TypeVar
+
+from . import actions, planner
+from .model import use_workspace
+from .settings import DatabaseSettings
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+executor = ThreadPoolExecutor(
+    max_workers=DatabaseSettings.from_env().pool_size,
+    thread_name_prefix="todooey-db",
+)
+
+
+async def run_in_db_thread(func: Callable[P, R], *args: P.args, **kwargs: P.kwargs) -> R:
+    """Run a blocking database function on the database thread pool, in a copy of the
+    caller's context, and await its result."""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    return await loop.run_in_executor(executor, call)
+
+
+def in_db_thread(func: Callable[P, R]) -> Callable[P, Awaitable[R]]:
+    """Wrap a blocking database function into a coroutine function run by ``run_in_db_thread``."""
+
+    @functools.wraps(func)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        return await run_in_db_thread(func, *args, **kwargs)
+
+    return wrapper
+
+
+add_task = in_db_thread(actions.add_task)
+delete_task = in_db_thread(actions.delete_task)
+mark_task_complete = in_db_thread(actions.mark_task_complete)
+mark_task_incomplete = in_db_thread(actions.mark_task_incomplete)
+edit_task = in_db_thread(actions.edit_task)
+mark_tasks_complete = in_db_thread(actions.mark_tasks_complete)
+mark_tasks_incomplete = in_db_thread(actions.mark_tasks_incomplete)
+delete_tasks = in_db_thread(actions.delete_tasks)
+edit_tasks = in_db_thread(actions.edit_tasks)
+update_tasks = in_db_thread(actions.update_tasks)
+create_tasks = in_db_thread(actions.create_tasks)
+add_dependency = in_db_thread(actions.add_dependency)
+remove_dependency = in_db_thread(actions.remove_dependency)
+get_task = in_db_thread(actions.get_task)
+get_dependencies = in_db_thread(actions.get_dependencies)
+get_unique_categories = in_db_thread(actions.get_unique_categories)
+get_category_ids = in_db_thread(actions.get_category_ids)
+get_categories = in_db_thread(actions.get_categories)
+get_task_rows = in_db_thread(actions.get_task_rows)
+get_task_page = in_db_thread(actions.get_task_page)
+list_tasks = in_db_thread(actions.list_tasks)
+search_tasks = in_db_thread(actions.search_tasks)
+get_workload = in_db_thread(actions.get_workload)
+plan_day = in_db_thread(planner.plan_day)
+
+
+class WorkspaceActions:
+    """The actions of this module, run on one workspace whatever the caller's context.
+
+    For callers that can't rely on ``current_workspace``: NiceGUI runs UI event handlers
+    outside the context of the page that registered them, so a page binds its actions to its
+    workspace with ``db = WorkspaceActions(workspace)`` and calls ``await db.add_task(...)``.
+    """
+
+    def __init__(self, workspace: str) -> None:
+        self.workspace = workspace
+
+    def __getattr__(self, name: str) -> Callable[..., Awaitable]:
+        action = globals().get(name)
+        if not inspect.iscoroutinefunction(action):
+            raise AttributeError(name)
+
+        @functools.wraps(action)
+        async def in_workspace(*args, **kwargs):
+            with use_workspace(self.workspace):
+                return await action(*args, **kwargs)
+
+        return in_workspace
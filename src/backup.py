@@ -0,0 +1,381 @@
+"""Online backups of the workspaces' databases, verified and restorable.
+
+Backups use SQLite's online backup API, copying ``backup_step_pages`` pages at a time with a
+``backup_pause_ms`` pause between steps, so the app's writers get the lock in between (with
+WAL they are never blocked by a copy step anyway). A write made between two steps starts the
+copy over; after ``MAX_RESTARTS`` of those the rest is copied in a single step, so a busy
+database still gets backed up.
+
+Each backup is a file in ``backup_dir`` named after its workspace and the UTC time it was
+made, gzipped unless ``backup_gzip`` is off, next to a JSON manifest of the row count of
+every table. Only the ``backup_keep`` latest backups of each workspace are kept. Verifying a
+backup checks its integrity, its foreign keys and its row counts against the manifest.
+
+    python -m src.backup create
+    python -m src.backup list
+    python -m src.backup verify runtime/backups/default-20261018-093000.db.gz
+    python -m src.backup restore runtime/backups/default-20261018-093000.db.gz
+
+Restoring replaces the workspace's database with a backup, once it is verified. Restore with
+the app stopped, so that no one is editing tasks the restore then takes back.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from pathlib import Path
+
+from .actions import writes
+from .async_actions import run_in_db_thread
+from .metrics import backup_restarts, backup_seconds
+from .model import current_workspace, get_engine, sqlite_connection, use_workspace
+from .settings import DatabaseSettings, check_workspace_key
+
+logger = logging.getLogger("todooey.backup")
+
+# Restarts after which the rest of a backup is copied in a single step
+MAX_RESTARTS = 3
+# Name of a backup file: the workspace and the UTC time the backup was made
+BACKUP_NAME = re.compile(r"(?P<workspace>.+)-(?P<made_at>\d{8}-\d{6})\.db(?:\.gz)?")
+TIME_FORMAT = "%Y%m%d-%H%M%S"
+
+
+class BackupError(Exception):
+    """Raised when a backup can't be restored, as it failed verification."""
+
+
+class _TooManyRestarts(Exception):
+    """Raised from the progress callback to stop copying a backup step by step."""
+
+
+@dataclass
+class BackupReport:
+    """What making a backup did."""
+
+    path: Path
+    # Pages of the database copied
+    pages: int = 0
+    # Times the copy started over as the database was written to meanwhile
+    restarts: int = 0
+    # Whether the copy was finished in a single step after too many restarts
+    single_step: bool = False
+    # Rows in each table of the backup
+    counts: dict[str, int] = field(default_factory=dict)
+    seconds: float = 0.0
+
+    def summary(self) -> str:
+        restarts = f", {self.restarts} restarts" if self.restarts else ""
+        single_step = ", finished in one step" if self.single_step else ""
+        tasks = self.counts.get("task", 0)
+        return (
+            f"backed up {tasks} tasks ({self.pages} pages) to {self.path} "
+            f"in {self.seconds:.2f}s{restarts}{single_step}"
+        )
+
+
+@dataclass
+class Verification:
+    """What verifying a backup found."""
+
+    path: Path
+    # Rows in each table of the backup
+    counts: dict[str, int] = field(default_factory=dict)
+    # Why the backup can't be trusted; none if it can
+    problems: list[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.problems
+
+
+def manifest_path(path: Path) -> Path:
+    """Return the path of the manifest of the backup at ``path``."""
+    return path.with_name(path.name.removesuffix(".gz").removesuffix(".db") + ".json")
+
+
+def list_backups(
+    settings: DatabaseSettings, workspace: str | None = None
+) -> list[tuple[str, datetime, Path]]:
+    """Return the workspace, time and path of every backup (of ``workspace`` only, if given),
+    newest first."""
+    backups = []
+    for path in Path(settings.backup_dir).glob("*.db*"):
+        match = BACKUP_NAME.fullmatch(path.name)
+        if match and workspace in (None, match["workspace"]):
+            made_at = datetime.strptime(match["made_at"], TIME_FORMAT).replace(tzinfo=UTC)
+            backups.append((match["workspace"], made_at, path))
+    return sorted(backups, key=lambda backup: backup[1], reverse=True)
+
+
+def table_counts(connection: sqlite3.Connection) -> dict[str, int]:
+    """Return the number of rows in each table of a database."""
+    tables = connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+        " ORDER BY name",
+    ).fetchall()
+    return {
+        name: connection.execute(f'SELECT count(*) FROM "{name}"').fetchone()[0]
+        for (name,) in tables
+    }
+
+
+def copy_database(
+    source: sqlite3.Connection, target: sqlite3.Connection, pages: int, pause: float
+) -> BackupReport:
+    """Copy the database of ``source`` into ``target`` a step of ``pages`` pages at a time,
+    pausing ``pause`` seconds between steps; see the module docstring."""
+    report = BackupReport(path=Path())
+    remaining_before = None
+
+    def progress(status: int, remaining: int, total: int) -> None:
+        nonlocal remaining_before
+        report.pages = total
+        # A step that went through copies pages, so if as many are left (or more) the copy
+        # started over; a write between every step never gets it further than one step
+        if (
+            status == sqlite3.SQLITE_OK
+            and remaining_before is not None
+            and remaining >= remaining_before
+        ):
+            report.restarts += 1
+            backup_restarts.inc()
+            if report.restarts > MAX_RESTARTS:
+                raise _TooManyRestarts
+        remaining_before = remaining
+        if remaining:
+            # The source is unlocked between steps; sqlite3 only sleeps when it is busy
+            time.sleep(pause)
+
+    try:
+        source.backup(target, pages=pages, progress=progress, sleep=pause)
+    except _TooManyRestarts:
+        report.single_step = True
+        source.backup(target)
+    return report
+
+
+def make_backup(settings: DatabaseSettings) -> BackupReport:
+    """Back up the current workspace's database into ``settings.backup_dir``, then delete
+    its backups beyond the ``settings.backup_keep`` latest."""
+    workspace = current_workspace.get()
+    start = time.perf_counter()
+    directory = Path(settings.backup_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+    made_at = datetime.now(UTC)
+    path = directory / f"{workspace}-{made_at.strftime(TIME_FORMAT)}.db"
+    partial = path.with_name(f"{path.name}.partial")
+
+    source = get_engine().raw_connection()
+    try:
+        target = sqlite3.connect(partial)
+        try:
+            report = copy_database(
+                sqlite_connection(source),
+                target,
+                max(settings.backup_step_pages, 1),
+                settings.backup_pause_ms / 1000,
+            )
+            # A standalone file, rather than one expecting a -wal file next to it
+            target.execute("PRAGMA journal_mode = DELETE")
+            report.counts = table_counts(target)
+        finally:
+            target.close()
+    finally:
+        source.close()
+
+    if settings.backup_gzip:
+        path = path.with_name(f"{path.name}.gz")
+        compressed_partial = partial.with_name(f"{path.name}.partial")
+        with partial.open("rb") as raw, gzip.open(compressed_partial, "wb") as compressed:
+            shutil.copyfileobj(raw, compressed)
+        partial.unlink()
+        partial = partial.with_name(f"{path.name}.partial")
+    manifest = {"workspace": workspace, "made_at": made_at.isoformat(), "counts": report.counts}
+    manifest_path(path).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    partial.replace(path)
+
+    for _, _, old in list_backups(settings, workspace)[max(settings.backup_keep, 1):]:
+        old.unlink(missing_ok=True)
+        manifest_path(old).unlink(missing_ok=True)
+
+    report.path = path
+    report.seconds = time.perf_counter() - start
+    backup_seconds.observe(report.seconds)
+    logger.info("Backup of workspace %s: %s", workspace, report.summary())
+    return report
+
+
+@contextmanager
+def opened_backup(path: Path) -> Iterator[Path]:
+    """Yield the path of the database of a backup, decompressed into a temporary file if it
+    is gzipped."""
+    if path.suffix != ".gz":
+        yield path
+        return
+    with tempfile.TemporaryDirectory() as directory:
+        database = Path(directory) / path.name.removesuffix(".gz")
+        with gzip.open(path, "rb") as compressed, database.open("wb") as raw:
+            shutil.copyfileobj(compressed, raw)
+        yield database
+
+
+def verify_backup(path: Path) -> Verification:
+    """Check a backup's integrity, foreign keys and row counts (against its manifest)."""
+    verification = Verification(path)
+    try:
+        with opened_backup(path) as database:
+            connection = sqlite3.connect(f"file:{database}?mode=ro", uri=True)
+            try:
+                integrity = [row[0] for row in connection.execute("PRAGMA integrity_check")]
+                if integrity != ["ok"]:
+                    verification.problems.extend(integrity)
+                broken_keys = connection.execute("PRAGMA foreign_key_check").fetchall()
+                if broken_keys:
+                    verification.problems.append(
+                        f"{len(broken_keys)} rows with broken foreign keys"
+                    )
+                verification.counts = table_counts(connection)
+            finally:
+                connection.close()
+    except (OSError, EOFError, sqlite3.DatabaseError) as e:
+        verification.problems.append(f"unreadable: {e}")
+        return verification
+
+    try:
+        expected = json.loads(manifest_path(path).read_text(encoding="utf-8"))["counts"]
+    except (OSError, ValueError, KeyError):
+        verification.problems.append("no readable manifest to check the row counts against")
+        return verification
+    for table in sorted(expected.keys() | verification.counts.keys()):
+        if expected.get(table) != verification.counts.get(table):
+            verification.problems.append(
+                f"{table} has {verification.counts.get(table)} rows,"
+                f" the manifest says {expected.get(table)}",
+            )
+    return verification
+
+
+@writes()
+def restore_backup(path: Path) -> Verification:
+    """Replace the current workspace's database with a backup, once it is verified.
+
+    Raises:
+        BackupError: If the backup failed verification; the database is left as it was.
+
+    """
+    verification = verify_backup(path)
+    if not verification.ok:
+        msg = f"{path} failed verification: {'; '.join(verification.problems)}"
+        raise BackupError(msg)
+    with opened_backup(path) as database:
+        source = sqlite3.connect(f"file:{database}?mode=ro", uri=True)
+        target = get_engine().raw_connection()
+        try:
+            # In one step: the database is never left half restored
+            source.backup(sqlite_connection(target))
+        finally:
+            target.close()
+            source.close()
+    logger.info("Restored workspace %s from %s", current_workspace.get(), path)
+    return verification
+
+
+class BackupScheduler:
+    """Backs up every workspace every ``backup_interval_minutes``, from the event loop."""
+
+    def __init__(self, settings: DatabaseSettings) -> None:
+        self.settings = settings
+        self.interval = settings.backup_interval_minutes * 60
+
+    async def run(self) -> dict[str, BackupReport]:
+        """Back up every workspace now, one after the other on a database thread.
+
+        A workspace whose backup fails is logged and left for the next run.
+        """
+        reports = {}
+        for workspace in self.settings.workspace_keys():
+            try:
+                with use_workspace(workspace):
+                    reports[workspace] = await run_in_db_thread(make_backup, self.settings)
+            except Exception:
+                logger.exception("Backup of workspace %s failed", workspace)
+        return reports
+
+    async def run_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.run()
+
+
+def create_backups(settings: DatabaseSettings) -> BackupScheduler | None:
+    """Return the backup scheduler for ``settings``, or ``None`` if backups are on demand only."""
+    if not settings.backup_interval_minutes or settings.in_memory:
+        return None
+    return BackupScheduler(settings)
+
+
+backups = create_backups(DatabaseSettings.from_env())
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create", help="back up every workspace, or only --workspace")
+    create.add_argument("--workspace", type=check_workspace_key, help="workspace to back up")
+    commands.add_parser("list", help="list the backups, newest first")
+    verify = commands.add_parser("verify", help="check backups' integrity and row counts")
+    verify.add_argument("paths", type=Path, nargs="+")
+    restore = commands.add_parser("restore", help="replace a workspace's database with a backup")
+    restore.add_argument("path", type=Path)
+    restore.add_argument(
+        "--workspace",
+        type=check_workspace_key,
+        help="workspace to restore into (default: the one the backup was made of)",
+    )
+    args = parser.parse_args(argv)
+    settings = DatabaseSettings.from_env()
+
+    if args.command == "create":
+        for workspace in [args.workspace] if args.workspace else settings.workspace_keys():
+            with use_workspace(workspace):
+                print(f"{workspace}: {make_backup(settings).summary()}")
+    elif args.command == "list":
+        for workspace, made_at, path in list_backups(settings):
+            print(f"{made_at:%Y-%m-%d %H:%M:%S} UTC  {workspace}  {path}")
+    elif args.command == "verify":
+        failed = False
+        for path in args.paths:
+            verification = verify_backup(path)
+            failed = failed or not verification.ok
+            print(f"{path}: {'ok' if verification.ok else '; '.join(verification.problems)}")
+        if failed:
+            sys.exit(1)
+    else:
+        match = BACKUP_NAME.fullmatch(args.path.name)
+        workspace = args.workspace or (match["workspace"] if match else None)
+        if workspace is None:
+            parser.error("can't tell the workspace from the file name, pass --workspace")
+        with use_workspace(workspace):
+            try:
+                verification = restore_backup(args.path)
+            except BackupError as e:
+                raise SystemExit(str(e)) from None
+        tasks = verification.counts.get("task", 0)
+        print(f"Restored workspace {workspace} from {args.path} ({tasks} tasks)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""In-process publish/subscribe of task changes.
+
+Write actions publish the grid rows they changed; every connected browser tab subscribes and
+applies them to its own grid, so changes made in one tab show up in the others without any
+of them polling or reloading the whole task list.
+"""
+import asyncio
+import itertools
+import logging
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from .settings import DEFAULT_WORKSPACE
+
+logger = logging.getLogger("todooey.bus")
+
+# How a write action's result is published, see ``TaskChange.from_result``
+ADDED = "added"
+UPDATED = "updated"
+REMOVED = "removed"
+RELOAD = "reload"
+
+
+@dataclass(frozen=True)
+class TaskChange:
+    """Grid rows changed by one write action."""
+
+    # Data version of the read cache once the write was done
+    version: int
+    added: tuple[dict, ...] = ()
+    updated: tuple[dict, ...] = ()
+    removed: tuple[dict, ...] = ()
+    # The change can't be described row by row (e.g. a bulk import): reload the task list
+    reload: bool = False
+    # Workspace whose tasks changed; subscribers showing other workspaces ignore the change
+    workspace: str = DEFAULT_WORKSPACE
+
+    @classmethod
+    def from_result(
+        cls,
+        kind: str,
+        result,
+        version: int,
+        workspace: str = DEFAULT_WORKSPACE,
+    ) -> "TaskChange | None":
+        """Build the change published for the result of a write action.
+
+        Args:
+            kind: ``ADDED``, ``UPDATED`` or ``REMOVED`` if the action returns the grid row (or
+                rows) it changed, ``RELOAD`` otherwise.
+            result: What the action returned; ``None``, no rows or 0 means nothing changed.
+            version: The data version after the write.
+            workspace: The workspace the action wrote to.
+
+        """
+        if not result:
+            return None
+        if kind == RELOAD:
+            return cls(version, reload=True, workspace=workspace)
+        rows = (result,) if isinstance(result, dict) else tuple(result)
+        if kind == ADDED:
+            return cls(version, added=rows, workspace=workspace)
+        if kind == UPDATED:
+            return cls(version, updated=rows, workspace=workspace)
+        return cls(version, removed=rows, workspace=workspace)
+
+
+class ChangeBus:
+    """Delivers published changes to every subscriber.
+
+    Subscribers that subscribe from a running event loop get their callback called on that
+    loop, whichever thread publishes; others are called on the publishing thread.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._subscribers: dict[int, tuple[asyncio.AbstractEventLoop | None, Callable]] = {}
+
+    def subscribe(self, callback: Callable[[TaskChange], object]) -> Callable[[], None]:
+        """Call ``callback`` with every change published from now on.
+
+        Returns:
+            Callable: Call it to unsubscribe.
+
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        subscriber_id = next(self._ids)
+        with self._lock:
+            self._subscribers[subscriber_id] = (loop, callback)
+
+        def unsubscribe() -> None:
+            with self._lock:
+                self._subscribers.pop(subscriber_id, None)
+
+        return unsubscribe
+
+    def publish(self, change: TaskChange) -> None:
+        """Deliver ``change`` to every subscriber."""
+        with self._lock:
+            subscribers = list(self._subscribers.values())
+        for loop, callback in subscribers:
+            if loop is None:
+                try:
+                    callback(change)
+                except Exception:
+                    logger.exception("Change subscriber failed")
+            elif not loop.is_closed():
+                loop.call_soon_threadsafe(callback, change)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
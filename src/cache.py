@@ -0,0 +1,57 @@
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any
+
+
+class VersionedCache:
+    """In-process read-through cache, invalidated by a monotonically increasing data version.
+
+    Every write bumps the version; cached values loaded under an older version are treated as
+    missing and reloaded on the next read. Cached values are shared between callers, so they
+    must be treated as read-only.
+
+    At most ``max_entries`` values are kept; beyond that the least recently used one is
+    dropped.
+    """
+
+    def __init__(self, max_entries: int = 1_000) -> None:
+        self._lock = threading.Lock()
+        # Least recently used first
+        self._entries: OrderedDict[Hashable, tuple[int, Any]] = OrderedDict()
+        self.max_entries = max_entries
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, load: Callable[[], Any]) -> Any:
+        """Return the cached value for ``key``, calling ``load`` if it is missing or stale."""
+        with self._lock:
+            version = self.version
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        value = load()
+        with self._lock:
+            # A write that landed while loading has already bumped the version, in which case
+            # the value is stored as stale and reloaded next time
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max(self.max_entries, 1):
+                self._entries.popitem(last=False)
+        return value
+
+    def bump(self) -> int:
+        """Invalidate everything cached so far and return the new data version."""
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+            return self.version
+
+    def stats(self) -> dict[str, int]:
+        """Return the data version and the hit/miss counters."""
+        with self._lock:
+            return {"version": self.version, "hits": self.hits, "misses": self.misses}
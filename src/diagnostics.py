@@ -0,0 +1,71 @@
+"""Checks that the hot queries of the task list are served by indexes.
+
+Run against the configured database with:
+    python -m src.diagnostics
+"""
+import sys
+from datetime import date
+
+from sqlalchemy import Select
+
+from .actions import active_tasks_query, categories_query, ready_tasks_query, workload_query
+from .model import session_scope
+
+
+class FullScanError(Exception):
+    """Raised when a hot query falls back to a full table scan or a temporary sort."""
+
+
+def hot_queries() -> dict[str, Select]:
+    """Return the queries that run on every refresh of the UI, by name."""
+    return {
+        "task list": active_tasks_query(),
+        "task list, hidden categories": active_tasks_query(hidden_categories=[1, 2]),
+        "task list, next page": active_tasks_query(after=[False, "2025-01-01", 1, 1, 1, 1]),
+        "tasks ready to start": ready_tasks_query(),
+        "categories": categories_query(),
+        "workload": workload_query(date(2025, 1, 1)),
+    }
+
+
+def explain(session, query: Select) -> list[str]:
+    """Return the lines of SQLite's ``EXPLAIN QUERY PLAN`` for a query."""
+    compiled = query.compile(session.get_bind(), compile_kwargs={"literal_binds": True})
+    plan = session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}")
+    return [row[3] for row in plan]
+
+
+def bad_plan_steps(plan: list[str]) -> list[str]:
+    """Return the plan steps that scan a table without an index or sort in a temp B-tree."""
+    return [
+        step
+        for step in plan
+        if (step.startswith("SCAN") and "INDEX" not in step) or "TEMP B-TREE" in step
+    ]
+
+
+def check_query_plans() -> dict[str, list[str]]:
+    """Explain every hot query and raise ``FullScanError`` if any is not index-backed.
+
+    Returns:
+        dict: The query plan of every hot query, by name.
+
+    """
+    plans = {}
+    with session_scope() as session:
+        for name, query in hot_queries().items():
+            plans[name] = explain(session, query)
+    failures = {name: bad_plan_steps(plan) for name, plan in plans.items() if bad_plan_steps(plan)}
+    if failures:
+        msg = "; ".join(f"{name}: {', '.join(steps)}" for name, steps in failures.items())
+        raise FullScanError(msg)
+    return plans
+
+
+if __name__ == "__main__":
+    try:
+        for name, plan in check_query_plans().items():
+            print(f"{name}: {' | '.join(plan)}")
+    except FullScanError as e:
+        print(f"Full scan in hot query: {e}")
+        sys.exit(1)
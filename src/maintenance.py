@@ -0,0 +1,255 @@
+"""Background maintenance of the database: archive retention, statistics and free space.
+
+Every ``maintenance_interval_minutes`` a run on each workspace's database, on a database
+thread:
+
+- deletes for good the archived tasks older than ``archive_retention_days``, if set (archived
+  tasks are kept forever by default; set ``TODOOEY_DB_ARCHIVE_RETENTION_DAYS`` to purge them),
+- refreshes the query planner's statistics (``PRAGMA optimize``, or a first ``ANALYZE``),
+- hands free pages back to the file system with ``PRAGMA incremental_vacuum``.
+
+Writing is split into chunks sized to hold the write lock for about ``maintenance_step_ms``,
+with a pause as long again between them, so UI actions waiting on the lock get it within a
+step rather than after the whole run. A run stops after ``maintenance_run_ms`` and leaves the
+rest to the next one. What each run did is logged, kept in ``last_reports`` and counted in the
+``todooey_maintenance_*`` metrics.
+
+Run once (against every workspace of the configured database) with:
+    python -m src.maintenance
+
+Databases created before incremental vacuum was enabled are converted with a full ``VACUUM``,
+which rewrites the whole file and so should be run while the app is stopped:
+    python -m src.maintenance --vacuum
+"""
+import asyncio
+import logging
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select
+
+from .actions import own_writes, writes
+from .async_actions import run_in_db_thread
+from .metrics import maintenance_freed_pages, maintenance_purged_tasks, maintenance_seconds
+from .model import (
+    ArchivedTask,
+    current_workspace,
+    get_engine,
+    session_scope,
+    sqlite_connection,
+    use_workspace,
+)
+from .settings import DatabaseSettings
+
+logger = logging.getLogger("todooey.maintenance")
+
+# Seconds after startup before the first run, so it doesn't compete with the first page loads
+FIRST_RUN_DELAY = 60
+# Size of the first chunk of each step, before it is scaled to the step time
+FIRST_CHUNK_SIZE = 500
+MAX_CHUNK_SIZE = 50_000
+# Rows ANALYZE samples per index, so that it takes milliseconds even on large tables
+ANALYSIS_LIMIT = 1_000
+# Value of ``PRAGMA auto_vacuum`` for incremental vacuum
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+@dataclass
+class MaintenanceReport:
+    """What a maintenance run did."""
+
+    # Archived tasks deleted for good
+    purged_tasks: int = 0
+    # Free pages handed back to the file system; None if the database doesn't allow
+    # incremental vacuum
+    freed_pages: int | None = 0
+    # Whether the statistics were built from scratch with ANALYZE, rather than refreshed
+    analyzed: bool = False
+    # False if the run ran out of time with work left over for the next one
+    finished: bool = True
+    seconds: float = 0.0
+
+    def summary(self) -> str:
+        if self.freed_pages is None:
+            freed = "incremental vacuum disabled"
+        else:
+            freed = f"freed {self.freed_pages} pages"
+        statistics = "analyzed" if self.analyzed else "optimized"
+        finished = "" if self.finished else ", out of time"
+        return (
+            f"purged {self.purged_tasks} archived tasks, {freed}, {statistics}"
+            f" in {self.seconds:.2f}s{finished}"
+        )
+
+
+def next_chunk_size(size: int, elapsed: float, step: float) -> int:
+    """Scale a chunk size so that the next chunk takes about ``step`` seconds, at most
+    doubling it at a time."""
+    scaled = int(size * step / max(elapsed, 1e-6))
+    return max(1, min(scaled, size * 2, MAX_CHUNK_SIZE))
+
+
+@writes()
+def purge_archived_tasks(archived_before: datetime, deadline: float, step: float) -> int:
+    """Delete for good the tasks archived before ``archived_before``, oldest first, a chunk
+    per transaction, until none are left or ``deadline`` (a ``time.monotonic()`` value) passes.
+
+    Returns:
+        int: How many archived tasks were deleted.
+
+    """
+    purged = 0
+    size = FIRST_CHUNK_SIZE
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        with session_scope() as session:
+            oldest = (
+                select(ArchivedTask.id)
+                .where(ArchivedTask.archived_at < archived_before)
+                .order_by(ArchivedTask.archived_at)
+                .limit(size)
+            )
+            query = delete(ArchivedTask).where(ArchivedTask.id.in_(oldest))
+            deleted = session.execute(query.execution_options(synchronize_session=False)).rowcount
+        purged += deleted
+        if deleted < size:
+            break
+        elapsed = time.perf_counter() - start
+        size = next_chunk_size(size, elapsed, step)
+        # Let writers waiting on the lock in before taking it again
+        time.sleep(min(elapsed, step))
+    return purged
+
+
+def refresh_statistics() -> bool:
+    """Refresh the statistics the query planner picks indexes by.
+
+    Returns:
+        bool: Whether they were built from scratch with ANALYZE, as the database had none.
+
+    """
+    with get_engine().connect() as connection:
+        connection.exec_driver_sql(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT:d}")
+        has_statistics = connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'",
+        ).first()
+        # PRAGMA optimize only re-analyzes tables whose statistics are out of date
+        connection.exec_driver_sql("PRAGMA optimize" if has_statistics else "ANALYZE")
+        connection.commit()
+    return not has_statistics
+
+
+def incremental_vacuum(deadline: float, step: float) -> int | None:
+    """Hand the database's free pages back to the file system, a chunk of pages per
+    transaction, until none are left or ``deadline`` passes.
+
+    Returns:
+        int | None: How many pages were freed; None if the database wasn't created for
+        incremental vacuum.
+
+    """
+    with get_engine().connect() as connection:
+        if connection.exec_driver_sql("PRAGMA auto_vacuum").scalar() != AUTO_VACUUM_INCREMENTAL:
+            return None
+        first_free = free = connection.exec_driver_sql("PRAGMA freelist_count").scalar_one()
+        size = FIRST_CHUNK_SIZE
+        while free and time.monotonic() < deadline:
+            start = time.perf_counter()
+            # Each step of the statement frees one page, and executing it through the driver
+            # only takes the first step; executescript runs it to completion
+            sqlite_connection(connection.connection).executescript(
+                f"PRAGMA incremental_vacuum({size:d})"
+            )
+            free = connection.exec_driver_sql("PRAGMA freelist_count").scalar_one()
+            elapsed = time.perf_counter() - start
+            size = next_chunk_size(size, elapsed, step)
+            time.sleep(min(elapsed, step))
+    return first_free - free
+
+
+def run_maintenance(settings: DatabaseSettings, now: datetime | None = None) -> MaintenanceReport:
+    """Run every maintenance step once on the current workspace, within
+    ``settings.maintenance_run_ms``."""
+    start = time.monotonic()
+    deadline = start + settings.maintenance_run_ms / 1000
+    step = settings.maintenance_step_ms / 1000
+    report = MaintenanceReport()
+    if settings.archive_retention_days:
+        archived_before = (now or datetime.now()) - timedelta(days=settings.archive_retention_days)
+        report.purged_tasks = purge_archived_tasks(archived_before, deadline, step)
+    # After the purge, so the statistics count what is left
+    with own_writes():
+        report.analyzed = refresh_statistics()
+        report.freed_pages = incremental_vacuum(deadline, step)
+    report.finished = time.monotonic() < deadline
+    report.seconds = time.monotonic() - start
+
+    maintenance_seconds.observe(report.seconds)
+    maintenance_purged_tasks.inc(report.purged_tasks)
+    maintenance_freed_pages.inc(report.freed_pages or 0)
+    logger.info(
+        "Database maintenance of workspace %s: %s", current_workspace.get(), report.summary()
+    )
+    return report
+
+
+def vacuum() -> None:
+    """Rewrite the current workspace's database with ``VACUUM``, switching it to incremental
+    vacuum."""
+    connection = get_engine().connect().execution_options(isolation_level="AUTOCOMMIT")
+    with connection:
+        connection.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+        connection.exec_driver_sql("VACUUM")
+
+
+class MaintenanceScheduler:
+    """Runs ``run_maintenance`` on every workspace every ``maintenance_interval_minutes``,
+    from the event loop."""
+
+    def __init__(self, settings: DatabaseSettings) -> None:
+        self.settings = settings
+        self.interval = settings.maintenance_interval_minutes * 60
+        # Report of the latest run on each workspace
+        self.last_reports: dict[str, MaintenanceReport] = {}
+
+    async def run(self) -> dict[str, MaintenanceReport]:
+        """Run maintenance on every workspace now, one after the other on a database thread.
+
+        A workspace whose run fails is logged and left for the next run.
+        """
+        for workspace in self.settings.workspace_keys():
+            try:
+                with use_workspace(workspace):
+                    report = await run_in_db_thread(run_maintenance, self.settings)
+                    self.last_reports[workspace] = report
+            except Exception:
+                logger.exception("Database maintenance of workspace %s failed", workspace)
+        return self.last_reports
+
+    async def run_forever(self) -> None:
+        """Run maintenance shortly after startup and then every interval."""
+        await asyncio.sleep(min(FIRST_RUN_DELAY, self.interval))
+        while True:
+            await self.run()
+            await asyncio.sleep(self.interval)
+
+
+def create_maintenance(settings: DatabaseSettings) -> MaintenanceScheduler | None:
+    """Return the maintenance scheduler for ``settings``, or ``None`` if it is disabled."""
+    if not settings.maintenance_interval_minutes or settings.in_memory:
+        return None
+    return MaintenanceScheduler(settings)
+
+
+maintenance = create_maintenance(DatabaseSettings.from_env())
+
+
+if __name__ == "__main__":
+    settings = DatabaseSettings.from_env()
+    for key in settings.workspace_keys():
+        with use_workspace(key):
+            if "--vacuum" in sys.argv[1:]:
+                vacuum()
+            print(f"{key}: {run_maintenance(settings).summary()}")
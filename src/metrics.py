@@ -0,0 +1,282 @@
+"""Latency and row-count metrics, rendered in the Prometheus text format.
+
+The engine hooks time every SQL statement, ``session_scope`` times every unit of work and
+``timed`` wraps UI handlers, so a slow click can be split into database, ORM and UI time.
+"""
+import functools
+import inspect
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Callable, Iterable
+
+from sqlalchemy import Engine, event
+
+slow_query_logger = logging.getLogger("todooey.slow_query")
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+class Counter:
+    """Monotonically increasing count, per combination of label values."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(labels[label] for label in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            return [
+                f"{self.name}{_label_text(self.labels, key)} {value}"
+                for key, value in self._values.items()
+            ]
+
+
+class Histogram:
+    """Distribution of observed values over fixed buckets, per combination of label values."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Iterable[str] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # Per label values: the count of each bucket (plus +Inf), the sum and the count
+        self._values: dict[tuple, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(labels[label] for label in self.labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def samples(self) -> list[str]:
+        lines = []
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                cumulative = 0
+                for bound, count in zip((*self.buckets, "+Inf"), counts, strict=True):
+                    cumulative += count
+                    label_text = _label_text((*self.labels, "le"), (*key, str(bound)))
+                    lines.append(f"{self.name}_bucket{label_text} {cumulative}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {total[0]}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, key)} {cumulative}")
+        return lines
+
+
+def _label_text(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(str(value))}"' for name, value in zip(names, values, strict=True)
+    )
+    return f"{{{pairs}}}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+statement_seconds = Histogram(
+    "todooey_db_statement_seconds",
+    "Time spent executing SQL statements.",
+    labels=("statement",),
+)
+rows_written = Counter(
+    "todooey_db_rows_written_total",
+    "Rows written by INSERT, UPDATE and DELETE statements.",
+    labels=("statement",),
+)
+slow_statements = Counter(
+    "todooey_db_slow_statements_total",
+    "SQL statements slower than the slow query threshold.",
+    labels=("statement",),
+)
+orm_objects_loaded = Counter(
+    "todooey_orm_objects_loaded_total",
+    "ORM objects hydrated from query results.",
+    labels=("model",),
+)
+session_seconds = Histogram(
+    "todooey_session_seconds",
+    "Time spent in session_scope, from opening the session to committing it.",
+)
+handler_seconds = Histogram(
+    "todooey_handler_seconds",
+    "End-to-end latency of UI handlers.",
+    labels=("handler",),
+)
+handler_errors = Counter(
+    "todooey_handler_errors_total",
+    "UI handlers that raised an exception.",
+    labels=("handler",),
+)
+write_behind_updates = Counter(
+    "todooey_write_behind_updates_total",
+    "Task updates queued for writing behind.",
+)
+write_behind_writes = Counter(
+    "todooey_write_behind_writes_total",
+    "Tasks written by write-behind flushes, after merging their queued updates.",
+    labels=("outcome",),
+)
+write_behind_flush_seconds = Histogram(
+    "todooey_write_behind_flush_seconds",
+    "Time spent writing a batch of queued task updates.",
+)
+
+maintenance_seconds = Histogram(
+    "todooey_maintenance_seconds",
+    "Time spent on a database maintenance run.",
+)
+maintenance_purged_tasks = Counter(
+    "todooey_maintenance_purged_tasks_total",
+    "Archived tasks deleted for good by maintenance, once past their retention.",
+)
+maintenance_freed_pages = Counter(
+    "todooey_maintenance_freed_pages_total",
+    "Free database pages handed back to the file system by incremental vacuum.",
+)
+backup_seconds = Histogram(
+    "todooey_backup_seconds",
+    "Time spent copying a workspace's database into a backup.",
+)
+backup_restarts = Counter(
+    "todooey_backup_restarts_total",
+    "Backups started over because the database was written to while it was being copied.",
+)
+
+METRICS: list[Counter | Histogram] = [
+    statement_seconds,
+    rows_written,
+    slow_statements,
+    orm_objects_loaded,
+    session_seconds,
+    handler_seconds,
+    handler_errors,
+    write_behind_updates,
+    write_behind_writes,
+    write_behind_flush_seconds,
+    maintenance_seconds,
+    maintenance_purged_tasks,
+    maintenance_freed_pages,
+    backup_seconds,
+    backup_restarts,
+]
+
+
+def statement_kind(statement: str) -> str:
+    """Return the lowercase SQL verb of a statement, e.g. "select"."""
+    words = statement.split(None, 1)
+    return words[0].lower() if words else "other"
+
+
+def instrument_engine(engine: Engine, slow_query_ms: int = 0) -> None:
+    """Time every statement executed by ``engine``.
+
+    Args:
+        engine: The engine to instrument.
+        slow_query_ms: Statements taking longer than this are logged to the
+            "todooey.slow_query" logger; 0 disables the slow query log.
+
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_timer(conn, _cursor, _statement, _parameters, _context, _executemany) -> None:
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def stop_timer(conn, cursor, statement, parameters, _context, _executemany) -> None:
+        elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+        kind = statement_kind(statement)
+        statement_seconds.observe(elapsed, statement=kind)
+        # rowcount is only known for writes (-1 for SELECT), so read rows are not counted
+        if kind in ("insert", "update", "delete") and cursor.rowcount > 0:
+            rows_written.inc(cursor.rowcount, statement=kind)
+        if slow_query_ms and elapsed * 1000 >= slow_query_ms:
+            slow_statements.inc(statement=kind)
+            slow_query_logger.warning(
+                "Slow query (%.1f ms): %s; parameters: %r",
+                elapsed * 1000,
+                " ".join(statement.split()),
+                parameters,
+            )
+
+
+def count_loaded_objects(model) -> None:
+    """Count the instances of ``model`` (and its subclasses) hydrated by the ORM."""
+
+    @event.listens_for(model, "load", propagate=True)
+    def on_load(target, _context) -> None:
+        orm_objects_loaded.inc(model=type(target).__name__)
+
+
+def timed(name: str) -> Callable:
+    """Decorate a (sync or async) UI handler to record its latency and failures under ``name``."""
+
+    def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                except Exception:
+                    handler_errors.inc(handler=name)
+                    raise
+                finally:
+                    handler_seconds.observe(time.perf_counter() - start, handler=name)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                handler_errors.inc(handler=name)
+                raise
+            finally:
+                handler_seconds.observe(time.perf_counter() - start, handler=name)
+
+        return wrapper
+
+    return decorator
+
+
+def render(extra_gauges: dict[str, float] | None = None) -> str:
+    """Render every metric, plus any extra gauges by name, in the Prometheus text format."""
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    for name, value in (extra_gauges or {}).items():
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
@@ -1,18 +1,260 @@
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime
 from pathlib import Path
+from typing import Any, ClassVar
 
-from sqlalchemy import Boolean, Column, Integer, String, create_engine, Date
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
 
-db_url = Path("runtime/todo.db")
-db_url.parent.mkdir(exist_ok=True)
-sqlite3.connect(db_url)
-engine = create_engine(f"sqlite:///{db_url}")
-Base = declarative_base()
+from sqlalchemy import (
+    DDL,
+    Boolean,
+    Computed,
+    Date,
+    DateTime,
+    Engine,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Table,
+    create_engine,
+    event,
+    inspect,
+)
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship, sessionmaker
+from sqlalchemy.pool import PoolProxiedConnection, QueuePool, StaticPool
 
-Session = sessionmaker(bind=engine)
+from .metrics import count_loaded_objects, instrument_engine, session_seconds
+from .settings import DEFAULT_WORKSPACE, DatabaseSettings, check_workspace_key
+
+
+class Base(DeclarativeBase):
+    # A Table rather than any FromClause, for the Core statements built on models' tables
+    __table__: ClassVar[Table]
+
+
+count_loaded_objects(Base)
+
+# Bound to the engine of the current workspace by ``session_scope``
+Session = sessionmaker()
+# Created on first use (or by ``configure_engine``), so importing this module does not touch
+# the disk
+_engines: "EnginePool | None" = None
+# Workspace whose database the code running in this context works on, see ``use_workspace``
+current_workspace: ContextVar[str] = ContextVar("current_workspace", default=DEFAULT_WORKSPACE)
+
+ALEMBIC_DIR = Path(__file__).parent / "alembic"
+# Sort key of a missing priority or effort, after every real one
+SORT_LAST = 2**63 - 1
+
+
+def create_db_engine(settings: DatabaseSettings) -> Engine:
+    """Create an engine for the SQLite database described by ``settings``.
+
+    The pragmas are applied to every new connection. File databases get a small queue pool,
+    as SQLite connections are cheap to keep but only one of them can write at a time;
+    in-memory databases share a single connection, as each connection would otherwise see
+    its own empty database.
+    """
+    pool_options: dict[str, Any]
+    if settings.in_memory:
+        pool_options = {"poolclass": StaticPool}
+    else:
+        Path(settings.path).parent.mkdir(parents=True, exist_ok=True)
+        pool_options = {"poolclass": QueuePool, "pool_size": settings.pool_size}
+    engine = create_engine(
+        settings.url,
+        connect_args={"check_same_thread": False, "timeout": settings.busy_timeout / 1000},
+        **pool_options,
+    )
+
+    @event.listens_for(engine, "connect")
+    def apply_pragmas(dbapi_connection, _connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        if not settings.in_memory:
+            # Lets maintenance hand free pages back a few at a time. Only set on a new database:
+            # on others it only takes effect once VACUUMed (see ``python -m src.maintenance
+            # --vacuum``), and setting it rewrites the file header, a write like any other.
+            if not cursor.execute("PRAGMA page_count").fetchone()[0]:
+                cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            cursor.execute(f"PRAGMA journal_mode = {settings.journal_mode}")
+            cursor.execute(f"PRAGMA mmap_size = {settings.mmap_size:d}")
+        cursor.execute(f"PRAGMA synchronous = {settings.synchronous}")
+        cursor.execute(f"PRAGMA cache_size = {settings.cache_size:d}")
+        cursor.execute(f"PRAGMA busy_timeout = {settings.busy_timeout:d}")
+        cursor.close()
+
+    instrument_engine(engine, settings.slow_query_ms)
+    return engine
+
+
+class EnginePool:
+    """Engines of the workspaces' databases, by workspace key.
+
+    Each workspace is its own SQLite file, with its own write lock, so writes to different
+    workspaces don't wait on each other. The ``max_open_workspaces`` most recently used
+    engines are kept open; opening another one disposes of the least recently used, whose
+    connections still in use are closed once they are returned.
+    """
+
+    def __init__(self, settings: DatabaseSettings) -> None:
+        self.settings = settings
+        self._lock = threading.Lock()
+        self._engines: OrderedDict[str, Engine] = OrderedDict()
+        # Held while a workspace's engine is opened, so that it is opened (and its database
+        # created) once, without holding up the other workspaces meanwhile
+        self._opening: dict[str, threading.Lock] = {}
+        # A connection of each open workspace's own, outside its pool, for ``data_version``
+        self._watchers: dict[str, sqlite3.Connection] = {}
+
+    def get(self, workspace: str) -> Engine:
+        """Return the engine of ``workspace``, opening it (and creating its database) if needed.
+
+        Raises:
+            SchemaOutOfDateError: If the workspace's database needs upgrading first.
+            ValueError: If ``workspace`` is not a valid workspace key.
+
+        """
+        engine = self._open_engine(workspace)
+        if engine is not None:
+            return engine
+        settings = self.settings.for_workspace(workspace)
+        with self._lock:
+            opening = self._opening.setdefault(workspace, threading.Lock())
+        with opening:
+            # Another caller may have opened it while this one waited
+            engine = self._open_engine(workspace)
+            if engine is not None:
+                return engine
+            engine = create_db_engine(settings)
+            try:
+                create_schema(engine)
+            except Exception:
+                engine.dispose()
+                raise
+            with self._lock:
+                self._engines[workspace] = engine
+                while len(self._engines) > max(self.settings.max_open_workspaces, 1):
+                    key, idle = self._engines.popitem(last=False)
+                    self._close_watcher(key)
+                    idle.dispose()
+            return engine
+
+    def _open_engine(self, workspace: str) -> Engine | None:
+        """Return the engine of ``workspace`` if it is open, as the most recently used one."""
+        with self._lock:
+            engine = self._engines.get(workspace)
+            if engine is not None:
+                self._engines.move_to_end(workspace)
+            return engine
+
+    def data_version(self, workspace: str) -> int:
+        """Return SQLite's data version of the database of ``workspace``.
+
+        It is read on a connection kept for it, and changes whenever another connection (of
+        this process or of another) commits a change to the database. In-memory databases
+        can't be written by anything else, so theirs is always 0.
+        """
+        if self.settings.in_memory:
+            return 0
+        # Creates the database if it is new
+        self.get(workspace)
+        with self._lock:
+            watcher = self._watchers.get(workspace)
+            if watcher is None:
+                watcher = self._watchers[workspace] = sqlite3.connect(
+                    self.settings.for_workspace(workspace).path,
+                    check_same_thread=False,
+                )
+            return watcher.execute("PRAGMA data_version").fetchone()[0]
+
+    def _close_watcher(self, workspace: str) -> None:
+        watcher = self._watchers.pop(workspace, None)
+        if watcher is not None:
+            watcher.close()
+
+    def open_workspaces(self) -> list[str]:
+        """Return the keys of the workspaces with an open engine, least recently used first."""
+        with self._lock:
+            return list(self._engines)
+
+    def dispose(self) -> None:
+        with self._lock:
+            for workspace in list(self._watchers):
+                self._close_watcher(workspace)
+            for engine in self._engines.values():
+                engine.dispose()
+            self._engines.clear()
+
+
+def configure_engine(settings: DatabaseSettings | None = None) -> Engine:
+    """(Re)create the engines used by ``session_scope``, by default from the environment, and
+    return that of the current workspace."""
+    return _configure_engines(settings).get(current_workspace.get())
+
+
+def _configure_engines(settings: DatabaseSettings | None) -> EnginePool:
+    global _engines  # noqa: PLW0603
+    if _engines is not None:
+        _engines.dispose()
+    _engines = EnginePool(settings or DatabaseSettings.from_env())
+    return _engines
+
+
+def get_engine() -> Engine:
+    """Return the engine of the current workspace, creating it on first use."""
+    if _engines is None:
+        return configure_engine()
+    return _engines.get(current_workspace.get())
+
+
+def data_version() -> int:
+    """Return SQLite's data version of the current workspace's database, see
+    ``EnginePool.data_version``."""
+    engines = _engines if _engines is not None else _configure_engines(None)
+    return engines.data_version(current_workspace.get())
+
+
+def sqlite_connection(connection: PoolProxiedConnection) -> sqlite3.Connection:
+    """Return the sqlite3 connection behind a connection of an engine's pool.
+
+    Raises:
+        sqlite3.ProgrammingError: If the connection has been closed.
+    """
+    driver_connection = connection.driver_connection
+    if driver_connection is None:
+        msg = "Cannot operate on a closed database."
+        raise sqlite3.ProgrammingError(msg)
+    return driver_connection
+
+
+def open_workspaces() -> list[str]:
+    """Return the keys of the workspaces with an open engine."""
+    return _engines.open_workspaces() if _engines is not None else []
+
+
+@contextmanager
+def use_workspace(workspace: str):
+    """Work on the database of ``workspace`` within the ``with`` block.
+
+    The workspace is held in a context variable, so it follows the code into tasks started
+    within the block and onto the database threads (see ``async_actions.run_in_db_thread``).
+
+    Raises:
+        ValueError: If ``workspace`` is not a valid workspace key.
+
+    """
+    token = current_workspace.set(check_workspace_key(workspace))
+    try:
+        yield workspace
+    finally:
+        current_workspace.reset(token)
 
 
 @contextmanager
@@ -27,7 +269,9 @@ def session_scope():
         session: Instance of Session() for performing database task within 'with' statements
 
     """
-    session = Session()
+    engine = get_engine()
+    start = time.perf_counter()
+    session = Session(bind=engine)
     try:
         yield session
         session.commit()
@@ -36,6 +280,17 @@ def session_scope():
         raise
     finally:
         session.close()
+        session_seconds.observe(time.perf_counter() - start)
+
+
+class Category(Base):
+    """Categories of tasks, stored lowercase."""
+
+    __tablename__ = "category"
+
+    # Columns
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(String, nullable=False, unique=True)
 
 
 class Task(Base):
@@ -44,17 +299,271 @@ class Task(Base):
     __tablename__ = "task"
 
     # Columns
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    name = Column(String)
-    details = Column(String)
-    category = Column(String)
-    priority = Column(Integer)
-    is_complete = Column(Boolean)
-    archived = Column(Boolean)
-    complete_by = Column(Date)
-    effort = Column(Integer)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    name: Mapped[str | None] = mapped_column(String)
+    details: Mapped[str | None] = mapped_column(String)
+    category_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("category.id"))
+    priority: Mapped[int | None] = mapped_column(Integer)
+    is_complete: Mapped[bool | None] = mapped_column(Boolean)
+    complete_by: Mapped[date | None] = mapped_column(Date)
+    effort: Mapped[int | None] = mapped_column(Integer)
+    # Sort key for ``complete_by`` that puts tasks without a due date last. A (virtual)
+    # column rather than an indexed expression, so that SQLite can seek the list index
+    # with a row-value comparison when paginating. Never NULL, though declared nullable as
+    # in the existing schema.
+    due_sort: Mapped[date] = mapped_column(
+        Date, Computed("coalesce(complete_by, '9999-12-31')", persisted=False), nullable=True
+    )
+    # Sort keys for the other nullable columns of the list order, for the same reason: a
+    # row-value comparison with a NULL in it is never true, which would end pagination at the
+    # first NULL. Tasks without a priority or effort go last, uncategorised tasks first, and
+    # tasks of unknown completion count as open (as in the triggers).
+    complete_sort: Mapped[bool] = mapped_column(
+        Boolean, Computed("coalesce(is_complete, 0)", persisted=False), nullable=True
+    )
+    priority_sort: Mapped[int] = mapped_column(
+        Integer, Computed(f"coalesce(priority, {SORT_LAST:d})", persisted=False), nullable=True
+    )
+    effort_sort: Mapped[int] = mapped_column(
+        Integer, Computed(f"coalesce(effort, {SORT_LAST:d})", persisted=False), nullable=True
+    )
+    category_sort: Mapped[int] = mapped_column(
+        Integer, Computed("coalesce(category_id, 0)", persisted=False), nullable=True
+    )
+    # Number of incomplete tasks blocking this one, kept up to date by the triggers in
+    # ``TASK_DEPENDENCY_DDL``; a task with none is ready to start
+    open_blocker_count: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    # Position in a topological order of the dependency graph, blockers first. Only tasks
+    # with dependencies have one; see ``actions.add_dependency``.
+    topo_order: Mapped[int | None] = mapped_column(Integer)
+
+    category: Mapped[Category | None] = relationship(Category, lazy="selectin")
+
+
+class TaskDependency(Base):
+    """Edges of the dependency graph: the task ``blocker_id`` blocks the task ``blocked_id``."""
+
+    __tablename__ = "task_dependency"
+
+    # Columns
+    blocker_id: Mapped[int] = mapped_column(Integer, ForeignKey("task.id"), primary_key=True)
+    blocked_id: Mapped[int] = mapped_column(Integer, ForeignKey("task.id"), primary_key=True)
+
+
+class ArchivedTask(Base):
+    """Deleted tasks, moved out of ``task`` so that they don't slow down the live board."""
+
+    __tablename__ = "archived_task"
+
+    # Columns
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    # Id the task had in ``task``; SQLite may hand it out again to a new task
+    task_id: Mapped[int | None] = mapped_column(Integer, index=True)
+    name: Mapped[str | None] = mapped_column(String)
+    details: Mapped[str | None] = mapped_column(String)
+    category_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("category.id"))
+    priority: Mapped[int | None] = mapped_column(Integer)
+    is_complete: Mapped[bool | None] = mapped_column(Boolean)
+    complete_by: Mapped[date | None] = mapped_column(Date)
+    effort: Mapped[int | None] = mapped_column(Integer)
+    archived_at: Mapped[datetime | None] = mapped_column(DateTime, index=True)
 
+    category: Mapped[Category | None] = relationship(Category, lazy="selectin")
 
 
+class TaskSummary(Base):
+    """Open task count and effort per category, priority and due date, for the dashboard.
+
+    Kept up to date by the triggers in ``TASK_SUMMARY_DDL``. It is keyed by due date rather
+    than holding overdue counts, as what is overdue changes every day without any write.
+    """
+
+    __tablename__ = "task_summary"
+
+    # Columns
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    category_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("category.id"))
+    priority: Mapped[int | None] = mapped_column(Integer)
+    due_date: Mapped[date | None] = mapped_column(Date)
+    open_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    total_effort: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+# Indexes for the hot queries: the task list in list order (carrying the category so hidden
+# categories are filtered out in the index), and the categories in use.
+Index(
+    "ix_task_list_order",
+    Task.complete_sort,
+    Task.due_sort,
+    Task.priority_sort,
+    Task.effort_sort,
+    Task.category_sort,
+)
+Index("ix_task_category_id", Task.category_id)
+# The tasks ready to start in list order, and the ends of the topological order
+Index(
+    "ix_task_ready",
+    Task.complete_sort,
+    Task.open_blocker_count,
+    Task.due_sort,
+    Task.priority_sort,
+    Task.effort_sort,
+    Task.category_sort,
+)
+Index("ix_task_topo_order", Task.topo_order)
+# The blockers of a task (the primary key serves the tasks it blocks)
+Index("ix_task_dependency_blocked", TaskDependency.blocked_id, TaskDependency.blocker_id)
+Index("ix_task_summary_key", TaskSummary.category_id, TaskSummary.priority, TaskSummary.due_date)
+
+# Full-text index over the name and details of tasks. It is an external-content FTS5 table:
+# it stores only the index and reads the text from ``task``, kept in sync by the triggers.
+TASK_FTS_DDL = [
+    """
+    CREATE VIRTUAL TABLE task_fts USING fts5(
+        name, details, content='task', content_rowid='id', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER task_fts_insert AFTER INSERT ON task BEGIN
+        INSERT INTO task_fts (rowid, name, details) VALUES (new.id, new.name, new.details);
+    END
+    """,
+    """
+    CREATE TRIGGER task_fts_delete AFTER DELETE ON task BEGIN
+        INSERT INTO task_fts (task_fts, rowid, name, details)
+        VALUES ('delete', old.id, old.name, old.details);
+    END
+    """,
+    """
+    CREATE TRIGGER task_fts_update AFTER UPDATE OF name, details ON task BEGIN
+        INSERT INTO task_fts (task_fts, rowid, name, details)
+        VALUES ('delete', old.id, old.name, old.details);
+        INSERT INTO task_fts (rowid, name, details) VALUES (new.id, new.name, new.details);
+    END
+    """,
+]
+for statement in TASK_FTS_DDL:
+    event.listen(Task.__table__, "after_create", DDL(statement))
+
+
+# Triggers keeping ``task_summary`` in step with the open tasks. Keys may be NULL, so rows
+# are matched with IS, created empty when missing and removed once no open task is left.
+_SUMMARY_KEY = (
+    "category_id IS {row}.category_id AND priority IS {row}.priority"
+    " AND due_date IS {row}.complete_by"
+)
+_SUMMARY_ADD = f"""
+        INSERT INTO task_summary (category_id, priority, due_date, open_count, total_effort)
+        SELECT new.category_id, new.priority, new.complete_by, 0, 0
+        WHERE NOT EXISTS (SELECT 1 FROM task_summary WHERE {_SUMMARY_KEY.format(row="new")});
+        UPDATE task_summary
+        SET open_count = open_count + 1, total_effort = total_effort + coalesce(new.effort, 0)
+        WHERE {_SUMMARY_KEY.format(row="new")};
+"""
+_SUMMARY_REMOVE = f"""
+        UPDATE task_summary
+        SET open_count = open_count - 1, total_effort = total_effort - coalesce(old.effort, 0)
+        WHERE {_SUMMARY_KEY.format(row="old")};
+        DELETE FROM task_summary WHERE {_SUMMARY_KEY.format(row="old")} AND open_count <= 0;
+"""
+_SUMMARY_COLUMNS = "is_complete, category_id, priority, complete_by, effort"
+TASK_SUMMARY_DDL = [
+    f"""
+    CREATE TRIGGER task_summary_insert AFTER INSERT ON task
+    WHEN NOT coalesce(new.is_complete, 0) BEGIN{_SUMMARY_ADD}    END
+    """,
+    f"""
+    CREATE TRIGGER task_summary_delete AFTER DELETE ON task
+    WHEN NOT coalesce(old.is_complete, 0) BEGIN{_SUMMARY_REMOVE}    END
+    """,
+    f"""
+    CREATE TRIGGER task_summary_update_old AFTER UPDATE OF {_SUMMARY_COLUMNS} ON task
+    WHEN NOT coalesce(old.is_complete, 0) BEGIN{_SUMMARY_REMOVE}    END
+    """,
+    f"""
+    CREATE TRIGGER task_summary_update_new AFTER UPDATE OF {_SUMMARY_COLUMNS} ON task
+    WHEN NOT coalesce(new.is_complete, 0) BEGIN{_SUMMARY_ADD}    END
+    """,
+]
+# ``create_all`` creates ``task`` first, as nothing orders the two tables but their names
+for statement in TASK_SUMMARY_DDL:
+    event.listen(TaskSummary.__table__, "after_create", DDL(statement))
+
+
+# Triggers keeping ``task.open_blocker_count`` in step with the dependency edges and the
+# completion of the blockers. Archiving a task removes its edges, unblocking the tasks it
+# blocked: the task's row is gone by then, so it releases them itself.
+TASK_DEPENDENCY_DDL = [
+    """
+    CREATE TRIGGER task_dependency_insert AFTER INSERT ON task_dependency BEGIN
+        UPDATE task SET open_blocker_count = open_blocker_count + 1
+        WHERE id = new.blocked_id
+        AND EXISTS (SELECT 1 FROM task WHERE id = new.blocker_id AND NOT coalesce(is_complete, 0));
+    END
+    """,
+    """
+    CREATE TRIGGER task_dependency_delete AFTER DELETE ON task_dependency BEGIN
+        UPDATE task SET open_blocker_count = open_blocker_count - 1
+        WHERE id = old.blocked_id
+        AND EXISTS (SELECT 1 FROM task WHERE id = old.blocker_id AND NOT coalesce(is_complete, 0));
+    END
+    """,
+    """
+    CREATE TRIGGER task_blockers_update AFTER UPDATE OF is_complete ON task
+    WHEN coalesce(old.is_complete, 0) != coalesce(new.is_complete, 0) BEGIN
+        UPDATE task
+        SET open_blocker_count = open_blocker_count + CASE WHEN new.is_complete THEN -1 ELSE 1 END
+        WHERE id IN (SELECT blocked_id FROM task_dependency WHERE blocker_id = new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER task_blockers_delete AFTER DELETE ON task BEGIN
+        UPDATE task SET open_blocker_count = open_blocker_count - 1
+        WHERE NOT coalesce(old.is_complete, 0)
+        AND id IN (SELECT blocked_id FROM task_dependency WHERE blocker_id = old.id);
+        DELETE FROM task_dependency WHERE blocker_id = old.id;
+        DELETE FROM task_dependency WHERE blocked_id = old.id;
+    END
+    """,
+]
+for statement in TASK_DEPENDENCY_DDL:
+    event.listen(TaskDependency.__table__, "after_create", DDL(statement))
+
+
+class SchemaOutOfDateError(RuntimeError):
+    """Raised when a database's schema is not at the latest Alembic revision."""
+
+
+def create_schema(engine: Engine) -> None:
+    """Create the tables of a new database, stamped with the latest Alembic revision as it is
+    created up to date.
+
+    The schema of an existing database is Alembic's to upgrade, so it is only checked:
+    creating the tables an upgrade has yet to add would make that upgrade fail halfway.
+
+    Raises:
+        SchemaOutOfDateError: If an existing database is not at the latest revision.
+
+    """
+    script = ScriptDirectory(str(ALEMBIC_DIR))
+    if not inspect(engine).get_table_names():
+        Base.metadata.create_all(engine)
+        with engine.begin() as connection:
+            MigrationContext.configure(connection).stamp(script, "head")
+        return
+    with engine.connect() as connection:
+        revision = MigrationContext.configure(connection).get_current_revision()
+    if revision != script.get_current_head():
+        msg = (
+            f"The database {engine.url.database} is at revision {revision}, not "
+            f"{script.get_current_head()}: upgrade it with `alembic upgrade head`"
+        )
+        raise SchemaOutOfDateError(msg)
+
 
-Base.metadata.create_all(engine)
+def init_db() -> None:
+    """Create the tables of the current workspace's database if it is new, or check that it
+    is up to date (see ``create_schema``)."""
+    create_schema(get_engine())
@@ -0,0 +1,254 @@
+"""Planning a day's work: the tasks ready to start worth most that fit into an effort budget.
+
+A task's value is its priority weight (priority 1 is worth most) times the urgency of its due
+date, and its cost is its effort. Picking the tasks is a 0/1 knapsack, solved exactly over a
+small set of candidates: of the tasks costing ``c``, at most ``budget // c`` fit, so only that
+many of the most valuable ones can be in the best plan. The tasks ready to start (open and
+not blocked by open tasks) are kept ranked by value per category and effort, so candidates
+are read off the top of those rankings (merged with a heap) instead of scanning every task,
+and the rankings are updated task by task from the changes published by the write actions
+rather than rebuilt.
+"""
+import bisect
+import heapq
+import itertools
+import threading
+from collections import defaultdict
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from datetime import date
+
+from sqlalchemy import Select, false, select
+
+from .actions import (
+    ROW_CHUNK_SIZE,
+    active_tasks_query,
+    changes,
+    check_external_writes,
+    due_bucket_bounds,
+    record_to_row,
+)
+from .bus import TaskChange
+from .model import Task, current_workspace, session_scope
+
+# Priority assumed for tasks without one: the lowest of the usual 1-5
+DEFAULT_PRIORITY = 5
+# Extra weight of a task due today; overdue tasks get it plus half, later tasks less and less
+URGENCY_BOOST = 2.0
+# Above this many knapsack cells (candidates times budget), tasks are picked greedily by value
+# per effort instead, to stay interactive with very large budgets
+MAX_EXACT_CELLS = 1_000_000
+
+
+def task_value(priority: int | None, complete_by: date | None, today: date) -> float:
+    """Return how much doing a task today is worth.
+
+    Tasks without a due date are worth their priority weight; due ones are worth up to
+    ``1 + URGENCY_BOOST`` times more the sooner they are due.
+    """
+    weight = 1 / max(priority if priority is not None else DEFAULT_PRIORITY, 1)
+    if complete_by is None:
+        return weight
+    days = (complete_by - today).days
+    urgency = URGENCY_BOOST / (1 + max(days, 0))
+    if days < 0:
+        urgency *= 1.5
+    return weight * (1 + urgency)
+
+
+def task_cost(effort: int | None) -> int:
+    """Return the effort a task takes out of the budget; tasks without one count as 1."""
+    return effort if effort is not None and effort > 0 else 1
+
+
+def choose(candidates: list[tuple[float, int, int]], budget: int) -> list[tuple[float, int, int]]:
+    """Return the candidates (value, cost, task id) of most total value within ``budget``."""
+    if len(candidates) * budget > MAX_EXACT_CELLS:
+        chosen = []
+        for candidate in sorted(candidates, key=lambda c: c[0] / c[1], reverse=True):
+            if candidate[1] <= budget:
+                chosen.append(candidate)
+                budget -= candidate[1]
+        return chosen
+
+    best = [0.0] * (budget + 1)
+    taken = []
+    for value, cost, _ in candidates:
+        row = bytearray(budget + 1)
+        for capacity in range(budget, cost - 1, -1):
+            if best[capacity - cost] + value > best[capacity]:
+                best[capacity] = best[capacity - cost] + value
+                row[capacity] = 1
+        taken.append(row)
+    chosen = []
+    capacity = budget
+    for candidate, row in zip(reversed(candidates), reversed(taken), strict=True):
+        if row[capacity]:
+            chosen.append(candidate)
+            capacity -= candidate[1]
+    return chosen
+
+
+@dataclass
+class Plan:
+    """The tasks planned for a budget."""
+
+    budget: int
+    # Grid rows of the planned tasks, most valuable first, with their value as "score"
+    rows: list[dict] = field(default_factory=list)
+
+    @property
+    def effort(self) -> int:
+        return sum(task_cost(row["effort"]) for row in self.rows)
+
+
+class DayPlanner:
+    """Tasks ready to start ranked by value, kept up to date from published task changes.
+
+    The rankings are built from the database on first use (and again each new day, as values
+    depend on it, or after a change that can't be applied task by task).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # Day the values were worked out for; None until loaded, or when they need reloading
+        self._day: date | None = None
+        # Value, cost and category id of every task ready to start, by task id
+        self._tasks: dict[int, tuple[float, int, int | None]] = {}
+        # (-value, task id) of the tasks of each category and cost, most valuable first
+        self._ranked: dict[tuple[int | None, int], list[tuple[float, int]]] = {}
+
+    def plan(
+        self, budget: int, hidden_categories: Iterable[int] = ()
+    ) -> list[tuple[float, int, int]]:
+        """Return the (value, cost, task id) of the tasks to do, most valuable first.
+
+        Args:
+            budget: Total effort to plan for.
+            hidden_categories: Leave out the tasks in these categories (uncategorised tasks
+                are always planned, as the task list shows them).
+
+        """
+        if budget < 1:
+            return []
+        hidden = set(hidden_categories)
+        with self._lock:
+            if self._day != date.today():
+                self._load(date.today())
+            rankings = defaultdict(list)
+            for (category_id, cost), ranked in self._ranked.items():
+                if cost <= budget and (category_id is None or category_id not in hidden):
+                    rankings[cost].append(ranked)
+            candidates = [
+                (-negated_value, cost, task_id)
+                for cost, ranked in rankings.items()
+                for negated_value, task_id in itertools.islice(heapq.merge(*ranked), budget // cost)
+            ]
+        return sorted(choose(candidates, budget), reverse=True)
+
+    def apply(self, change: TaskChange) -> None:
+        """Update the rankings with a change published by a write action."""
+        with self._lock:
+            today = self._day
+            if today is None:
+                return
+            if change.reload:
+                self._day = None
+                return
+            for row in change.removed:
+                self._discard(row["id"])
+            for row in (*change.added, *change.updated):
+                if row["is_complete"] == "✅" or row["blocked_by"]:
+                    self._discard(row["id"])
+                else:
+                    due = row["complete_by"]
+                    complete_by = date.fromisoformat(due) if due else None
+                    self._add(
+                        today,
+                        row["id"],
+                        row["category_id"],
+                        row["priority"],
+                        row["effort"],
+                        complete_by,
+                    )
+
+    def _load(self, today: date) -> None:
+        self._day = today
+        self._tasks.clear()
+        self._ranked.clear()
+        with session_scope() as session:
+            query = open_tasks_query().execution_options(yield_per=ROW_CHUNK_SIZE)
+            for record in session.connection().execute(query):
+                value = task_value(record.priority, record.complete_by, today)
+                cost = task_cost(record.effort)
+                self._tasks[record.id] = (value, cost, record.category_id)
+                self._ranked.setdefault((record.category_id, cost), []).append((-value, record.id))
+        for ranked in self._ranked.values():
+            ranked.sort()
+
+    def _add(
+        self, today: date, task_id: int, category_id, priority, effort, complete_by
+    ) -> None:
+        self._discard(task_id)
+        value, cost = task_value(priority, complete_by, today), task_cost(effort)
+        self._tasks[task_id] = (value, cost, category_id)
+        bisect.insort(self._ranked.setdefault((category_id, cost), []), (-value, task_id))
+
+    def _discard(self, task_id: int) -> None:
+        if task_id not in self._tasks:
+            return
+        value, cost, category_id = self._tasks.pop(task_id)
+        ranked = self._ranked[category_id, cost]
+        del ranked[bisect.bisect_left(ranked, (-value, task_id))]
+        if not ranked:
+            del self._ranked[category_id, cost]
+
+
+def open_tasks_query() -> Select:
+    """Select what the planner needs of every task ready to start (open and not blocked)."""
+    return select(Task.id, Task.category_id, Task.priority, Task.effort, Task.complete_by).where(
+        Task.complete_sort == false(),
+        Task.open_blocker_count == 0,
+    )
+
+
+# A planner per workspace, created on first use
+_planners: dict[str, DayPlanner] = {}
+_planners_lock = threading.Lock()
+
+
+def planner_for(workspace: str) -> DayPlanner:
+    """Return the planner of ``workspace``."""
+    with _planners_lock:
+        if workspace not in _planners:
+            _planners[workspace] = DayPlanner()
+        return _planners[workspace]
+
+
+def apply_change(change: TaskChange) -> None:
+    """Update the planner of the workspace a published change was made in."""
+    planner_for(change.workspace).apply(change)
+
+
+changes.subscribe(apply_change)
+
+
+def plan_day(budget: int, hidden_categories: Iterable[int] = ()) -> Plan:
+    """Plan the tasks ready to start (leaving out those of ``hidden_categories``) worth most
+    within ``budget``, in the current workspace."""
+    # Reloads the rankings if another process changed the tasks
+    check_external_writes()
+    chosen = planner_for(current_workspace.get()).plan(budget, hidden_categories)
+    plan = Plan(budget)
+    if not chosen:
+        return plan
+    bounds = due_bucket_bounds()
+    with session_scope() as session:
+        query = active_tasks_query().where(Task.id.in_([task_id for _, _, task_id in chosen]))
+        records = session.connection().execute(query)
+        rows = {record.id: record_to_row(record, bounds) for record in records}
+    for value, _, task_id in chosen:
+        # Tasks deleted since they were planned are left out
+        if task_id in rows:
+            plan.rows.append({**rows[task_id], "score": round(value, 2)})
+    return plan
@@ -0,0 +1,120 @@
+import dataclasses
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+# Workspace whose database is at ``DatabaseSettings.path``; every other workspace has its own
+# database in ``DatabaseSettings.workspaces_dir``
+DEFAULT_WORKSPACE = "default"
+# Workspace keys double as file names, so they are kept to lowercase letters, digits, - and _
+WORKSPACE_KEY = re.compile(r"[a-z0-9][a-z0-9_-]{0,63}")
+
+
+def check_workspace_key(workspace: str) -> str:
+    """Return ``workspace`` if it is a valid workspace key, or raise ``ValueError``."""
+    if not WORKSPACE_KEY.fullmatch(workspace):
+        msg = f"Invalid workspace key: {workspace!r}"
+        raise ValueError(msg)
+    return workspace
+
+
+@dataclass(frozen=True)
+class DatabaseSettings:
+    """How to connect to the SQLite database.
+
+    Every field can be set with a ``TODOOEY_DB_*`` environment variable, see ``from_env``.
+    """
+
+    # Path of the database file, or ":memory:"
+    path: str = "runtime/todo.db"
+    # WAL lets readers carry on while a writer commits
+    journal_mode: str = "WAL"
+    # NORMAL is safe with WAL: a power loss can only lose the last commits, not corrupt the file
+    synchronous: str = "NORMAL"
+    # Page cache per connection; negative values are in KiB
+    cache_size: int = -64_000
+    # Bytes of the file to memory-map, 0 to disable
+    mmap_size: int = 256 * 1024 * 1024
+    # Milliseconds to wait for a lock before failing with "database is locked"
+    busy_timeout: int = 5_000
+    # Connections kept open by the pool
+    pool_size: int = 5
+    # Values kept by the read cache of task lists, categories and single tasks; the least
+    # recently used one is dropped beyond it
+    cache_max_entries: int = 1_000
+    # Statements slower than this many milliseconds are logged, 0 to disable
+    slow_query_ms: int = 0
+    # Queue task updates from the UI and write them this many milliseconds later, merged per
+    # task and in one transaction; 0 writes every update at once
+    write_behind_ms: int = 0
+    # Tasks with queued updates that trigger a write before the delay is up
+    write_behind_max_pending: int = 200
+    # Minutes between maintenance runs (archive purge, statistics, incremental vacuum), 0 to
+    # disable them
+    maintenance_interval_minutes: int = 60
+    # Archived tasks are deleted for good this many days after they were archived. 0 (the
+    # default) keeps them forever: purging loses data, so it has to be asked for
+    archive_retention_days: int = 0
+    # Longest a single maintenance step may hold the write lock, in milliseconds
+    maintenance_step_ms: int = 50
+    # Longest a maintenance run may take; work left over is picked up by the next run
+    maintenance_run_ms: int = 5_000
+    # Directory of the databases of the workspaces other than the default one, a file each
+    workspaces_dir: str = "runtime/workspaces"
+    # Workspace databases kept open at a time; the least recently used one is closed beyond it
+    max_open_workspaces: int = 16
+    # Directory backups are written to, a file per workspace and backup
+    backup_dir: str = "runtime/backups"
+    # Minutes between backups of every workspace made by the app, 0 to only back up on demand
+    backup_interval_minutes: int = 0
+    # Backups kept per workspace; older ones are deleted once a new one is made
+    backup_keep: int = 7
+    # Compress backups with gzip
+    backup_gzip: bool = True
+    # Database pages copied per step of a backup, with a pause between steps for writers
+    backup_step_pages: int = 1_000
+    # Milliseconds to pause between the steps of a backup
+    backup_pause_ms: int = 10
+
+    @classmethod
+    def from_env(cls) -> "DatabaseSettings":
+        """Build the settings from ``TODOOEY_DB_<FIELD>`` environment variables."""
+        overrides: dict[str, Any] = {}
+        for name, field in cls.__dataclass_fields__.items():
+            value = os.environ.get(f"TODOOEY_DB_{name.upper()}")
+            if value is not None:
+                if field.type is bool:
+                    overrides[name] = value.lower() in ("1", "true", "yes", "on")
+                else:
+                    overrides[name] = int(value) if field.type is int else value
+        return cls(**overrides)
+
+    @property
+    def url(self) -> str:
+        return f"sqlite:///{self.path}"
+
+    @property
+    def in_memory(self) -> bool:
+        return self.path == ":memory:"
+
+    def for_workspace(self, workspace: str) -> "DatabaseSettings":
+        """Return the settings of the database of ``workspace``.
+
+        Raises:
+            ValueError: If ``workspace`` is not a valid workspace key.
+
+        """
+        if check_workspace_key(workspace) == DEFAULT_WORKSPACE or self.in_memory:
+            return self
+        return dataclasses.replace(self, path=str(Path(self.workspaces_dir) / f"{workspace}.db"))
+
+    def workspace_keys(self) -> list[str]:
+        """Return the default workspace and every other workspace with a database, by key."""
+        others = sorted(
+            path.stem
+            for path in Path(self.workspaces_dir).glob("*.db")
+            if WORKSPACE_KEY.fullmatch(path.stem) and path.stem != DEFAULT_WORKSPACE
+        )
+        return [DEFAULT_WORKSPACE, *others]
@@ -0,0 +1,341 @@
+"""Bulk import and export of tasks as CSV or JSON Lines.
+
+Both directions stream: imported records are parsed, validated and inserted a batch at a
+time (one transaction and one executemany per batch), and exported tasks are fetched from
+the database in chunks, so neither holds the whole file or table in memory.
+
+    python -m src.transfer import tasks.csv --batch-size 5000
+    python -m src.transfer export tasks.jsonl
+    python -m src.transfer import tasks.csv --workspace team-a
+
+The format follows the file extension unless ``--format`` is given; "-" reads from stdin
+or writes to stdout. A running app sees imported tasks on its next read of the workspace.
+"""
+import argparse
+import csv
+import itertools
+import json
+import sys
+import time
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from datetime import date
+from pathlib import Path
+from typing import TextIO
+
+from sqlalchemy import Select, select
+
+from . import actions
+from .model import Category, Task, current_workspace, init_db, session_scope
+from .settings import DEFAULT_WORKSPACE, check_workspace_key
+
+FIELDS = ("name", "details", "category", "priority", "effort", "complete_by", "is_complete")
+FORMATS = ("csv", "jsonl")
+DEFAULT_BATCH_SIZE = 1_000
+# Export reads this many rows from the database at a time
+EXPORT_CHUNK_SIZE = 1_000
+
+TRUE_VALUES = {"1", "true", "yes", "y", "✅"}
+FALSE_VALUES = {"", "0", "false", "no", "n", "⬜"}
+
+
+class InvalidRecordError(ValueError):
+    """Raised when an imported record can't be turned into a task."""
+
+
+@dataclass
+class TransferReport:
+    """Counts and timing of an import or export."""
+
+    # Tasks imported or exported
+    tasks: int = 0
+    # Records skipped because they were invalid, with the reason, by line number
+    skipped: dict[int, str] = field(default_factory=dict)
+    seconds: float = 0.0
+
+    @property
+    def tasks_per_second(self) -> float:
+        return self.tasks / self.seconds if self.seconds else 0.0
+
+    def summary(self, verb: str) -> str:
+        text = (
+            f"{verb} {self.tasks} tasks in {self.seconds:.2f} s"
+            f" ({self.tasks_per_second:,.0f} tasks/s)"
+        )
+        if self.skipped:
+            text += f", skipped {len(self.skipped)} invalid records"
+        return text
+
+
+def read_csv(file: TextIO) -> Iterator[tuple[int, dict]]:
+    """Yield the line number and the fields of every record of a CSV file with a header."""
+    reader = csv.DictReader(file)
+    for record in reader:
+        yield reader.line_num, record
+
+
+def read_jsonl(file: TextIO) -> Iterator[tuple[int, dict]]:
+    """Yield the line number and the fields of every (non-blank) line of a JSON Lines file."""
+    for line_number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            record = e
+        yield line_number, record
+
+
+def parse_record(record: dict | Exception) -> dict:
+    """Validate a record and convert its fields to the types of the ``task`` columns.
+
+    Raises:
+        InvalidRecordError: If the record is not an object, has no name, or has a field
+            that can't be converted.
+
+    """
+    if isinstance(record, Exception):
+        msg = f"not valid JSON: {record}"
+        raise InvalidRecordError(msg)
+    if not isinstance(record, dict):
+        msg = "not an object"
+        raise InvalidRecordError(msg)
+    name = _text(record, "name")
+    if not name:
+        msg = "name is missing"
+        raise InvalidRecordError(msg)
+    return {
+        "name": name,
+        "details": _text(record, "details"),
+        "category": _text(record, "category") or None,
+        "priority": _integer(record, "priority"),
+        "effort": _integer(record, "effort"),
+        "complete_by": _date(record, "complete_by"),
+        "is_complete": _boolean(record, "is_complete"),
+    }
+
+
+def _field(record: dict, name: str):
+    """Return field ``name`` of ``record``, which must be a single value, not a list or object."""
+    value = record.get(name)
+    if isinstance(value, (dict, list)):
+        msg = f"{name} must be a single value, not {value!r}"
+        raise InvalidRecordError(msg)
+    return value
+
+
+def _text(record: dict, name: str) -> str:
+    value = _field(record, name)
+    return "" if value is None else str(value).strip()
+
+
+def _integer(record: dict, name: str) -> int | None:
+    value = _field(record, name)
+    if value is None or value == "":
+        return None
+    # int() would take True as 1 and cut 2.7 down to 2
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        msg = f"{name} must be an integer, not {value!r}"
+        raise InvalidRecordError(msg)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        msg = f"{name} must be an integer, not {value!r}"
+        raise InvalidRecordError(msg) from None
+
+
+def _date(record: dict, name: str) -> date | None:
+    value = _field(record, name)
+    if value is None or value == "":
+        return None
+    msg = f"{name} must be a YYYY-MM-DD date, not {value!r}"
+    # A number such as 20300101 would pass as a date in the basic ISO format
+    if not isinstance(value, str):
+        raise InvalidRecordError(msg)
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise InvalidRecordError(msg) from None
+
+
+def _boolean(record: dict, name: str) -> bool:
+    value = _field(record, name)
+    if isinstance(value, bool):
+        return value
+    text = _text(record, name).lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    msg = f"{name} must be true or false, not {value!r}"
+    raise InvalidRecordError(msg)
+
+
+def valid_tasks(
+    records: Iterable[tuple[int, dict]],
+    report: TransferReport,
+    strict: bool = False,
+) -> Iterator[dict]:
+    """Yield the parsed tasks of ``records``, recording invalid ones in ``report.skipped``.
+
+    With ``strict``, the first invalid record raises ``InvalidRecordError`` instead.
+    """
+    for line_number, record in records:
+        try:
+            yield parse_record(record)
+        except InvalidRecordError as e:
+            if strict:
+                msg = f"line {line_number}: {e}"
+                raise InvalidRecordError(msg) from None
+            report.skipped[line_number] = str(e)
+
+
+def import_tasks(
+    records: Iterable[tuple[int, dict]],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    strict: bool = False,
+) -> TransferReport:
+    """Add the tasks of ``records`` (from ``read_csv`` or ``read_jsonl``) in batches.
+
+    Each batch is inserted in its own transaction, so a failure only loses the batch it
+    happened in.
+    """
+    report = TransferReport()
+    start = time.perf_counter()
+    for batch in itertools.batched(valid_tasks(records, report, strict), batch_size):
+        report.tasks += actions.add_tasks(list(batch))
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def export_query() -> Select:
+    """Select the exported fields of every active task, in id order."""
+    return (
+        select(
+            Task.name,
+            Task.details,
+            Category.name.label("category"),
+            Task.priority,
+            Task.effort,
+            Task.complete_by,
+            Task.is_complete,
+        )
+        .outerjoin(Category, Category.id == Task.category_id)
+        .order_by(Task.id)
+    )
+
+
+def iter_export_records() -> Iterator[dict]:
+    """Yield every active task as a dict of ``FIELDS``, reading the table in chunks.
+
+    Plain rows are fetched rather than ``Task`` objects, so memory use does not grow with
+    the number of tasks.
+    """
+    with session_scope() as session:
+        result = session.execute(export_query().execution_options(yield_per=EXPORT_CHUNK_SIZE))
+        for row in result:
+            record = row._asdict()
+            record["complete_by"] = row.complete_by.isoformat() if row.complete_by else None
+            record["is_complete"] = bool(row.is_complete)
+            yield record
+
+
+def write_csv(records: Iterable[dict], file: TextIO) -> int:
+    """Write ``records`` as CSV with a header and return how many were written."""
+    writer = csv.DictWriter(file, fieldnames=FIELDS)
+    writer.writeheader()
+    count = 0
+    for record in records:
+        writer.writerow(record)
+        count += 1
+    return count
+
+
+def write_jsonl(records: Iterable[dict], file: TextIO) -> int:
+    """Write ``records`` as JSON Lines and return how many were written."""
+    count = 0
+    for record in records:
+        file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        count += 1
+    return count
+
+
+def export_tasks(file: TextIO, file_format: str) -> TransferReport:
+    """Write every active task to ``file`` as CSV or JSON Lines."""
+    report = TransferReport()
+    start = time.perf_counter()
+    write = write_csv if file_format == "csv" else write_jsonl
+    report.tasks = write(iter_export_records(), file)
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def guess_format(path: str, file_format: str | None) -> str:
+    """Return the given format, or the one matching the extension of ``path``."""
+    if file_format:
+        return file_format
+    suffix = Path(path).suffix.lower().lstrip(".")
+    if suffix in ("jsonl", "ndjson"):
+        return "jsonl"
+    if suffix == "csv":
+        return "csv"
+    msg = f"can't tell the format of {path!r}, pass --format"
+    raise SystemExit(msg)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("direction", choices=("import", "export"))
+    parser.add_argument("path", help='file to read or write, "-" for stdin/stdout')
+    parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        help="file format (default: from the extension)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="tasks per transaction",
+    )
+    parser.add_argument("--strict", action="store_true", help="stop at the first invalid record")
+    parser.add_argument(
+        "--workspace",
+        type=check_workspace_key,
+        default=DEFAULT_WORKSPACE,
+        help="workspace to import into or export from",
+    )
+    args = parser.parse_args(argv)
+
+    file_format = guess_format(args.path, args.format)
+    current_workspace.set(args.workspace)
+    init_db()
+    if args.direction == "import":
+        if args.path == "-":
+            file = sys.stdin
+        else:
+            file = open(args.path, newline="", encoding="utf-8")  # noqa: SIM115
+        with file:
+            records = read_csv(file) if file_format == "csv" else read_jsonl(file)
+            try:
+                report = import_tasks(records, args.batch_size, args.strict)
+            except InvalidRecordError as e:
+                raise SystemExit(f"Invalid record, nothing after it was imported: {e}") from None
+        for line_number, reason in report.skipped.items():
+            print(f"Skipped line {line_number}: {reason}", file=sys.stderr)
+        print(report.summary("Imported"), file=sys.stderr)
+    else:
+        if args.path == "-":
+            file = sys.stdout
+        else:
+            file = open(args.path, "w", newline="", encoding="utf-8")  # noqa: SIM115
+        with file:
+            report = export_tasks(file, file_format)
+        print(report.summary("Exported"), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
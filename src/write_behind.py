@@ -0,0 +1,159 @@
+"""Optional write-behind queue for task updates made from the UI.
+
+Rather than one transaction (and fsync) per click, updates are queued, merged per task (so
+complete -> incomplete -> complete is a single write of the last value) and written together
+in one transaction once ``write_behind_ms`` has passed since the first queued update, or as
+soon as ``write_behind_max_pending`` tasks have updates waiting. Updates to tasks of different
+workspaces are written in a transaction per workspace.
+
+Enabled by setting ``TODOOEY_DB_WRITE_BEHIND_MS``; ``task_updates`` is ``None`` otherwise.
+"""
+import asyncio
+import logging
+import time
+from collections.abc import Callable
+
+from . import actions
+from .async_actions import run_in_db_thread
+from .metrics import write_behind_flush_seconds, write_behind_updates, write_behind_writes
+from .model import use_workspace
+from .settings import DEFAULT_WORKSPACE, DatabaseSettings
+
+logger = logging.getLogger("todooey.write_behind")
+
+
+class WriteBehindQueue:
+    """Merges queued task updates and writes them in batches, from the event loop.
+
+    Args:
+        write: Blocking function writing the merged updates (fields by task id) in one
+            transaction and returning the grid rows of the updated tasks, run on the
+            database threads.
+        delay: Seconds to wait after the first queued update before writing.
+        max_pending: Number of tasks with queued updates that triggers an early write.
+
+    """
+
+    def __init__(
+        self,
+        write: Callable[[dict[int, dict]], list[dict]],
+        delay: float,
+        max_pending: int,
+    ) -> None:
+        self._write = write
+        self.delay = delay
+        self.max_pending = max_pending
+        # Merged fields and the futures waiting on them, by workspace and task id
+        self._pending: dict[tuple[str, int], dict] = {}
+        self._waiters: dict[tuple[str, int], list[asyncio.Future]] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        self._flushing: set[asyncio.Task] = set()
+        self._lock = asyncio.Lock()
+
+    def enqueue(
+        self,
+        task_id: int,
+        *,
+        workspace: str = DEFAULT_WORKSPACE,
+        **fields,
+    ) -> asyncio.Future:
+        """Queue an update of a task of ``workspace``, merged into any update of it already
+        waiting.
+
+        Returns:
+            Future: Resolves to the task's grid row (``None`` if the task no longer exists)
+            once the update is written, or to the exception if writing failed.
+
+        """
+        loop = asyncio.get_running_loop()
+        self._pending.setdefault((workspace, task_id), {}).update(fields)
+        future = loop.create_future()
+        self._waiters.setdefault((workspace, task_id), []).append(future)
+        write_behind_updates.inc()
+        if len(self._pending) >= self.max_pending:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.delay, self._start_flush)
+        return future
+
+    def pending(self) -> int:
+        """Return the number of tasks with updates waiting to be written."""
+        return len(self._pending)
+
+    def is_pending(self, task_id: int, workspace: str = DEFAULT_WORKSPACE) -> bool:
+        """Return whether a task of ``workspace`` has updates waiting to be written."""
+        return (workspace, task_id) in self._pending
+
+    def _start_flush(self) -> None:
+        task = asyncio.get_running_loop().create_task(self.flush())
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    async def flush(self) -> None:
+        """Write every queued update now, in one transaction per workspace.
+
+        A failed write is logged and handed to the futures of the updates it held, so the
+        UI can tell the user and undo what it showed; it is not raised here.
+        """
+        async with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            pending, waiters = self._pending, self._waiters
+            self._pending, self._waiters = {}, {}
+            by_workspace: dict[str, dict[int, dict]] = {}
+            for (workspace, task_id), fields in pending.items():
+                by_workspace.setdefault(workspace, {})[task_id] = fields
+            for workspace, updates in by_workspace.items():
+                await self._write_updates(workspace, updates, waiters)
+
+    async def _write_updates(
+        self,
+        workspace: str,
+        updates: dict[int, dict],
+        waiters: dict[tuple[str, int], list[asyncio.Future]],
+    ) -> None:
+        start = time.perf_counter()
+        try:
+            with use_workspace(workspace):
+                rows = await run_in_db_thread(self._write, updates)
+        except Exception as e:
+            logger.exception("Failed to write %d queued task updates", len(updates))
+            write_behind_writes.inc(len(updates), outcome="failed")
+            for task_id in updates:
+                for future in waiters[workspace, task_id]:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        finally:
+            write_behind_flush_seconds.observe(time.perf_counter() - start)
+        write_behind_writes.inc(len(updates), outcome="written")
+        rows_by_id = {row["id"]: row for row in rows}
+        for task_id in updates:
+            for future in waiters[workspace, task_id]:
+                if not future.done():
+                    future.set_result(rows_by_id.get(task_id))
+
+
+def create_task_updates(settings: DatabaseSettings) -> WriteBehindQueue | None:
+    """Return the write-behind queue for ``settings``, or ``None`` if it is disabled."""
+    if not settings.write_behind_ms:
+        return None
+    return WriteBehindQueue(
+        actions.update_tasks,
+        settings.write_behind_ms / 1000,
+        settings.write_behind_max_pending,
+    )
+
+
+task_updates = create_task_updates(DatabaseSettings.from_env())
+
+
+async def flush_task_updates() -> None:
+    """Write the queued task updates, if any, now.
+
+    Called before writing to tasks straight away: a queued update written afterwards would
+    undo the write, and the UI would keep showing its preview.
+    """
+    if task_updates is not None:
+        await task_updates.flush()
@@ -0,0 +1,18 @@
+import pytest
+
+from src.actions import cache
+from src.model import configure_engine, init_db
+from src.settings import DatabaseSettings
+
+
+@pytest.fixture
+def database(tmp_path) -> DatabaseSettings:
+    """Work on a new, empty database (and workspaces directory) of the test's own."""
+    settings = DatabaseSettings(
+        path=str(tmp_path / "todo.db"), workspaces_dir=str(tmp_path / "workspaces")
+    )
+    configure_engine(settings)
+    init_db()
+    # What is cached was read from the previous test's database
+    cache.bump()
+    return settings
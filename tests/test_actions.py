@@ -0,0 +1,156 @@
+import sqlite3
+from datetime import date, datetime
+
+import pytest
+
+from src import actions
+
+
+def new_task(name: str, **fields) -> dict:
+    """Return the fields of a task for ``actions.create_tasks``, unset ones as the API leaves
+    them."""
+    return {
+        "name": name,
+        "details": "",
+        "category": None,
+        "priority": None,
+        "effort": None,
+        "complete_by": None,
+        "is_complete": False,
+        **fields,
+    }
+
+
+@pytest.fixture
+def tasks(database) -> list[dict]:
+    """Tasks with every sort column of the list order missing on some of them."""
+    return actions.create_tasks(
+        [
+            new_task("no fields"),
+            new_task("no effort", priority=2, category="home"),
+            new_task("no priority", effort=3, category="work"),
+            new_task("no category", priority=1, effort=1, complete_by=date(2030, 1, 1)),
+            new_task("unknown completion", priority=3, is_complete=None),
+            new_task("complete", is_complete=True, category="work"),
+            *(new_task(f"bare {i}") for i in range(6)),
+        ],
+    )
+
+
+def walk_pages(read_page) -> list[int]:
+    """Return the ids of the tasks on every page, reading pages until one comes back empty."""
+    ids: list[int] = []
+    cursor = None
+    while True:
+        rows, cursor = read_page(cursor)
+        if not rows:
+            return ids
+        ids.extend(row["id"] for row in rows)
+
+
+@pytest.mark.parametrize("limit", [1, 3, 5])
+def test_task_pages_reach_every_task(tasks, limit) -> None:
+    ids = walk_pages(lambda cursor: actions.get_task_page(limit, cursor))
+
+    assert ids == [row["id"] for row in actions.get_task_rows()]
+    assert sorted(ids) == sorted(task["id"] for task in tasks)
+
+
+def test_list_pages_reach_every_task(tasks) -> None:
+    ids = walk_pages(lambda cursor: actions.list_tasks(2, cursor))
+
+    assert sorted(ids) == sorted(task["id"] for task in tasks)
+
+
+def test_ready_pages_reach_every_open_task(tasks) -> None:
+    ids = walk_pages(lambda cursor: actions.list_tasks(2, cursor, ready=True))
+
+    assert sorted(ids) == sorted(task["id"] for task in tasks if task["name"] != "complete")
+
+
+def test_tasks_without_priority_or_effort_are_listed_last(tasks) -> None:
+    names = [
+        row["name"]
+        for row in actions.get_task_rows()
+        if row["name"] in ("no effort", "no priority")
+    ]
+
+    assert names == ["no effort", "no priority"]
+
+
+def test_row_sort_key_follows_the_list_order(tasks) -> None:
+    rows = actions.get_task_rows()
+
+    assert sorted(rows, key=actions.row_sort_key) == rows
+
+
+def test_hiding_a_category_keeps_uncategorised_tasks(tasks) -> None:
+    home = actions.get_category_ids(active_only=False)["home"]
+    expected = sorted(task["id"] for task in tasks if task["category"] != "home")
+
+    rows = actions.get_task_rows(hidden_categories=[home])
+    pages = walk_pages(lambda cursor: actions.get_task_page(4, cursor, hidden_categories=[home]))
+
+    assert sorted(row["id"] for row in rows) == expected
+    assert sorted(pages) == expected
+
+
+def test_hiding_a_category_keeps_uncategorised_archived_tasks(tasks) -> None:
+    home = actions.get_category_ids(active_only=False)["home"]
+    actions.delete_tasks([task["id"] for task in tasks])
+
+    rows = actions.get_task_rows(hidden_categories=[home], include_archive=True)
+
+    kept = [task["id"] for task in tasks if task["category"] != "home"]
+    assert sorted(row["task_id"] for row in rows) == sorted(kept)
+
+
+def test_changes_made_by_another_process_are_read(tasks, database) -> None:
+    reloads = []
+    unsubscribe = actions.changes.subscribe(lambda change: reloads.append(change.reload))
+    try:
+        actions.get_task_rows()
+        version = actions.cache_stats()["version"]
+        with sqlite3.connect(database.path) as connection:
+            connection.execute(
+                "UPDATE task SET name = 'renamed elsewhere' WHERE id = ?", (tasks[0]["id"],)
+            )
+        connection.close()
+
+        assert actions.cache_stats()["version"] > version
+        assert "renamed elsewhere" in [row["name"] for row in actions.get_task_rows()]
+        assert reloads == [True]
+    finally:
+        unsubscribe()
+
+
+def test_own_writes_are_not_taken_for_another_process(tasks) -> None:
+    reloads = []
+    unsubscribe = actions.changes.subscribe(lambda change: reloads.append(change.reload))
+    try:
+        actions.get_task_rows()
+        actions.mark_task_complete(tasks[0]["id"])
+        actions.get_task_rows()
+        actions.cache_stats()
+    finally:
+        unsubscribe()
+
+    assert reloads == [False]
+
+
+def test_due_date_can_be_given_as_a_datetime(database) -> None:
+    added = actions.add_task("a", "d", "Work", 1, 2, datetime(2030, 10, 20))
+    edited = actions.edit_task(added["id"], "a", "d", "Work", 1, 2, datetime(2030, 10, 21))
+
+    assert added["complete_by"] == "2030-10-20"
+    assert edited["complete_by"] == "2030-10-21"
+    assert edited["due_bucket"] == "later"
+
+
+def test_task_can_be_edited_without_category_priority_or_effort(tasks) -> None:
+    bare = next(task for task in tasks if task["name"] == "no fields")
+
+    edited = actions.edit_task(bare["id"], "renamed", "", None, None, None, None)
+
+    fields = (edited["name"], edited["category"], edited["priority"], edited["effort"])
+    assert fields == ("renamed", None, None, None)
@@ -0,0 +1,65 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.api import router
+
+
+@pytest.fixture
+def client(database) -> TestClient:
+    app = FastAPI()
+    app.include_router(router)
+    return TestClient(app)
+
+
+def test_task_pages_reach_every_task(client) -> None:
+    created = [client.post("/api/tasks", json={"name": f"task {i}"}).json()["id"] for i in range(5)]
+
+    listed: list[int] = []
+    cursor = None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/api/tasks", params=params).json()
+        listed.extend(task["id"] for task in page["tasks"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert sorted(listed) == created
+
+
+def test_missing_task_is_not_found(client) -> None:
+    assert client.get("/api/tasks/999").status_code == 404
+    assert client.post("/api/tasks/999/complete").status_code == 404
+    assert client.delete("/api/tasks/999/blockers/1").status_code == 404
+
+
+def test_unchanged_tasks_are_not_modified(client) -> None:
+    client.post("/api/tasks", json={"name": "task"})
+    tag = client.get("/api/tasks").headers["ETag"]
+
+    assert client.get("/api/tasks", headers={"If-None-Match": tag}).status_code == 304
+
+
+@pytest.mark.parametrize("fields", [{"name": None}, {"name": ""}, {"is_complete": None}])
+def test_name_and_completion_cannot_be_cleared(client, fields) -> None:
+    task = client.post("/api/tasks", json={"name": "task"}).json()
+
+    assert client.patch(f"/api/tasks/{task['id']}", json=fields).status_code == 422
+    assert client.patch("/api/tasks/batch", json=[{"id": task["id"], **fields}]).status_code == 422
+    assert client.get(f"/api/tasks/{task['id']}").json() == task
+
+
+def test_other_fields_can_be_cleared(client) -> None:
+    task = client.post(
+        "/api/tasks",
+        json={"name": "task", "details": "some", "category": "work", "priority": 1, "effort": 2},
+    ).json()
+
+    cleared = client.patch(
+        f"/api/tasks/{task['id']}",
+        json={"category": None, "priority": None, "effort": None, "complete_by": None},
+    ).json()
+
+    assert (cleared["category"], cleared["priority"], cleared["effort"]) == (None, None, None)
+    assert (cleared["name"], cleared["details"], cleared["is_complete"]) == ("task", "some", False)
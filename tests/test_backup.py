@@ -0,0 +1,128 @@
+import dataclasses
+import gzip
+import json
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from src import actions, backup
+from src.backup import BackupError, make_backup, restore_backup, verify_backup
+
+
+def add_tasks(count: int, details: str = "") -> None:
+    fields = {
+        "category": "work",
+        "priority": 1,
+        "effort": 1,
+        "complete_by": None,
+        "is_complete": False,
+    }
+    actions.add_tasks([{**fields, "name": f"task {i}", "details": details} for i in range(count)])
+
+
+def task_names() -> list[str]:
+    return sorted(row["name"] for row in actions.get_task_rows())
+
+
+@pytest.fixture(params=[True, False], ids=["gzip", "plain"])
+def settings(database, tmp_path, request):
+    """The test's database, backed up into its own directory, with and without gzip."""
+    backup_dir = str(tmp_path / "backups")
+    return dataclasses.replace(database, backup_dir=backup_dir, backup_gzip=request.param)
+
+
+def test_backup_is_verified_against_its_manifest(settings) -> None:
+    add_tasks(3)
+
+    report = make_backup(settings)
+
+    assert report.path.name.endswith(".db.gz" if settings.backup_gzip else ".db")
+    assert report.counts["task"] == 3
+    verification = verify_backup(report.path)
+    assert verification.ok, verification.problems
+    assert verification.counts == report.counts
+
+
+def test_backup_with_wrong_row_counts_fails_verification(settings) -> None:
+    add_tasks(3)
+    path = make_backup(settings).path
+    manifest = backup.manifest_path(path)
+    content = json.loads(manifest.read_text())
+    content["counts"]["task"] = 4
+    manifest.write_text(json.dumps(content))
+
+    assert verify_backup(path).problems == ["task has 3 rows, the manifest says 4"]
+
+
+def test_unreadable_backup_fails_verification(settings) -> None:
+    path = make_backup(settings).path
+    garbage = b"not a database"
+    path.write_bytes(gzip.compress(garbage) if settings.backup_gzip else garbage)
+
+    assert not verify_backup(path).ok
+
+
+def test_restore_brings_back_the_backed_up_tasks(settings) -> None:
+    add_tasks(3)
+    path = make_backup(settings).path
+    expected = task_names()
+    actions.delete_tasks([row["id"] for row in actions.get_task_rows()[:2]])
+    actions.add_task("added after the backup", "", None, 1, 1, None)
+
+    restore_backup(path)
+
+    assert task_names() == expected
+
+
+def test_backup_failing_verification_is_not_restored(settings) -> None:
+    add_tasks(3)
+    path = make_backup(settings).path
+    backup.manifest_path(path).unlink()
+    actions.add_task("added after the backup", "", None, 1, 1, None)
+    expected = task_names()
+
+    with pytest.raises(BackupError, match="no readable manifest"):
+        restore_backup(path)
+
+    assert task_names() == expected
+
+
+def test_only_the_latest_backups_are_kept(settings, monkeypatch) -> None:
+    settings = dataclasses.replace(settings, backup_keep=2)
+    made_at = iter(datetime(2030, 1, 1, 12) + timedelta(minutes=i) for i in range(3))
+
+    class Clock(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return next(made_at).replace(tzinfo=tz)
+
+    monkeypatch.setattr(backup, "datetime", Clock)
+    paths = [make_backup(settings).path for _ in range(3)]
+
+    assert [path for _, _, path in backup.list_backups(settings)] == paths[:0:-1]
+    assert not paths[0].exists()
+    assert not backup.manifest_path(paths[0]).exists()
+
+
+def test_busy_database_is_copied_in_one_step(database, tmp_path, monkeypatch) -> None:
+    # Enough pages for several steps of one page, and a write after every step, which makes
+    # the copy start over each time until it is finished in one step
+    add_tasks(50, details="x" * 500)
+    writer = sqlite3.connect(database.path)
+
+    def write_between_steps(_seconds: float) -> None:
+        with writer:
+            writer.execute("UPDATE task SET effort = effort + 1 WHERE id = 1")
+
+    monkeypatch.setattr(backup.time, "sleep", write_between_steps)
+    source = sqlite3.connect(database.path)
+    target = sqlite3.connect(tmp_path / "copy.db")
+    try:
+        report = backup.copy_database(source, target, pages=1, pause=0)
+        assert report.single_step
+        assert report.restarts == backup.MAX_RESTARTS + 1
+        assert backup.table_counts(target) == backup.table_counts(source)
+    finally:
+        for connection in (source, target, writer):
+            connection.close()
@@ -0,0 +1,22 @@
+from src.cache import VersionedCache
+
+
+def test_least_recently_used_value_is_dropped_beyond_max_entries() -> None:
+    cache = VersionedCache(max_entries=2)
+    loads: list[str] = []
+
+    def load(key: str):
+        def loader() -> str:
+            loads.append(key)
+            return key
+
+        return loader
+
+    cache.get("a", load("a"))
+    cache.get("b", load("b"))
+    cache.get("a", load("a"))
+    cache.get("c", load("c"))
+    cache.get("a", load("a"))
+    cache.get("b", load("b"))
+
+    assert loads == ["a", "b", "c", "b"]
@@ -0,0 +1,170 @@
+import random
+
+import pytest
+from sqlalchemy import text
+
+from src import actions
+from src.actions import DependencyCycleError
+from src.model import session_scope
+
+# What ``task.open_blocker_count`` should be: the number of open tasks blocking the task
+EXPECTED_BLOCKER_COUNTS = """
+    SELECT task.id, count(blocker.id)
+    FROM task
+    LEFT JOIN task_dependency ON task_dependency.blocked_id = task.id
+    LEFT JOIN task AS blocker
+        ON blocker.id = task_dependency.blocker_id AND NOT coalesce(blocker.is_complete, 0)
+    GROUP BY task.id
+"""
+
+
+def query(sql: str) -> list[tuple]:
+    with session_scope() as session:
+        return sorted(tuple(row) for row in session.execute(text(sql)))
+
+
+def assert_blocker_counts_match() -> None:
+    assert query("SELECT id, open_blocker_count FROM task") == query(EXPECTED_BLOCKER_COUNTS)
+
+
+def assert_topological_order() -> None:
+    misplaced = query(
+        """
+        SELECT blocker_id, blocked_id FROM task_dependency
+        JOIN task AS blocker ON blocker.id = blocker_id
+        JOIN task AS blocked ON blocked.id = blocked_id
+        WHERE blocker.topo_order >= blocked.topo_order
+        """,
+    )
+    assert misplaced == []
+
+
+def edges() -> set[tuple[int, int]]:
+    return set(query("SELECT blocker_id, blocked_id FROM task_dependency"))
+
+
+def blocked_by(task_id: int) -> int:
+    """Return the number of open tasks blocking a task, as shown in its grid row."""
+    row = actions.get_task(task_id)
+    assert row is not None
+    return row["blocked_by"]
+
+
+def reaches(graph: set[tuple[int, int]], start: int, goal: int) -> bool:
+    """Return whether ``graph`` (of blocker, blocked edges) leads from ``start`` to ``goal``."""
+    seen, stack = set(), [start]
+    while stack:
+        task_id = stack.pop()
+        if task_id == goal:
+            return True
+        if task_id not in seen:
+            seen.add(task_id)
+            stack.extend(blocked for blocker, blocked in graph if blocker == task_id)
+    return False
+
+
+@pytest.fixture
+def ids(database) -> list[int]:
+    """Ids of eight open tasks."""
+    fields = {
+        "details": "",
+        "category": None,
+        "priority": None,
+        "effort": None,
+        "complete_by": None,
+        "is_complete": False,
+    }
+    tasks = actions.create_tasks([{**fields, "name": f"task {i}"} for i in range(8)])
+    return [task["id"] for task in tasks]
+
+
+def test_task_cannot_block_itself(ids) -> None:
+    with pytest.raises(DependencyCycleError):
+        actions.add_dependency(ids[0], ids[0])
+
+
+def test_cycles_are_rejected(ids) -> None:
+    a, b, c = ids[:3]
+    actions.add_dependency(a, b)
+    actions.add_dependency(b, c)
+
+    for blocker, blocked in [(b, a), (c, a)]:
+        with pytest.raises(DependencyCycleError):
+            actions.add_dependency(blocker, blocked)
+
+    assert edges() == {(a, b), (b, c)}
+    assert_topological_order()
+
+
+def test_dependencies_against_the_order_reorder_tasks(ids) -> None:
+    a, b, c, d = ids[:4]
+    # c and d go first and last, then a before them and b after them
+    actions.add_dependency(c, d)
+    actions.add_dependency(a, b)
+    # b now has to move before c
+    actions.add_dependency(b, c)
+
+    assert_topological_order()
+    with pytest.raises(DependencyCycleError):
+        actions.add_dependency(d, a)
+
+
+def test_random_dependencies_keep_the_order_and_no_cycle(ids) -> None:
+    rng = random.Random(5)
+    rejected = 0
+    for _ in range(60):
+        blocker, blocked = rng.sample(ids, 2)
+        graph = edges()
+        try:
+            actions.add_dependency(blocker, blocked)
+        except DependencyCycleError:
+            # Rejected only if the blocked task already leads to the blocker
+            assert reaches(graph, blocked, blocker)
+            assert edges() == graph
+            rejected += 1
+        else:
+            assert not reaches(graph, blocked, blocker)
+        assert_topological_order()
+    assert rejected
+    assert_blocker_counts_match()
+
+
+def test_open_blocker_counts_follow_the_blockers(ids) -> None:
+    a, b, c, d = ids[:4]
+    actions.add_dependency(a, d)
+    actions.add_dependency(b, d)
+    actions.add_dependency(c, d)
+    assert blocked_by(d) == 3
+
+    actions.mark_task_complete(a)
+    assert blocked_by(d) == 2
+    # Completing it again changes nothing
+    actions.mark_tasks_complete([a])
+    assert blocked_by(d) == 2
+
+    actions.remove_dependency(b, d)
+    # A complete blocker was not counted, so removing it changes nothing
+    actions.remove_dependency(a, d)
+    assert blocked_by(d) == 1
+
+    actions.delete_task(c)
+    assert blocked_by(d) == 0
+    assert edges() == set()
+
+    actions.add_dependency(a, d)
+    assert blocked_by(d) == 0
+    actions.mark_task_incomplete(a)
+    assert blocked_by(d) == 1
+    assert_blocker_counts_match()
+
+
+def test_archived_blocked_tasks_take_their_dependencies_along(ids) -> None:
+    a, b, c = ids[:3]
+    actions.add_dependency(a, b)
+    actions.add_dependency(b, c)
+
+    actions.delete_tasks([b])
+
+    assert edges() == set()
+    assert_blocker_counts_match()
+    assert [row["id"] for row in actions.get_task_rows(hide_blocked=True)].count(c) == 1
@@ -0,0 +1,8 @@
+from src.diagnostics import check_query_plans, hot_queries
+
+
+def test_hot_queries_use_indexes(database) -> None:
+    # Raises FullScanError for any hot query scanning a table or sorting in a temp B-tree
+    plans = check_query_plans()
+
+    assert plans.keys() == hot_queries().keys()
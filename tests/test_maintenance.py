@@ -0,0 +1,28 @@
+import dataclasses
+from datetime import datetime, timedelta
+
+from src import actions
+from src.maintenance import run_maintenance
+
+
+def archive_task() -> None:
+    actions.add_task("old", "", None, 1, 1, None)
+    actions.delete_tasks([row["id"] for row in actions.get_task_rows()])
+
+
+def test_archived_tasks_are_kept_by_default(database) -> None:
+    archive_task()
+
+    report = run_maintenance(database, now=datetime.now() + timedelta(days=10_000))
+
+    assert report.purged_tasks == 0
+    assert len(actions.get_task_rows(include_archive=True)) == 1
+
+
+def test_archived_tasks_past_their_retention_are_purged(database) -> None:
+    archive_task()
+    settings = dataclasses.replace(database, archive_retention_days=30)
+
+    assert run_maintenance(settings, now=datetime.now() + timedelta(days=29)).purged_tasks == 0
+    assert run_maintenance(settings, now=datetime.now() + timedelta(days=31)).purged_tasks == 1
+    assert actions.get_task_rows(include_archive=True) == []
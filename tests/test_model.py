@@ -0,0 +1,79 @@
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from alembic import command
+from alembic.config import Config
+
+from src import model
+from src.model import ALEMBIC_DIR, EnginePool, SchemaOutOfDateError, configure_engine
+from src.settings import DatabaseSettings
+
+
+@pytest.fixture
+def old_database(tmp_path, monkeypatch) -> DatabaseSettings:
+    """A database with the schema from before the first migration, which Alembic upgrades."""
+    settings = DatabaseSettings(
+        path=str(tmp_path / "todo.db"), workspaces_dir=str(tmp_path / "workspaces")
+    )
+    monkeypatch.setenv("TODOOEY_DB_PATH", settings.path)
+    monkeypatch.setenv("TODOOEY_DB_WORKSPACES_DIR", settings.workspaces_dir)
+    with sqlite3.connect(settings.path) as connection:
+        connection.execute(
+            "CREATE TABLE task (id INTEGER PRIMARY KEY AUTOINCREMENT, name VARCHAR, "
+            "details VARCHAR, category VARCHAR, priority INTEGER, is_complete BOOLEAN, "
+            "archived BOOLEAN)",
+        )
+    connection.close()
+    return settings
+
+
+def upgrade(revision: str) -> None:
+    config = Config()
+    config.set_main_option("script_location", str(ALEMBIC_DIR))
+    command.upgrade(config, revision)
+
+
+def test_database_behind_is_left_for_alembic(old_database) -> None:
+    upgrade("0_7_0")
+
+    with pytest.raises(SchemaOutOfDateError, match="0_7_0"):
+        configure_engine(old_database)
+
+    with sqlite3.connect(old_database.path) as connection:
+        query = "SELECT name FROM sqlite_master WHERE type = 'table'"
+        tables = {name for (name,) in connection.execute(query)}
+    connection.close()
+    assert "task_dependency" not in tables
+    upgrade("head")
+    configure_engine(old_database)
+
+
+def test_workspaces_open_while_another_one_is_created(tmp_path, monkeypatch) -> None:
+    settings = DatabaseSettings(path=str(tmp_path / "todo.db"), workspaces_dir=str(tmp_path))
+    pool = EnginePool(settings)
+    started, release = threading.Event(), threading.Event()
+    created = []
+    create_schema = model.create_schema
+
+    def slow_create_schema(engine) -> None:
+        created.append(engine.url.database)
+        if engine.url.database.endswith("slow.db"):
+            started.set()
+            assert release.wait(timeout=10)
+        create_schema(engine)
+
+    monkeypatch.setattr(model, "create_schema", slow_create_schema)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        slow = [executor.submit(pool.get, "slow") for _ in range(2)]
+        assert started.wait(timeout=10)
+        # Not held up by the workspace being created
+        pool.get("fast")
+        release.set()
+        engines = {future.result(timeout=10) for future in slow}
+
+    # Callers of the same workspace wait for the one creating it
+    assert len(engines) == 1
+    assert sorted(path.rsplit("/", 1)[-1] for path in created) == ["fast.db", "slow.db"]
+    pool.dispose()
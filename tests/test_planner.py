@@ -0,0 +1,49 @@
+import pytest
+
+from src import actions, planner
+
+
+@pytest.fixture
+def tasks(database, monkeypatch) -> list[dict]:
+    """Open tasks of effort 1, with and without a category."""
+    # Start from empty rankings rather than those of an earlier test's database
+    monkeypatch.setattr(planner, "_planners", {})
+    fields = {"details": "", "priority": 1, "effort": 1, "complete_by": None, "is_complete": False}
+    return actions.create_tasks(
+        [
+            {**fields, "name": "work", "category": "work"},
+            {**fields, "name": "home", "category": "home"},
+            {**fields, "name": "uncategorised", "category": None},
+        ],
+    )
+
+
+def planned(budget: int, hidden_categories=()) -> list[str]:
+    return sorted(row["name"] for row in planner.plan_day(budget, hidden_categories).rows)
+
+
+def test_every_category_is_planned(tasks) -> None:
+    assert planned(10) == ["home", "uncategorised", "work"]
+
+
+def test_hiding_a_category_keeps_uncategorised_tasks_planned(tasks) -> None:
+    home = actions.get_category_ids(active_only=False)["home"]
+
+    assert planned(10, [home]) == ["uncategorised", "work"]
+
+
+def test_tasks_added_later_are_planned(tasks) -> None:
+    home = actions.get_category_ids(active_only=False)["home"]
+    planned(10)
+    actions.add_task("later", "", None, 1, 2, None)
+
+    assert planned(10, [home]) == ["later", "uncategorised", "work"]
+
+
+def test_plan_keeps_within_the_budget(tasks) -> None:
+    actions.add_task("big", "", None, 1, 5, None)
+
+    plan = planner.plan_day(3)
+
+    assert plan.effort <= 3
+    assert len(plan.rows) == 3
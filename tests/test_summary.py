@@ -0,0 +1,92 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import text
+
+from src import actions
+from src.model import session_scope
+
+# What ``task_summary`` should hold: the open tasks grouped by category, priority and due date
+EXPECTED_SUMMARY = """
+    SELECT category_id, priority, complete_by, count(*), coalesce(sum(effort), 0)
+    FROM task
+    WHERE NOT coalesce(is_complete, 0)
+    GROUP BY category_id, priority, complete_by
+"""
+SUMMARY = "SELECT category_id, priority, due_date, open_count, total_effort FROM task_summary"
+
+
+def summary_rows(query: str) -> list[tuple]:
+    with session_scope() as session:
+        rows = session.execute(text(query)).all()
+    return sorted((tuple(row) for row in rows), key=repr)
+
+
+def assert_summary_matches_tasks() -> None:
+    assert summary_rows(SUMMARY) == summary_rows(EXPECTED_SUMMARY)
+
+
+@pytest.fixture
+def tasks(database) -> list[dict]:
+    """Open tasks sharing some summary keys, with NULLs in each key and in the effort."""
+    fields = {
+        "details": "",
+        "category": None,
+        "priority": None,
+        "effort": None,
+        "complete_by": None,
+        "is_complete": False,
+    }
+    return actions.create_tasks(
+        [
+            {**fields, "name": "a", "category": "work", "priority": 1, "effort": 2},
+            {**fields, "name": "b", "category": "work", "priority": 1, "effort": 3},
+            {**fields, "name": "c", "category": "home", "complete_by": date(2030, 1, 1)},
+            {**fields, "name": "d", "is_complete": None},
+            {**fields, "name": "e", "category": "work", "priority": 1, "is_complete": True},
+            {**fields, "name": "f"},
+        ],
+    )
+
+
+def test_added_tasks_are_summarised(tasks) -> None:
+    assert_summary_matches_tasks()
+    work = actions.get_category_ids(active_only=False)["work"]
+    # The complete task is left out, the two open "work" tasks share a row
+    assert (work, 1, None, 2, 5) in summary_rows(SUMMARY)
+
+
+def test_completion_moves_tasks_in_and_out_of_the_summary(tasks) -> None:
+    actions.mark_tasks_complete([tasks[0]["id"], tasks[3]["id"]])
+    assert_summary_matches_tasks()
+
+    actions.mark_tasks_incomplete([task["id"] for task in tasks])
+    assert_summary_matches_tasks()
+
+
+def test_edited_keys_and_effort_move_tasks_between_summary_rows(tasks) -> None:
+    actions.edit_task(tasks[0]["id"], "a", "", "home", 2, 7, date(2030, 1, 1))
+    assert_summary_matches_tasks()
+
+    actions.edit_tasks([task["id"] for task in tasks], category="garden", priority=3)
+    assert_summary_matches_tasks()
+
+    actions.update_tasks({tasks[1]["id"]: {"effort": None, "complete_by": None, "category": None}})
+    assert_summary_matches_tasks()
+
+
+def test_archived_tasks_leave_the_summary(tasks) -> None:
+    actions.delete_task(tasks[0]["id"])
+    assert_summary_matches_tasks()
+
+    actions.delete_tasks([task["id"] for task in tasks[1:]])
+    assert summary_rows(SUMMARY) == []
+
+
+def test_workload_is_read_from_the_summary(tasks) -> None:
+    workload = {(row["category"], row["priority"]): row for row in actions.get_workload()}
+
+    assert workload["work", 1]["open"] == 2
+    assert workload["work", 1]["effort"] == 5
+    assert workload[None, None]["open"] == 2
+    assert workload["home", None]["overdue"] == 0
@@ -0,0 +1,114 @@
+import io
+from datetime import date
+
+import pytest
+
+from src import actions, transfer
+from src.transfer import InvalidRecordError
+
+
+def records(*items: dict) -> list[tuple[int, dict]]:
+    """Number ``items`` as the lines of an import file."""
+    return list(enumerate(items, start=1))
+
+
+def test_record_fields_are_converted() -> None:
+    task = transfer.parse_record(
+        {
+            "name": " pay rent ",
+            "priority": "2",
+            "effort": 3.0,
+            "complete_by": "2030-01-31",
+            "is_complete": "yes",
+        },
+    )
+
+    assert task == {
+        "name": "pay rent",
+        "details": "",
+        "category": None,
+        "priority": 2,
+        "effort": 3,
+        "complete_by": date(2030, 1, 31),
+        "is_complete": True,
+    }
+
+
+@pytest.mark.parametrize(
+    "fields",
+    [
+        {"priority": [1]},
+        {"priority": {"value": 1}},
+        {"priority": 2.7},
+        {"priority": True},
+        {"effort": "high"},
+        {"complete_by": 20300101},
+        {"complete_by": ["2030-01-01"]},
+        {"complete_by": "31/01/2030"},
+        {"details": {"text": "no"}},
+        {"is_complete": "maybe"},
+    ],
+)
+def test_invalid_fields_are_rejected(fields: dict) -> None:
+    with pytest.raises(InvalidRecordError):
+        transfer.parse_record({"name": "task", **fields})
+
+
+@pytest.mark.parametrize("record", [["task"], {"details": "no name"}, {"name": ["task"]}])
+def test_records_without_a_name_are_rejected(record) -> None:
+    with pytest.raises(InvalidRecordError):
+        transfer.parse_record(record)
+
+
+def test_invalid_records_are_skipped(database) -> None:
+    report = transfer.import_tasks(
+        records({"name": "one"}, {"name": "two", "priority": [1]}, {"name": "three"}),
+        batch_size=1,
+    )
+
+    assert report.tasks == 2
+    assert list(report.skipped) == [2]
+    assert sorted(row["name"] for row in actions.get_task_rows()) == ["one", "three"]
+
+
+def test_strict_import_stops_at_the_first_invalid_record(database) -> None:
+    with pytest.raises(InvalidRecordError, match="line 2"):
+        transfer.import_tasks(
+            records({"name": "one"}, {"name": "two", "priority": 2.7}, {"name": "three"}),
+            batch_size=1,
+            strict=True,
+        )
+
+    # The batches before it are already in
+    assert [row["name"] for row in actions.get_task_rows()] == ["one"]
+
+
+@pytest.mark.parametrize(
+    ("write", "read"),
+    [(transfer.write_csv, transfer.read_csv), (transfer.write_jsonl, transfer.read_jsonl)],
+)
+def test_exported_tasks_import_unchanged(database, write, read) -> None:
+    transfer.import_tasks(
+        records(
+            {"name": "bare"},
+            {
+                "name": "full",
+                "details": "with, commas\nand lines",
+                "category": "work",
+                "priority": 1,
+                "effort": 2,
+                "complete_by": "2030-01-31",
+                "is_complete": True,
+            },
+        ),
+    )
+    file = io.StringIO()
+    write(transfer.iter_export_records(), file)
+    exported = list(transfer.iter_export_records())
+
+    actions.delete_tasks([row["id"] for row in actions.get_task_rows()])
+    file.seek(0)
+    report = transfer.import_tasks(read(file), strict=True)
+
+    assert report.tasks == 2
+    assert list(transfer.iter_export_records()) == exported
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from src import actions, write_behind
+from src.model import current_workspace
+from src.write_behind import WriteBehindQueue
+
+
+@pytest.fixture
+def task(database) -> dict:
+    """An open task, as created through the API."""
+    fields = {
+        "name": "task",
+        "details": "",
+        "category": None,
+        "priority": None,
+        "effort": None,
+        "complete_by": None,
+        "is_complete": False,
+    }
+    return actions.create_tasks([fields])[0]
+
+
+class FakeWrite:
+    """Stands in for ``actions.update_tasks``, noting the workspace and updates of each write."""
+
+    def __init__(self, error: Exception | None = None) -> None:
+        self.error = error
+        self.calls: list[tuple[str, dict[int, dict]]] = []
+
+    def __call__(self, updates: dict[int, dict]) -> list[dict]:
+        self.calls.append((current_workspace.get(), updates))
+        if self.error is not None:
+            raise self.error
+        return [{"id": task_id, **fields} for task_id, fields in updates.items()]
+
+
+def test_updates_are_merged_per_workspace_and_task() -> None:
+    write = FakeWrite()
+
+    async def scenario() -> list:
+        queue = WriteBehindQueue(write, delay=60, max_pending=100)
+        written = [
+            queue.enqueue(1, is_complete=True),
+            queue.enqueue(1, is_complete=False, name="renamed"),
+            queue.enqueue(2, priority=3),
+            queue.enqueue(1, workspace="team-a", is_complete=True),
+        ]
+        assert queue.pending() == 3
+        await queue.flush()
+        assert queue.pending() == 0
+        return await asyncio.gather(*written)
+
+    rows = asyncio.run(scenario())
+
+    assert write.calls == [
+        ("default", {1: {"is_complete": False, "name": "renamed"}, 2: {"priority": 3}}),
+        ("team-a", {1: {"is_complete": True}}),
+    ]
+    # Every update of a task resolves to the row written for it
+    assert rows[0] == rows[1] == {"id": 1, "is_complete": False, "name": "renamed"}
+
+
+def test_updates_are_written_early_once_max_pending_tasks_wait() -> None:
+    write = FakeWrite()
+
+    async def scenario() -> None:
+        queue = WriteBehindQueue(write, delay=60, max_pending=2)
+        first = queue.enqueue(1, priority=1)
+        await asyncio.sleep(0)
+        assert write.calls == []
+        second = queue.enqueue(2, priority=2)
+        await asyncio.wait_for(asyncio.gather(first, second), timeout=5)
+
+    asyncio.run(scenario())
+
+    assert write.calls == [("default", {1: {"priority": 1}, 2: {"priority": 2}})]
+
+
+def test_failed_write_leaves_the_database_as_it_was(task) -> None:
+    write = FakeWrite(RuntimeError("disk full"))
+
+    async def scenario() -> None:
+        queue = WriteBehindQueue(write, delay=60, max_pending=100)
+        written = queue.enqueue(task["id"], is_complete=True)
+        await queue.flush()
+        with pytest.raises(RuntimeError, match="disk full"):
+            await written
+        # Nothing is retried: the UI refreshes the grid from the database instead
+        assert queue.pending() == 0
+
+    asyncio.run(scenario())
+
+    row = actions.get_task(task["id"])
+    assert row is not None
+    assert row["is_complete"] == "⬜"
+
+
+def test_direct_writes_are_not_undone_by_queued_updates(task, monkeypatch) -> None:
+    queue = WriteBehindQueue(actions.update_tasks, delay=60, max_pending=100)
+    monkeypatch.setattr(write_behind, "task_updates", queue)
+
+    async def scenario() -> None:
+        queue.enqueue(task["id"], is_complete=True)
+        # As the UI and the API do before writing to tasks straight away
+        await write_behind.flush_task_updates()
+        actions.update_tasks({task["id"]: {"is_complete": False}})
+        await queue.flush()
+
+    asyncio.run(scenario())
+
+    row = actions.get_task(task["id"])
+    assert row is not None
+    assert row["is_complete"] == "⬜"